@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Compare the frame rate of captureFrames with and without
+``pipeline`` on a connected dev-kit.
+
+Usage::
+
+    python benchmarks/pipelined_capture.py [num_frames] [exposure_ms]
+
+Each frame is decoded and passed to :func:`~microspec.peaks.find_peaks`,
+standing in for the application's per-frame work. Without
+``pipeline``, the dev-kit waits for that work before exposing the
+next frame. With ``pipeline``, the work overlaps the next exposure.
+"""
+
+import sys
+import time
+import microspec as usp
+
+def measure(kit, num_frames : int, pipeline : bool) -> float:
+    """Return the frames per second."""
+    start = time.perf_counter()
+    for reply in kit.captureFrames(num_frames, compact=True, pipeline=pipeline):
+        if reply.status == 'OK': usp.find_peaks(reply.pixels, prominence=100)
+    return num_frames/(time.perf_counter() - start)
+
+def main(num_frames : int = 200, exposure_ms : float = 1.0):
+    kit = usp.Devkit()
+    kit.setExposure(ms=exposure_ms)
+    num_pixels = kit.captureFrame(compact=True).num_pixels
+    print(f"{num_frames} frames, {num_pixels} pixels, {exposure_ms} ms exposure")
+    print(f"{'pipeline':<10}{'frames/s':>10}")
+    for pipeline in (False, True):
+        measure(kit, 5, pipeline) # warm up
+        print(f"{str(pipeline):<10}{measure(kit, num_frames, pipeline):>10.1f}")
+
+if __name__ == '__main__':
+    main(*(float(arg) if k else int(arg) for k, arg in enumerate(sys.argv[1:])))
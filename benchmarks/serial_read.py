@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Compare the captureFrame read paths on a connected dev-kit.
+
+Usage::
+
+    python benchmarks/serial_read.py [num_frames] [exposure_ms]
+
+For each read path, capture ``num_frames`` frames and report the
+time per frame, the ``read``/``readinto`` calls on the serial port,
+and the ``os.read`` and ``select`` system calls pyserial makes for
+them:
+
+- ``microspeclib``: :func:`Devkit.captureFrame(compact=True)
+  <microspec.commands.Devkit.captureFrame>`, which reads the reply
+  through :mod:`microspeclib` (the path before the bulk read)
+- ``bulk``: :func:`Devkit.captureFrame(out=...)
+  <microspec.commands.Devkit.captureFrame>`, which reads the status
+  bytes, the pixel count, then the pixels, into a reused buffer and
+  decodes them in place
+
+pyserial's ``readinto`` calls ``read``, so a ``readinto`` is also
+counted as a ``read``.
+
+Run it with binning on and off (``setSensorConfig``) and with a
+short exposure time, where the read path is a larger share of the
+time per frame.
+"""
+
+import os
+import select
+import sys
+import time
+import numpy as np
+import microspec as usp
+
+class Counter():
+    """Count calls to a function, replacing it on its owner."""
+
+    def __init__(self, owner, name):
+        self.owner, self.name = owner, name
+        self.function = getattr(owner, name)
+        self.calls = 0
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return self.function(*args, **kwargs)
+        setattr(owner, name, counted)
+
+    def restore(self):
+        setattr(self.owner, self.name, self.function)
+
+def measure(kit, capture, num_frames : int) -> dict:
+    counters = {
+        'read': Counter(kit.stream, 'read'),
+        'readinto': Counter(kit.stream, 'readinto'),
+        'os.read': Counter(os, 'read'),
+        'select': Counter(select, 'select'),
+        }
+    start = time.perf_counter()
+    try:
+        for _ in range(num_frames):
+            capture()
+    finally:
+        seconds = time.perf_counter() - start
+        for counter in counters.values(): counter.restore()
+    result = {name: c.calls/num_frames for name, c in counters.items()}
+    result['ms'] = 1000*seconds/num_frames
+    return result
+
+def main(num_frames : int = 200, exposure_ms : float = 1.0):
+    kit = usp.Devkit()
+    kit.setExposure(ms=exposure_ms)
+    out = np.zeros(784, dtype=np.uint16)
+    paths = {
+        'microspeclib': lambda: kit.captureFrame(compact=True),
+        'bulk': lambda: kit.captureFrame(out=out),
+        }
+    num_pixels = kit.captureFrame(compact=True).num_pixels
+    print(f"{num_frames} frames, {num_pixels} pixels, {exposure_ms} ms exposure")
+    print(f"{'path':<14}{'ms/frame':>10}{'read':>8}{'readinto':>10}{'os.read':>9}{'select':>8}")
+    for name, capture in paths.items():
+        capture() # warm up
+        r = measure(kit, capture, num_frames)
+        print(
+            f"{name:<14}{r['ms']:>10.2f}{r['read']:>8.1f}{r['readinto']:>10.1f}"
+            f"{r['os.read']:>9.1f}{r['select']:>8.1f}"
+            )
+
+if __name__ == '__main__':
+    main(*(float(arg) if k else int(arg) for k, arg in enumerate(sys.argv[1:])))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Compare the cost of checking command arguments.
+
+Usage::
+
+    python benchmarks/validation.py [num_calls]
+
+No dev-kit is needed: only the checks are timed, not the commands.
+For a few :class:`~microspec.commands.Devkit` commands, report the
+time per call of:
+
+- ``locals``: the check before ``@validated``, which scanned the
+  ``locals()`` dict of the command for negative ``int`` values
+- ``validated``: the check built by ``@validated``, which also
+  checks LED settings, gains, and binnings against their constants
+"""
+
+import sys
+import timeit
+from microspec.commands import Devkit, _build_validator
+
+def check_locals(args : dict) -> None:
+    """The check before ``@validated``."""
+    for key in args:
+        if type(args[key]) == int:
+            if args[key] < 0:
+                raise TypeError(f"Parameter '{key}' must be non-negative.")
+
+def before(**kwargs):
+    # The command called the check with locals(), so build the dict.
+    check_locals(dict(kwargs))
+
+CALLS = {
+    'setBridgeLED': dict(led_num=0, led_setting=1),
+    'setSensorConfig': dict(binning=1, gain=1, row_bitmap=0x1F),
+    'setAutoExposeConfig': dict(
+        max_tries=12, start_pixel=7, stop_pixel=392, target=46420,
+        target_tolerance=3277, max_exposure=10000
+        ),
+    }
+
+def main(num_calls : int = 200000):
+    print(f"{num_calls} calls")
+    print(f"{'command':<22}{'locals us':>10}{'validated us':>13}{'speed-up':>10}")
+    for name, kwargs in CALLS.items():
+        method = getattr(Devkit, name).__wrapped__
+        validate = _build_validator(method)
+        old = timeit.timeit(lambda: before(**kwargs), number=num_calls)
+        new = timeit.timeit(lambda: validate((), kwargs), number=num_calls)
+        print(
+            f"{name:<22}{1e6*old/num_calls:>10.3f}{1e6*new/num_calls:>13.3f}"
+            f"{old/new:>10.1f}"
+            )
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -60,3 +60,19 @@ to reduce code line length:
 from .commands import * # class Devkit
 from .constants import * # OK, ERROR, OFF, GREEN, RED, etc.
 from .helpers import * # to_cycles(), to_ms()
+from .averaging import * # FrameAccumulator
+from .correction import * # subtract_dark(), DarkFrameCache
+from .calibration import * # Calibration
+from .quality import * # frame_stats()
+from .exposure import * # predict_exposure(), ExposureTracker, AutoExposureCache
+from .batch import * # CommandBatch
+from .recipe import * # Recipe
+from .decode import * # decode_pixels()
+from .server import * # FrameServer, FrameClient
+from .sharedmem import * # FramePublisher, FrameReader
+from .pipeline import * # ProcessingStage
+from .peaks import * # find_peaks()
+from .filters import * # SavitzkyGolay, ExponentialMovingAverage
+from .pixelstats import * # PixelStatistics
+from .badpixels import * # BadPixelMap, find_bad_pixels()
+from .roi import * # RegionsOfInterest
@@ -49,7 +49,11 @@ def run_doctest_examples(submodules: list, FLAGS, verbose=False):
     if verbose: _print_all_tests(submodules, FLAGS)
     else: _print_summary(submodules, FLAGS)
 run_doctest_examples(
-        submodules = ['commands', 'replies', 'constants', 'helpers'],
+        submodules = ['commands', 'replies', 'constants', 'helpers', 'averaging',
+                      'correction', 'calibration', 'quality', 'exposure',
+                      'batch', 'recipe', 'decode', 'server', 'sharedmem',
+                      'pipeline', 'peaks', 'filters', 'pixelstats',
+                      'badpixels', 'roi'],
         # submodules = ['helpers'],
         # submodules = [],
         FLAGS = doctest.ELLIPSIS | doctest.FAIL_FAST | doctest.NORMALIZE_WHITESPACE,
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Average and co-add frames on the host computer.
+
+Example
+-------
+
+Average ten frames with :func:`~microspec.commands.Devkit.captureAverage`:
+
+>>> import microspec as usp
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> reply = kit.captureAverage(num_frames=10) #doctest: +SKIP
+>>> reply.num_frames #doctest: +SKIP
+10
+
+Applications that already have frames use
+:class:`FrameAccumulator` directly:
+
+>>> acc = usp.FrameAccumulator(num_frames=2)
+>>> acc.add([100, 200, 300])
+>>> acc.add([102, 198, 300])
+>>> mean, std = acc.result()
+>>> mean
+array([101., 199., 300.])
+>>> std
+array([1., 1., 0.])
+
+Notes
+-----
+The accumulator arrays are allocated once, when the first frame
+arrives. Adding a frame does not allocate a new list or array.
+"""
+
+__all__ = ['FrameAccumulator', 'AVERAGE_MODES']
+
+import numpy as np
+
+AVERAGE_MODES = ('mean', 'sum', 'median', 'sigma_clip')
+"""tuple: Names of the modes for combining frames.
+
+- ``'mean'``: running mean of the frames
+- ``'sum'``: co-add the frames (``uint32`` counts)
+- ``'median'``: median of the frames at each pixel
+- ``'sigma_clip'``: mean after rejecting outliers at each pixel
+"""
+
+class FrameAccumulator():
+    """Combine frames into one frame, one frame at a time.
+
+    Parameters
+    ----------
+    num_frames : int
+        Maximum number of frames to combine.
+    mode : str
+        One of the :data:`AVERAGE_MODES`. Default: ``'mean'``.
+    sigma : float
+        Only used in ``'sigma_clip'`` mode. Reject pixel values
+        more than ``sigma`` standard deviations from the mean.
+    max_iters : int
+        Only used in ``'sigma_clip'`` mode. Maximum number of
+        rejection passes.
+
+    Attributes
+    ----------
+    count : int
+        Number of frames added so far.
+    num_pixels : int
+        Number of pixels per frame. ``0`` until the first frame
+        is added.
+
+    Notes
+    -----
+    Modes ``'mean'`` and ``'sum'`` update a running mean and
+    variance (Welford's method) in ``float64`` arrays, so memory
+    does not grow with ``num_frames``. Modes ``'median'`` and
+    ``'sigma_clip'`` need every frame, so they copy each frame
+    into a preallocated ``(num_frames, num_pixels)`` ``uint16``
+    block.
+    """
+
+    def __init__(self,
+            num_frames : int,
+            mode : str = 'mean',
+            sigma : float = 3.0,
+            max_iters : int = 5
+            ):
+        if mode not in AVERAGE_MODES:
+            raise ValueError(
+                f"mode must be one of {AVERAGE_MODES}, not '{mode}'."
+                )
+        if num_frames < 1:
+            raise ValueError("num_frames must be at least 1.")
+        self.num_frames = num_frames
+        self.mode = mode
+        self.sigma = sigma
+        self.max_iters = max_iters
+        self.count = 0
+        self.num_pixels = 0
+
+    def _allocate(self, num_pixels : int) -> None:
+        self.num_pixels = num_pixels
+        if self.mode in ('median', 'sigma_clip'):
+            self._stack = np.empty(
+                    (self.num_frames, num_pixels), dtype=np.uint16
+                    )
+            return
+        self._mean  = np.zeros(num_pixels, dtype=np.float64)
+        self._m2    = np.zeros(num_pixels, dtype=np.float64)
+        self._delta = np.empty(num_pixels, dtype=np.float64) # scratch
+        self._step  = np.empty(num_pixels, dtype=np.float64) # scratch
+        if self.mode == 'sum':
+            self._total = np.zeros(num_pixels, dtype=np.uint32)
+
+    def add(self, pixels) -> None:
+        """Add one frame.
+
+        Parameters
+        ----------
+        pixels
+            Pixel counts: a ``list`` (like
+            :class:`~microspec.replies.captureFrame_response`
+            attribute ``pixels``) or a 1-D array.
+        """
+        pixels = np.asarray(pixels)
+        if self.count == 0 and self.num_pixels == 0:
+            self._allocate(len(pixels))
+        if len(pixels) != self.num_pixels:
+            raise ValueError(
+                f"Expected {self.num_pixels} pixels, got {len(pixels)}. "
+                "Do not change binning while accumulating frames."
+                )
+        if self.count >= self.num_frames:
+            raise ValueError(
+                f"Accumulator is full ({self.num_frames} frames)."
+                )
+        if self.mode in ('median', 'sigma_clip'):
+            self._stack[self.count] = pixels
+            self.count += 1
+            return
+        self.count += 1
+        # Welford update, in place:
+        #   delta = x - mean
+        #   mean += delta/n
+        #   m2   += delta*(x - mean)
+        np.subtract(pixels, self._mean, out=self._delta)
+        np.divide(self._delta, self.count, out=self._step)
+        self._mean += self._step
+        np.subtract(pixels, self._mean, out=self._step)
+        self._step *= self._delta
+        self._m2 += self._step
+        if self.mode == 'sum':
+            np.add(self._total, pixels, out=self._total, casting='unsafe')
+
+    def result(self):
+        """Return the combined frame and its standard deviation.
+
+        Returns
+        -------
+        tuple
+            ``(pixels, std)``, two 1-D arrays of length
+            ``num_pixels``. ``pixels`` is ``uint32`` in ``'sum'``
+            mode and ``float64`` in the other modes. ``std`` is
+            the ``float64`` standard deviation of the frames at
+            each pixel (for ``'sigma_clip'``, of the frames that
+            were not rejected).
+        """
+        if self.count == 0:
+            raise ValueError("No frames were added.")
+        if self.mode == 'mean':
+            return self._mean.copy(), np.sqrt(self._m2/self.count)
+        if self.mode == 'sum':
+            return self._total.copy(), np.sqrt(self._m2/self.count)
+        frames = self._stack[:self.count]
+        if self.mode == 'median':
+            return np.median(frames, axis=0), frames.std(axis=0)
+        return self._sigma_clip(frames)
+
+    def _sigma_clip(self, frames):
+        clipped = frames.astype(np.float64)
+        for _ in range(self.max_iters):
+            center = np.nanmean(clipped, axis=0)
+            spread = np.nanstd(clipped, axis=0)
+            # NaN (already rejected) compares False: not an outlier
+            outliers = np.abs(clipped - center) > self.sigma*spread
+            if not outliers.any(): break
+            clipped[outliers] = np.nan
+        return np.nanmean(clipped, axis=0), np.nanstd(clipped, axis=0)
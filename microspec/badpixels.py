@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""Find and correct bad pixels.
+
+Some pixels read consistently high (*hot*), are noisier than the
+rest (*noisy*), or do not respond to light like their neighbors
+(*dead* or *weak*). A :class:`BadPixelMap` marks these pixels and
+replaces them in every frame by interpolating between the nearest
+good pixels on each side.
+
+Example
+-------
+
+Characterize the dev-kit once, with a callable that blocks the
+light (see :class:`~microspec.correction.DarkFrameCache`), and
+save the map for this dev-kit:
+
+>>> import microspec as usp
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> bad = usp.characterize_bad_pixels(kit, shutter) #doctest: +SKIP
+>>> bad.save() #doctest: +SKIP
+
+Later, load the map saved for the dev-kit and correct frames:
+
+>>> bad = usp.BadPixelMap.for_kit(kit) #doctest: +SKIP
+>>> pixels = bad.correct(kit.captureFrame().pixels) #doctest: +SKIP
+
+The correction works on a single frame or on a 2-D batch of
+frames (one frame per row):
+
+>>> bad = usp.BadPixelMap([False, True, False, False, True, False])
+>>> bad.bad_pixels
+[2, 5]
+>>> bad.correct([10, 999, 30, 40, 999, 60])
+array([10., 20., 30., 40., 50., 60.])
+"""
+
+__all__ = [
+    'BadPixelMap',
+    'find_bad_pixels',
+    'characterize_bad_pixels',
+    ]
+
+import json
+import os
+import warnings
+import numpy as np
+from microspec.constants import BINNING_ON
+from microspec.correction import num_black_pixels
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.microspec', 'bad-pixels')
+
+class BadPixelMap():
+    """A bad-pixel mask and its interpolation.
+
+    The neighbors and weights are computed once, when the map is
+    created. Correcting a frame is then one gather and one scatter:
+    ``out[bad] = left + weight*(right - left)``.
+
+    Parameters
+    ----------
+    mask
+        Boolean array, ``True`` for each bad pixel (index 0 is
+        pixel 1).
+    serial_number : str
+        Serial number of the dev-kit the map belongs to.
+
+    Attributes
+    ----------
+    mask : numpy.ndarray
+    num_pixels : int
+    serial_number : str
+
+    Notes
+    -----
+    A bad pixel at the end of the frame takes the value of the
+    nearest good pixel.
+    """
+
+    def __init__(self, mask, serial_number : str = None):
+        mask = np.asarray(mask, dtype=bool)
+        good = np.flatnonzero(~mask)
+        if len(good) == 0:
+            raise ValueError("Every pixel is bad: nothing to interpolate from.")
+        self.mask = mask
+        self.num_pixels = len(mask)
+        self.serial_number = serial_number
+        # Nearest good pixel on each side of each bad pixel.
+        self._bad = np.flatnonzero(mask)
+        after = np.searchsorted(good, self._bad)
+        right = good[np.minimum(after, len(good) - 1)]
+        left = good[np.maximum(after - 1, 0)]
+        span = right - left
+        self._left = left
+        self._right = right
+        self._weight = np.divide(
+                self._bad - left, span,
+                out=np.zeros(len(self._bad)), where=span != 0
+                )
+
+    @property
+    def bad_pixels(self) -> list:
+        """Pixel numbers of the bad pixels (pixel numbers start at
+        1)."""
+        return (self._bad + 1).tolist()
+
+    def correct(self, pixels, out = None):
+        """Replace the bad pixels of one frame or a batch of frames.
+
+        Parameters
+        ----------
+        pixels
+            One frame (1-D) or a batch of frames (2-D, one frame
+            per row).
+        out : numpy.ndarray
+            Optional ``float64`` array to store the result in. Pass
+            ``pixels`` itself to correct it in place.
+
+        Returns
+        -------
+        numpy.ndarray
+            The corrected ``float64`` frame(s).
+        """
+        pixels = np.asarray(pixels)
+        if pixels.shape[-1] != self.num_pixels:
+            raise ValueError(
+                f"Expected {self.num_pixels} pixels, got {pixels.shape[-1]}."
+                )
+        if out is None:
+            out = pixels.astype(np.float64)
+        elif out is not pixels:
+            out[...] = pixels
+        left = out[..., self._left]
+        out[..., self._bad] = left + self._weight*(out[..., self._right] - left)
+        return out
+
+    @staticmethod
+    def path(serial_number : str, num_pixels : int, directory : str = None) -> str:
+        """Return the file the map of a dev-kit is saved in."""
+        return os.path.join(
+                directory or DEFAULT_DIRECTORY,
+                f"{serial_number}-{num_pixels}.json"
+                )
+
+    def save(self, directory : str = None) -> str:
+        """Save the map for its dev-kit serial number and pixel
+        count. Returns the path of the file.
+
+        The default directory is ``~/.microspec/bad-pixels``.
+        """
+        if self.serial_number is None:
+            raise ValueError("The map has no serial_number to save it under.")
+        path = self.path(self.serial_number, self.num_pixels, directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({
+                "serial_number": self.serial_number,
+                "num_pixels": self.num_pixels,
+                "bad_pixels": self.bad_pixels,
+                }, f)
+        return path
+
+    @classmethod
+    def load(cls, serial_number : str, num_pixels : int, directory : str = None):
+        """Load the map saved for a dev-kit serial number and pixel
+        count (392 or 784)."""
+        with open(cls.path(serial_number, num_pixels, directory), 'r') as f:
+            config = json.load(f)
+        mask = np.zeros(config['num_pixels'], dtype=bool)
+        mask[np.asarray(config['bad_pixels'], dtype=int) - 1] = True
+        return cls(mask, config['serial_number'])
+
+    @classmethod
+    def for_kit(cls, kit, directory : str = None):
+        """Load the map saved for a dev-kit's serial number and
+        present binning."""
+        if kit.serial_number is None:
+            raise ValueError("The dev-kit has no serial_number to load a map for.")
+        num_pixels = 392 if kit.binning == BINNING_ON else 784
+        return cls.load(kit.serial_number, num_pixels, directory)
+
+def _robust_spread(values):
+    """Median and standard deviation estimated from the median
+    absolute deviation (at least 1 count)."""
+    center = np.median(values)
+    return center, max(1.4826*np.median(np.abs(values - center)), 1.0)
+
+def _local_median(values, window : int):
+    half = window//2
+    padded = np.pad(values, half, mode='edge')
+    return np.median(
+            np.lib.stride_tricks.sliding_window_view(padded, window), axis=-1
+            )
+
+def find_bad_pixels(
+        dark,
+        light = None,
+        hot_sigma : float = 6.0,
+        noise_sigma : float = 6.0,
+        max_deviation : float = 0.5,
+        min_signal : float = 1000.0,
+        window : int = 7,
+        serial_number : str = None
+        ) -> BadPixelMap:
+    """Find bad pixels in dark and illuminated frames.
+
+    Parameters
+    ----------
+    dark
+        2-D batch of frames captured with no light.
+    light
+        Optional 2-D batch of frames captured with light on the
+        sensor, at the same settings.
+    hot_sigma : float
+        A pixel is *hot* if its dark mean is more than this many
+        (robust) standard deviations from the median dark mean.
+    noise_sigma : float
+        A pixel is *noisy* if its dark noise is more than this many
+        (robust) standard deviations above the median dark noise.
+    max_deviation : float
+        A pixel is *dead* or *weak* (or too bright) if its response
+        to light differs from the median response of its
+        neighbors by more than this fraction.
+    min_signal : float
+        Only test the response where the neighbors' median
+        response is at least this many counts.
+    window : int
+        Number of neighbors in the median response (odd).
+    serial_number : str
+        Serial number of the dev-kit, for :func:`BadPixelMap.save`.
+
+    Returns
+    -------
+    :class:`BadPixelMap`
+
+    Notes
+    -----
+    The optically black pixels (see
+    :func:`~microspec.correction.num_black_pixels`) are not tested
+    for response to light.
+    """
+    if window < 1 or window % 2 == 0:
+        raise ValueError(f"window must be an odd number >= 1, got {window}.")
+    dark = np.asarray(dark, dtype=np.float64)
+    dark_mean = dark.mean(axis=0)
+    dark_std = dark.std(axis=0)
+    center, spread = _robust_spread(dark_mean)
+    mask = np.abs(dark_mean - center) > hot_sigma*spread
+    center, spread = _robust_spread(dark_std)
+    mask |= dark_std - center > noise_sigma*spread
+    if light is not None:
+        response = np.asarray(light, dtype=np.float64).mean(axis=0) - dark_mean
+        local = _local_median(response, window)
+        tested = local >= min_signal
+        num_pixels = len(response)
+        if num_pixels in (392, 784): tested[:num_black_pixels(num_pixels)] = False
+        mask |= tested & (np.abs(response - local) > max_deviation*local)
+    return BadPixelMap(mask, serial_number)
+
+def characterize_bad_pixels(kit, shutter, num_frames : int = 32, **kwargs) -> BadPixelMap:
+    """Capture dark and illuminated frames and find the bad pixels.
+
+    Parameters
+    ----------
+    kit : :class:`~microspec.commands.Devkit`
+        The dev-kit. The map is for its present settings and
+        serial number.
+    shutter
+        Callable that blocks the light: ``shutter(True)`` before
+        the dark frames, ``shutter(False)`` after.
+    num_frames : int
+        Number of dark and of illuminated frames.
+    kwargs
+        Thresholds, passed to :func:`find_bad_pixels`.
+
+    Returns
+    -------
+    :class:`BadPixelMap`
+        Or ``None`` if a frame failed (the warning says why).
+    """
+    num_pixels = 392 if kit.binning == BINNING_ON else 784
+    frames = np.zeros((2, num_frames, num_pixels), dtype=np.uint16)
+    shutter(True)
+    try:
+        replies = list(kit.captureFrames(num_frames, out=frames[0]))
+    finally:
+        shutter(False)
+    replies += list(kit.captureFrames(num_frames, out=frames[1]))
+    failed = [reply.status for reply in replies if reply.status != 'OK']
+    if failed:
+        warnings.warn(
+            "Could not characterize bad pixels "
+            f"(status={failed[0]}).",
+            stacklevel=2
+            )
+        return None
+    return find_bad_pixels(
+            frames[0], frames[1], serial_number=kit.serial_number, **kwargs
+            )
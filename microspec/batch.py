@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""Send several commands at once.
+
+Each command is a round trip: the host sends the command, then
+waits for the reply before sending the next command. A batch
+sends all of its commands back-to-back in a single write, then
+reads all of the replies.
+
+Example
+-------
+
+>>> import microspec as usp
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> with kit.batch() as b: #doctest: +SKIP
+...     b.setSensorConfig(binning=usp.BINNING_OFF)
+...     b.setExposure(ms=5)
+...     b.captureFrame()
+>>> b.replies #doctest: +SKIP
+[setSensorConfig_response(status='OK'),
+ setExposure_response(status='OK'),
+ captureFrame_response(status='OK', num_pixels=784, pixels=[...], frame={...})]
+
+The replies are the same replies the :class:`~microspec.commands.Devkit`
+commands return, in the order the commands were added, and the
+:class:`~microspec.commands.Devkit` attributes (exposure time,
+pixel configuration, ...) are updated the same way.
+"""
+
+__all__ = ['CommandBatch', 'BATCH_COMMANDS']
+
+import inspect
+from microspec.helpers import to_ms
+
+BATCH_COMMANDS = (
+    'getBridgeLED',
+    'setBridgeLED',
+    'getSensorLED',
+    'setSensorLED',
+    'getSensorConfig',
+    'setSensorConfig',
+    'getExposure',
+    'setExposure',
+    'captureFrame',
+    'autoExposure',
+    'getAutoExposeConfig',
+    'setAutoExposeConfig',
+    )
+"""tuple: Names of the :class:`~microspec.commands.Devkit` commands
+a :class:`CommandBatch` accepts."""
+
+class _Recorded(Exception):
+    """The command was recorded instead of sent."""
+
+class CommandBatch():
+    """Collect dev-kit commands and send them all at once.
+
+    Application code gets a ``CommandBatch`` from
+    :func:`Devkit.batch <microspec.commands.Devkit.batch>`. Call
+    the :class:`~microspec.commands.Devkit` commands (see
+    :data:`BATCH_COMMANDS`) on the batch instead of on the
+    dev-kit. The batch is sent when the ``with`` block exits.
+
+    Parameters
+    ----------
+    kit : :class:`~microspec.commands.Devkit`
+        The dev-kit to send the commands to.
+
+    Attributes
+    ----------
+    replies : list
+        The reply to each command, in order. Empty until the
+        batch is sent.
+
+    Notes
+    -----
+    Parameters are checked when the command is added to the batch,
+    so a ``TypeError`` is raised before anything is sent.
+
+    If a reply times out, the replies after it are lost: they are
+    returned with ``status='TIMEOUT'``.
+
+    Commands in a batch are always sent, even if
+    :attr:`Devkit.elide <microspec.commands.Devkit.elide>` is on.
+
+    A command that sends a second command (such as firmware
+    :func:`~microspec.commands.Devkit.autoExposure`, which reads
+    back the new exposure time) sends it after the batch is read.
+    """
+
+    def __init__(self, kit):
+        self.kit = kit
+        self.replies = []
+        self._calls = [] # (name, args, kwargs, low-level command)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None: self.send()
+
+    def __len__(self):
+        return len(self._calls)
+
+    def __getattr__(self, name):
+        if name not in BATCH_COMMANDS:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+                )
+        def add(*args, **kwargs):
+            command = self._record(name, args, kwargs)
+            self._calls.append((name, args, kwargs, command))
+        add.__name__ = name
+        return add
+
+    def _record(self, name, args, kwargs):
+        """Run the command up to the point it sends, and keep the
+        low-level command instead of sending it (see
+        :func:`Devkit.intercept <microspec.commands.Devkit.intercept>`).
+        """
+        kit = self.kit
+        recorded = []
+        def record(command, send):
+            recorded.append(command)
+            raise _Recorded
+        _timeout = kit.timeout # captureFrame changes it before sending
+        elide, kit.elide = kit.elide, False # a batch sends every command
+        try:
+            with kit.intercept(record):
+                getattr(kit, name)(*args, **kwargs)
+        except _Recorded:
+            pass
+        finally:
+            kit.timeout = _timeout
+            kit.elide = elide
+        if not recorded:
+            raise ValueError(
+                f"{name}() did not send a command to the dev-kit, "
+                "so it cannot be added to a batch."
+                )
+        return recorded[0]
+
+    def _replay(self, name, args, kwargs, _reply):
+        """Run the command again, returning the low-level reply
+        already read instead of sending the command."""
+        kit = self.kit
+        replayed = []
+        def replay(command, send):
+            # Any further command is sent to the dev-kit.
+            if replayed: return send(command)
+            replayed.append(command)
+            return _reply
+        elide, kit.elide = kit.elide, False
+        try:
+            with kit.intercept(replay):
+                return getattr(kit, name)(*args, **kwargs)
+        finally:
+            kit.elide = elide
+
+    def _timeouts(self, calls):
+        """Return the time in seconds to wait for each reply.
+
+        Wait at least the dev-kit timeout. Wait one second longer
+        than the exposure time for a frame, and one second longer
+        than the longest possible auto-expose.
+        """
+        kit = self.kit
+        cycles = kit.exposure_time_cycles
+        max_tries = max_exposure = None # only needed for autoExposure
+        timeouts = []
+        for name, args, kwargs, command in calls:
+            seconds = 0
+            if name == 'setExposure':
+                cycles = command.cycles
+            elif name == 'setAutoExposeConfig':
+                max_tries = command.max_tries
+                max_exposure = command.max_exposure
+            elif name == 'captureFrame':
+                seconds = to_ms(cycles)/1000 + 1
+            elif name == 'autoExposure':
+                if max_tries is None:
+                    max_tries, max_exposure = self._autoexpose_limits()
+                seconds = max_tries*to_ms(max_exposure)/1000 + 1
+            timeouts.append(max(kit.timeout, seconds))
+        return timeouts
+
+    def _autoexpose_limits(self) -> tuple:
+        """Return the ``max_tries`` and ``max_exposure`` of the
+        dev-kit auto-expose configuration.
+
+        :attr:`Devkit.autoexpose_config
+        <microspec.commands.Devkit.autoexpose_config>` is only set
+        if the dev-kit replied to ``getAutoExposeConfig``. Otherwise
+        assume the firmware defaults, which are the defaults of
+        :func:`~microspec.commands.Devkit.setAutoExposeConfig`.
+        """
+        config = getattr(self.kit, 'autoexpose_config', None)
+        if config is not None:
+            return config.max_tries, config.max_exposure
+        defaults = inspect.signature(type(self.kit).setAutoExposeConfig).parameters
+        return defaults['max_tries'].default, defaults['max_exposure'].default
+
+    def send(self) -> list:
+        """Send the batch and return the replies.
+
+        The ``with`` block calls this on exit. The batch is empty
+        afterwards.
+        """
+        kit = self.kit
+        calls, self._calls = self._calls, []
+        if not calls: return self.replies
+        timeouts = self._timeouts(calls)
+        _timeout = kit.timeout
+        kit.stream.reset_input_buffer()
+        kit.buffer = b''
+        kit.current_command = [command for *_, command in calls]
+        _replies = []
+        try:
+            # One write for every command.
+            kit.write(b''.join(bytes(command) for *_, command in calls))
+            # Read every reply before decoding any of them.
+            for timeout in timeouts:
+                kit.timeout = timeout
+                _reply = kit.receiveReply()
+                kit._check_reply(_reply)
+                _replies.append(_reply)
+                if _reply is None: break # out of sync: give up
+        finally:
+            kit.timeout = _timeout
+            kit.stream.reset_input_buffer()
+            kit.buffer = b''
+            kit.current_command = []
+        _replies += [None]*(len(calls) - len(_replies))
+        self.replies = [
+                self._replay(name, args, kwargs, _reply)
+                for (name, args, kwargs, _), _reply in zip(calls, _replies)
+                ]
+        return self.replies
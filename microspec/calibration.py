@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""Convert pixel numbers to wavelengths.
+
+A :class:`Calibration` holds the coefficients of the polynomial
+that maps pixel number to wavelength. It evaluates the polynomial
+*once* per pixel configuration and caches the wavelength array,
+so converting a frame to a spectrum is an array lookup.
+
+Example
+-------
+
+Create a calibration from polynomial coefficients (lowest power
+first, pixel numbers start at 1):
+
+>>> import microspec as usp
+>>> cal = usp.Calibration([300.0, 1.0])
+>>> cal.wavelengths(usp.BINNING_ON)[:3]
+array([301., 302., 303.])
+
+With binning off, there are twice as many pixels at half the
+pitch:
+
+>>> cal.wavelengths(usp.BINNING_OFF)[:4]
+array([300.75, 301.25, 301.75, 302.25])
+
+Resample a frame onto a uniform wavelength grid:
+
+>>> frame = [0]*392
+>>> frame[9] = 100 # pixel 10 is 310nm
+>>> spectrum = cal.resample(frame, start=309, stop=311, step=0.5)
+>>> spectrum
+array([  0.,  50., 100.,  50.,   0.])
+
+Convert frames between the two pixel configurations, e.g., to
+analyze an archive with frames captured with binning on and off
+in one array:
+
+>>> unbinned = [10, 20, 30, 40] + [0]*780
+>>> usp.rebin(unbinned, usp.BINNING_ON)[:3]
+array([15., 35.,  0.])
+>>> frames = [[0]*392, unbinned]
+>>> usp.rebin(frames, usp.BINNING_ON).shape
+(2, 392)
+"""
+
+__all__ = ['Calibration', 'WavelengthResampler', 'rebin', 'BINNING_COMBINE']
+
+import json
+import numpy as np
+from microspec.constants import BINNING_ON, BINNING_OFF
+
+_num_pixels = {BINNING_ON: 392, BINNING_OFF: 784}
+_binning = {392: BINNING_ON, 784: BINNING_OFF}
+
+def _binning_of(num_pixels : int) -> int:
+    try:
+        return _binning[num_pixels]
+    except KeyError:
+        raise ValueError(
+            f"Expected 392 or 784 pixels, got {num_pixels}."
+            ) from None
+
+class WavelengthResampler():
+    """Resample frames onto a fixed wavelength grid.
+
+    The neighbor indices and interpolation weights are computed
+    once. Resampling a frame is then one gather and one fused
+    multiply-add per grid point:
+    ``left + weight*(right - left)``.
+
+    Application code usually gets a ``WavelengthResampler`` from
+    :func:`Calibration.resampler` instead of creating one.
+
+    Parameters
+    ----------
+    wavelengths
+        Wavelength of each pixel (strictly monotonic).
+    grid
+        Wavelengths to resample onto.
+    fill : float
+        Value for grid points outside the range of
+        ``wavelengths``. Default: ``nan``.
+
+    Attributes
+    ----------
+    grid : numpy.ndarray
+        Wavelengths of the resampled frame.
+    """
+
+    def __init__(self, wavelengths, grid, fill : float = np.nan):
+        wavelengths = np.asarray(wavelengths, dtype=np.float64)
+        self.grid = np.asarray(grid, dtype=np.float64)
+        self.fill = fill
+        step = np.diff(wavelengths)
+        if not ((step > 0).all() or (step < 0).all()):
+            raise ValueError(
+                "Wavelengths must be strictly increasing or strictly "
+                "decreasing: two pixels cannot have the same wavelength."
+                )
+        order = np.argsort(wavelengths)
+        ordered = wavelengths[order]
+        i = np.searchsorted(ordered, self.grid, side='right') - 1
+        i = np.clip(i, 0, len(ordered) - 2)
+        self._left  = order[i]
+        self._right = order[i + 1]
+        self._weight = (self.grid - ordered[i])/(ordered[i+1] - ordered[i])
+        outside = (self.grid < ordered[0]) | (self.grid > ordered[-1])
+        self._outside = outside if outside.any() else None
+        self.num_pixels = len(wavelengths)
+
+    def __call__(self, pixels, out = None):
+        """Resample one frame (1-D) or a batch of frames (2-D).
+
+        Returns
+        -------
+        numpy.ndarray
+            ``float64`` array with ``len(grid)`` values per frame.
+        """
+        pixels = np.asarray(pixels, dtype=np.float64)
+        if pixels.shape[-1] != self.num_pixels:
+            raise ValueError(
+                f"Expected {self.num_pixels} pixels, "
+                f"got {pixels.shape[-1]}."
+                )
+        left = pixels[..., self._left]
+        if out is None: out = np.empty(left.shape, dtype=np.float64)
+        np.subtract(pixels[..., self._right], left, out=out)
+        out *= self._weight
+        out += left
+        if self._outside is not None: out[..., self._outside] = self.fill
+        return out
+
+class Calibration():
+    """Pixel-to-wavelength calibration.
+
+    Parameters
+    ----------
+    coefficients
+        Polynomial coefficients, *lowest power first*:
+        ``wavelength = c[0] + c[1]*p + c[2]*p**2 + ...``, where
+        ``p`` is the pixel number (the first pixel is ``p=1``).
+    binning : int
+        The pixel configuration the coefficients were fit in:
+        :data:`~microspec.constants.BINNING_ON` (default) or
+        :data:`~microspec.constants.BINNING_OFF`. The calibration
+        applies to both configurations.
+
+    Notes
+    -----
+    A binned pixel ``q`` covers unbinned pixels ``2q-1`` and
+    ``2q``. So unbinned pixel ``p`` is at binned position
+    ``(p + 0.5)/2``, and binned pixel ``q`` is at unbinned
+    position ``2q - 0.5``.
+    """
+
+    def __init__(self, coefficients, binning : int = BINNING_ON):
+        if binning not in _num_pixels:
+            raise ValueError(
+                "binning must be BINNING_ON or BINNING_OFF."
+                )
+        self.coefficients = tuple(float(c) for c in coefficients)
+        self.binning = binning
+        self._wavelengths = {}
+        self._resamplers = {}
+
+    @classmethod
+    def load(cls, path : str):
+        """Load a calibration from a file.
+
+        The file is either JSON, ``{"coefficients": [...],
+        "binning": 1}`` (``"binning"`` is optional), or plain text
+        with one coefficient per line (lowest power first).
+        """
+        if str(path).endswith('.json'):
+            with open(path, 'r') as f:
+                config = json.load(f)
+            return cls(
+                    config['coefficients'],
+                    config.get('binning', BINNING_ON)
+                    )
+        return cls(np.atleast_1d(np.loadtxt(path)))
+
+    def _pixel_positions(self, binning : int):
+        p = np.arange(1, _num_pixels[binning] + 1, dtype=np.float64)
+        if binning == self.binning: return p
+        if binning == BINNING_OFF: return (p + 0.5)/2
+        return 2*p - 0.5
+
+    def wavelengths(self, binning : int = BINNING_ON):
+        """Return the wavelength of each pixel.
+
+        The array is computed once per pixel configuration, then
+        cached. Do not modify it.
+
+        Parameters
+        ----------
+        binning : int
+            :data:`~microspec.constants.BINNING_ON` (392 pixels,
+            default) or :data:`~microspec.constants.BINNING_OFF`
+            (784 pixels).
+        """
+        wavelengths = self._wavelengths.get(binning)
+        if wavelengths is None:
+            if binning not in _num_pixels:
+                raise ValueError(
+                    "binning must be BINNING_ON or BINNING_OFF."
+                    )
+            wavelengths = np.polynomial.polynomial.polyval(
+                    self._pixel_positions(binning), self.coefficients
+                    )
+            wavelengths.flags.writeable = False
+            self._wavelengths[binning] = wavelengths
+        return wavelengths
+
+    def resampler(self,
+            start : float,
+            stop : float,
+            step : float,
+            binning : int = BINNING_ON
+            ) -> WavelengthResampler:
+        """Return a cached resampler for a uniform wavelength grid.
+
+        The grid is ``start, start+step, ...`` up to and including
+        ``stop``.
+        """
+        key = (start, stop, step, binning)
+        resampler = self._resamplers.get(key)
+        if resampler is None:
+            num = int(round((stop - start)/step)) + 1
+            grid = start + step*np.arange(num)
+            resampler = WavelengthResampler(self.wavelengths(binning), grid)
+            self._resamplers[key] = resampler
+        return resampler
+
+    def resample(self, pixels, start, stop, step, out = None):
+        """Resample a frame onto a uniform wavelength grid.
+
+        The pixel configuration is determined from the number of
+        pixels (392 or 784) in ``pixels``, which is one frame or a
+        2-D batch of frames (one frame per row).
+        """
+        pixels = np.asarray(pixels)
+        binning = _binning_of(pixels.shape[-1])
+        return self.resampler(start, stop, step, binning)(pixels, out)
+
+BINNING_COMBINE = ('mean', 'sum')
+"""tuple: Ways :func:`rebin` combines two unbinned pixels into one
+binned pixel.
+
+- ``'mean'``: the average of the two pixels (keeps the counts in
+  the same range)
+- ``'sum'``: the sum of the two pixels (a binned pixel collects
+  the light of both)
+"""
+
+_rebinners = {} # (from binning, to binning): WavelengthResampler
+
+def _rebinner(binning : int, to_binning : int) -> WavelengthResampler:
+    """Return the cached resampler from one pixel configuration to
+    the other, in unbinned pixel positions (see :class:`Calibration`).
+    """
+    key = (binning, to_binning)
+    rebinner = _rebinners.get(key)
+    if rebinner is None:
+        unbinned = np.arange(1, 785, dtype=np.float64)
+        binned = 2*np.arange(1, 393, dtype=np.float64) - 0.5
+        if to_binning == BINNING_ON:
+            # Half-way between pixels 2q-1 and 2q.
+            rebinner = WavelengthResampler(unbinned, binned)
+        else:
+            # The first and last unbinned pixels are outside the
+            # binned pixel positions: use the nearest binned pixel.
+            rebinner = WavelengthResampler(
+                    binned, np.clip(unbinned, binned[0], binned[-1])
+                    )
+        _rebinners[key] = rebinner
+    return rebinner
+
+def rebin(pixels, binning : int, combine : str = 'mean', out = None):
+    """Convert frames to one pixel configuration.
+
+    Frames with 784 pixels are binned in software: each binned
+    pixel ``q`` combines unbinned pixels ``2q-1`` and ``2q``.
+    Frames with 392 pixels are linearly interpolated at the
+    unbinned pixel positions. Frames already in the requested
+    configuration are copied.
+
+    Parameters
+    ----------
+    pixels
+        One frame (1-D), a batch of frames (2-D, one frame per
+        row), or a list of frames with a mix of 392 and 784
+        pixels.
+    binning : int
+        The pixel configuration to convert to:
+        :data:`~microspec.constants.BINNING_ON` (392 pixels) or
+        :data:`~microspec.constants.BINNING_OFF` (784 pixels).
+    combine : str
+        One of the :data:`BINNING_COMBINE`. Default: ``'mean'``.
+        With ``'sum'``, interpolated pixels are halved, so frames
+        converted both ways keep their counts.
+    out : numpy.ndarray
+        Optional ``float64`` array to store the result in.
+
+    Returns
+    -------
+    numpy.ndarray
+        ``float64`` frame(s) with 392 or 784 pixels.
+
+    Notes
+    -----
+    The index and weight tables are computed once per direction.
+    A mixed list is converted in one pass per pixel configuration.
+    """
+    to_num_pixels = _num_pixels.get(binning)
+    if to_num_pixels is None:
+        raise ValueError("binning must be BINNING_ON or BINNING_OFF.")
+    if combine not in BINNING_COMBINE:
+        raise ValueError(
+            f"combine must be one of {BINNING_COMBINE}, got {combine!r}."
+            )
+    if not isinstance(pixels, np.ndarray) and len(pixels) and np.ndim(pixels[0]) == 1:
+        lengths = {len(frame) for frame in pixels}
+        if len(lengths) > 1:
+            if out is None:
+                out = np.empty((len(pixels), to_num_pixels), dtype=np.float64)
+            rows = np.array([len(frame) for frame in pixels])
+            for num_pixels in lengths:
+                index = np.flatnonzero(rows == num_pixels)
+                out[index] = rebin(
+                        np.array([pixels[i] for i in index]), binning, combine
+                        )
+            return out
+    pixels = np.asarray(pixels)
+    from_binning = _binning_of(pixels.shape[-1])
+    if from_binning == binning:
+        if out is None: return pixels.astype(np.float64)
+        out[...] = pixels
+        return out
+    out = _rebinner(from_binning, binning)(pixels, out)
+    if combine == 'sum':
+        out *= 2.0 if binning == BINNING_ON else 0.5
+    return out
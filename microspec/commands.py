@@ -38,67 +38,133 @@ a timeout condition by setting a very short timeout such as 1ms.
 __all__ = ['Devkit']
 
 from microspeclib.simple import MicroSpecSimpleInterface
+from microspeclib.datatypes import CommandCaptureFrame
 from microspec.constants import *
 from microspec.helpers import *
+from microspec.averaging import FrameAccumulator
+from microspec.quality import frame_stats
+from microspec.exposure import host_auto_exposure
+from microspec.batch import CommandBatch
+from microspec.decode import HEADER, decode_pixels
 import microspec.replies as replies
+import numpy as np
+import contextlib
+import functools
+import inspect
+import itertools
 import warnings
 
-def raise_TypeError_if_any_int_args_are_negative(args: dict={}) -> None:
-    """Raise TypeError if any int arguments are negative.
+_ALLOWED_VALUES = {
+    'led_setting': ((OFF, GREEN, RED), "OFF, GREEN, or RED"),
+    'binning': ((BINNING_OFF, BINNING_ON), "BINNING_OFF or BINNING_ON"),
+    'gain': (
+        (GAIN1X, GAIN2_5X, GAIN4X, GAIN5X),
+        "GAIN1X, GAIN2_5X, GAIN4X, or GAIN5X"
+        ),
+    }
+"""dict: Parameter name to ``(values, names)``: the values of the
+:mod:`microspec.constants` the parameter accepts, and their names
+for the error message."""
+
+def _build_validator(method, check = None):
+    """Return a function that checks the arguments of ``method``.
+
+    The function is called as ``validate(args, kwargs)`` with the
+    arguments of ``method`` (without ``self``) and raises
+    ``TypeError`` if:
+
+    - an ``int`` argument is negative
+    - an argument named in :data:`_ALLOWED_VALUES` is not one of
+      its values
+
+    ``check`` is an optional function for the checks that are
+    particular to ``method``. Its parameters are named after
+    parameters of ``method`` and it is called with their values.
+
+    The parameter names and the values each one accepts are
+    worked out once, here. Default values are not checked. A
+    missing or unexpected argument is not checked either:
+    ``method`` raises the usual ``TypeError`` for it.
 
     Notes
     -----
 
-    :mod:`microspeclib` uses ``struct.pack()` to translate the
-    command and its arguments into a byte sequence to send over
-    serial.
-
-    See: https://docs.python.org/3/library/struct.html#struct.pack
-
-    ``struct.pack()`` takes a "format" argument.
-
-    See: https://docs.python.org/3/library/struct.html#format-characters
-
-    :mod:`microspeclib` uses formats "B", "H", and "L".
-    These are unsigned integers, sized 1, 2, and 4 bytes
-    respectively.
-
-    Negative parameter values, therefore, are not allowed. But
-    :mod:`microspeclib` does not check for negative values. If a
-    user passes negative parameter values, the ``struct``
-    package's built-in exceptions show-up in the traceback.
-
-    At the level of application development with ``microspec``,
-    it is not immediately obvious that the problem is due to
-    using a negative value.
-    
-    ``microspec`` deals with this by checking for negative
-    parameter values in :class:`Devkit`.
-
-    Note: the dev-kit firmware already rejects out-of-range
-    values with an ERROR status, but it cannot reject a value if
-    the application exits due to an exception, and it needs to be
-    clear to the user what the cause of the exception is.
-
-    Example
-    -------
-
-    >>> import microspec as usp
-    >>> kit = usp.Devkit() #doctest: +SKIP
-    >>> kit.getBridgeLED(led_num = -1) #doctest: +SKIP
-    Traceback (most recent call last):
-    ...
-    TypeError: Parameter 'led_num' must be non-negative.
+    :mod:`microspeclib` packs the arguments of a command with
+    ``struct.pack()`` as unsigned integers, so a negative
+    argument shows up as a ``struct.error`` deep in the
+    traceback. The dev-kit firmware rejects out-of-range values
+    with an ``ERROR`` status, but it never sees a value that
+    cannot be packed.
     """
-    # Loop through the arguments.
-    for key in args:
-        # Only consider int arguments.
-        if type(args[key]) == int:
-            # Raise an error if it is negative.
-            if args[key] < 0:
-                raise TypeError(
-                    f"Parameter '{key}' must be non-negative."
-                    )
+    params = list(inspect.signature(method).parameters.values())[1:]
+    names = tuple(p.name for p in params)
+    # Parameter name to the (values, names) it accepts, or None.
+    allowed = {name: _ALLOWED_VALUES.get(name) for name in names}
+    # (name, default) of each parameter of check.
+    looked_up = () if check is None else tuple(
+            (name, params[names.index(name)].default)
+            for name in inspect.signature(check).parameters
+            )
+    empty = inspect.Parameter.empty
+    def validate(args, kwargs):
+        if args:
+            if len(args) > len(names): return
+            kwargs = dict(zip(names, args), **kwargs)
+        for name, value in kwargs.items():
+            if name not in allowed: return
+            if type(value) is int and value < 0:
+                raise TypeError(f"Parameter '{name}' must be non-negative.")
+            values = allowed[name]
+            if values is not None and value not in values[0]:
+                raise TypeError(f"Parameter '{name}' must be {values[1]}.")
+        if check is not None:
+            arguments = [kwargs.get(name, default) for name, default in looked_up]
+            if empty not in arguments: check(*arguments)
+    return validate
+
+def validated(method = None, *, check = None):
+    """Decorate a :class:`Devkit` command to check its arguments.
+
+    The check is built once, when the class is created, and is
+    skipped if :attr:`Devkit.validate` is ``False``. Use
+    ``@validated(check=...)`` to add checks particular to the
+    command (see :func:`_build_validator`).
+    """
+    if method is None:
+        return functools.partial(validated, check=check)
+    validate = _build_validator(method, check)
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.validate: validate(args, kwargs)
+        return method(self, *args, **kwargs)
+    return wrapper
+
+def _check_exposure(ms, cycles):
+    """Check the exposure time of :func:`Devkit.setExposure`."""
+    # Exposure time units are either ms or cycles
+    if ms is None and cycles is None:
+        raise TypeError(
+            "setExposure() missing 1 required argument: "
+            "'ms' or 'cycles'"
+            )
+    if ms is not None and cycles is not None:
+        raise TypeError(
+            "setExposure() got an unexpected keyword "
+            "'cycles' (requires 'ms' or 'cycles' but "
+            "received both)"
+            )
+    time = cycles if ms is None else to_cycles(ms)
+    if time < MIN_CYCLES:
+        raise TypeError(
+            "Exposure time cannot be less than "
+            f"{MIN_CYCLES} cycles."
+            )
+    if time > MAX_CYCLES:
+        raise TypeError(
+            "Exposure time cannot be more than "
+            f"{MAX_CYCLES} cycles."
+            )
+
 
 class TimeoutHandler():
     """Handle case where serial communication timed out.
@@ -231,8 +297,15 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
 
     """
 
-    def __init__(self):
+    def __init__(self, elide : bool = False, validate : bool = True):
         """Add attributes to Devkit.
+
+        Parameters
+        ----------
+        elide : bool
+            Start with :attr:`elide` on. Default: ``False``.
+        validate : bool
+            Start with :attr:`validate` on. Default: ``True``.
         
         Attributes
         ----------
@@ -242,13 +315,133 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
         exposure_time_ms: ms
             Exposure time in ms. Updated every time getExposure()
             and setExposure() are called.
+        binning: int
+            Pixel binning, :data:`~microspec.constants.BINNING_ON`
+            or :data:`~microspec.constants.BINNING_OFF`. Updated
+            every time getSensorConfig() and setSensorConfig() are
+            called.
+        gain: int
+            Pixel gain, e.g., :data:`~microspec.constants.GAIN1X`.
+            Updated every time getSensorConfig() and
+            setSensorConfig() are called.
+        row_bitmap: int
+            Active pixel rows, e.g.,
+            :data:`~microspec.constants.ALL_ROWS`. Updated every
+            time getSensorConfig() and setSensorConfig() are called.
+        autoexpose_config: getAutoExposeConfig_response
+            Auto-expose configuration. Updated every time
+            getAutoExposeConfig() and setAutoExposeConfig() are
+            called.
+        elide: bool
+            If ``True``, ``set`` commands that would not change the
+            dev-kit state are not sent: they return
+            ``status='OK'`` immediately. The state is what the
+            dev-kit last confirmed with an ``'OK'`` reply. It is
+            forgotten after any ``'TIMEOUT'`` or ``'ERROR'``
+            reply, and by :func:`invalidate_state`. Pass
+            ``force=True`` to a ``set`` command to send it anyway.
+        num_elided: int
+            Number of commands not sent because of :attr:`elide`.
+        validate: bool
+            If ``True`` (default), commands check their parameters
+            and raise a ``TypeError`` for a negative value, an LED
+            setting, gain, or binning that is not one of its
+            constants, or an exposure time out of range. Set it to
+            ``False`` in trusted code that only passes valid
+            parameters, to skip the checks. The dev-kit firmware still rejects
+            invalid values with ``status='ERROR'``.
         """
         super().__init__()
+        # captureFrame(raw=True or out=...) reads each reply into this
+        # one buffer, big enough for a 784-pixel frame.
+        self._frame_buffer = memoryview(bytearray(HEADER.size + 2*784))
+        self.validate = validate
+        self.elide = elide
+        self.num_elided = 0
+        self._confirmed = {} # dev-kit state confirmed by 'OK' replies
+        self._interceptor = None # see intercept()
+        self._pipelining = False # a captureFrame command is sent ahead
         # Sync exposure_time attrs with dev-kit state:
         exposure_time = self.getExposure()
         self.exposure_time_cycles = exposure_time.cycles
         self.exposure_time_ms     = exposure_time.ms
+        # Sync sensor config attrs with dev-kit state:
+        self.getSensorConfig()
+        # Sync autoexpose_config attr with dev-kit state:
+        self.getAutoExposeConfig()
+
+    def sendAndReceive(self, command, *args, **kwargs):
+        if self._pipelining:
+            raise RuntimeError(
+                "Cannot send a command while frames are captured ahead "
+                "(captureFrames with pipeline=True): stop iterating first."
+                )
+        if self._interceptor is not None:
+            return self._interceptor(command, self._sendAndReceive)
+        return self._sendAndReceive(command, *args, **kwargs)
+
+    def _sendAndReceive(self, command, *args, **kwargs):
+        _reply = super().sendAndReceive(command, *args, **kwargs)
+        self._check_reply(_reply)
+        return _reply
+
+    @contextlib.contextmanager
+    def intercept(self, handler):
+        """Route the low-level commands through ``handler``.
+
+        Inside the ``with`` block, every command that would be sent
+        to the dev-kit calls ``handler(command, send)`` instead.
+        ``command`` is the :mod:`microspeclib` command object, and
+        ``handler`` returns the low-level reply the command then
+        turns into its ``Devkit`` reply. ``handler`` may call
+        ``send(command)`` to send the command for real.
+
+        :class:`~microspec.batch.CommandBatch` uses this to record
+        the commands of a batch and to replay the replies.
+
+        Commands that read the serial port directly
+        (:func:`captureFrame` with ``raw``, ``out``, or ``roi``, and
+        :func:`captureFrames` with ``pipeline``) cannot be
+        intercepted: they raise ``RuntimeError`` inside the block.
+        """
+        previous, self._interceptor = self._interceptor, handler
+        try:
+            yield
+        finally:
+            self._interceptor = previous
+
+    def _check_reply(self, _reply) -> None:
+        """Forget the confirmed dev-kit state after a bad reply."""
+        if _reply is None or _reply.status != OK:
+            self._confirmed.clear()
+
+    def _is_redundant(self, key, value, force : bool) -> bool:
+        """Return ``True`` (and count it) if elide mode skips a
+        command that sets ``key`` to ``value``."""
+        if (self.elide and not force and key in self._confirmed
+                and self._confirmed[key] == value):
+            self.num_elided += 1
+            return True
+        return False
+
+    def invalidate_state(self) -> None:
+        """Forget the dev-kit state confirmed by earlier replies.
+
+        Call this if the dev-kit state may have changed without the
+        ``Devkit`` knowing, e.g., after the dev-kit is reset or
+        reconnected, so that :attr:`elide` does not skip the next
+        ``set`` commands.
+        """
+        self._confirmed.clear()
+
+    @property
+    def serial_number(self) -> str:
+        """USB serial number of the dev-kit, or ``None`` if it is
+        not known (e.g., the port was not found by searching for
+        the dev-kit)."""
+        return getattr(self.serial, 'serial_number', None)
 
+    @validated
     def getBridgeLED(
             self,
             led_num: int = 0 # LED0 is the only Bridge LED
@@ -276,22 +469,39 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
 
         """
 
-        raise_TypeError_if_any_int_args_are_negative(locals())
-
         _reply = super().getBridgeLED(led_num)
+
+        # Handle case where the command timed out.
+        self.warn_if_cmd_timedout(_reply, command_name="getBridgeLED")
+        TIMEOUT = self.is_out_of_time(_reply)
+
         reply = replies.getBridgeLED_response(
+            status = 'TIMEOUT',
+            led_setting = '' # <--- bad data
+            ) if TIMEOUT else replies.getBridgeLED_response(
             status = status_dict.get(_reply.status),
             led_setting = led_dict.get(_reply.led_setting)
             )
+        if reply.status == 'OK':
+            self._confirmed['bridge_led', led_num] = _reply.led_setting
         return reply
 
+    @validated
     def setBridgeLED(
             self,
             led_setting: int,
-            led_num: int = 0 # LED0 is the only Bridge LED
+            led_num: int = 0, # LED0 is the only Bridge LED
+            force: bool = False
             ):
         """Set the LED on the Bridge PCB to OFF, GREEN, or RED.
 
+        Parameters
+        ----------
+        force : bool
+            Send the command even if :attr:`Devkit.elide` is on
+            and the dev-kit is already in the requested state.
+            Default: ``False``.
+
         Examples
         --------
 
@@ -320,14 +530,25 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
         getBridgeLED
         """
 
-        raise_TypeError_if_any_int_args_are_negative(locals())
+        if self._is_redundant(('bridge_led', led_num), led_setting, force):
+            return replies.setBridgeLED_response(status = 'OK')
 
         _reply = super().setBridgeLED(led_num, led_setting)
+
+        # Handle case where the command timed out.
+        self.warn_if_cmd_timedout(_reply, command_name="setBridgeLED")
+        TIMEOUT = self.is_out_of_time(_reply)
+
         reply = replies.setBridgeLED_response(
+            status = 'TIMEOUT'
+            ) if TIMEOUT else replies.setBridgeLED_response(
             status = status_dict.get(_reply.status)
             )
+        if reply.status == 'OK':
+            self._confirmed['bridge_led', led_num] = led_setting
         return reply
 
+    @validated
     def getSensorLED(
             self,
             led_num : int
@@ -371,19 +592,25 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
         setSensorLED
         """
 
-        raise_TypeError_if_any_int_args_are_negative(locals())
-
         # Send command and get low-level reply.
         _reply = super().getSensorLED(led_num)
 
-        # Create high-level reply.
+        # Handle case where the command timed out.
+        self.warn_if_cmd_timedout(_reply, command_name="getSensorLED")
+        TIMEOUT = self.is_out_of_time(_reply)
+
+        # Create high-level reply. Use bad data if there was a timeout.
         reply = replies.getSensorLED_response(
+                status = 'TIMEOUT',
+                led_setting = '' # <--- bad data
+            ) if TIMEOUT else replies.getSensorLED_response(
                 status = status_dict.get(_reply.status),
                 led_setting = led_dict.get(_reply.led_setting)
                 )
 
         return reply
 
+    @validated
     def setSensorLED(
             self,
             led_setting : int,
@@ -445,10 +672,15 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
 
         """
 
-        raise_TypeError_if_any_int_args_are_negative(locals())
-
         _reply = super().setSensorLED(led_num, led_setting)
+
+        # Handle case where the command timed out.
+        self.warn_if_cmd_timedout(_reply, command_name="setSensorLED")
+        TIMEOUT = self.is_out_of_time(_reply)
+
         reply = replies.setSensorLED_response(
+                status = 'TIMEOUT'
+            ) if TIMEOUT else replies.setSensorLED_response(
                 status = status_dict.get(_reply.status)
                 )
         return reply
@@ -497,16 +729,34 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
                     )
                 )
 
+        # Update Devkit sensor config attrs
+        if reply.status == 'OK':
+            self.binning    = int(_reply.binning)
+            self.gain       = int(_reply.gain)
+            self.row_bitmap = int(_reply.row_bitmap)
+            self._confirmed['sensor_config'] = (
+                    self.binning, self.gain, self.row_bitmap
+                    )
+
         return reply
 
+    @validated
     def setSensorConfig(
             self,
             binning : int = BINNING_ON,
             gain : int = GAIN1X,
-            row_bitmap : int = ALL_ROWS
+            row_bitmap : int = ALL_ROWS,
+            force : bool = False
             ):
         """One-liner
 
+        Parameters
+        ----------
+        force : bool
+            Send the command even if :attr:`Devkit.elide` is on
+            and the dev-kit is already in the requested state.
+            Default: ``False``.
+
         Examples
         --------
 
@@ -533,21 +783,47 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
 
         """
 
-        raise_TypeError_if_any_int_args_are_negative(locals())
+        config = (binning, gain, row_bitmap)
+        if self._is_redundant('sensor_config', config, force):
+            return replies.setSensorConfig_response(status = 'OK')
 
         _reply = super().setSensorConfig(binning, gain, row_bitmap)
+
+        # Handle case where the command timed out.
+        self.warn_if_cmd_timedout(_reply, command_name="setSensorConfig")
+        TIMEOUT = self.is_out_of_time(_reply)
+
         reply = replies.setSensorConfig_response(
+                'TIMEOUT'
+            ) if TIMEOUT else replies.setSensorConfig_response(
                 status_dict.get(_reply.status)
                 )
+
+        # Update Devkit sensor config attrs
+        if reply.status == 'OK':
+            self.binning    = binning
+            self.gain       = gain
+            self.row_bitmap = row_bitmap
+            self._confirmed['sensor_config'] = config
+
         return reply
 
+    @validated(check=_check_exposure)
     def setExposure(
             self,
             ms : float = None,  # specify time in milliseconds
-            cycles : int = None # OR time in cycles
+            cycles : int = None, # OR time in cycles
+            force : bool = False
             ):
         """One-liner
 
+        Parameters
+        ----------
+        force : bool
+            Send the command even if :attr:`Devkit.elide` is on
+            and the dev-kit is already in the requested state.
+            Default: ``False``.
+
         Examples
         --------
 
@@ -604,34 +880,11 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
 
         """
 
-        raise_TypeError_if_any_int_args_are_negative(locals())
-
-        # Exposure time units are either ms or cycles
-        if ms == None and cycles == None:
-            raise TypeError(
-                "setExposure() missing 1 required argument: "
-                "'ms' or 'cycles'"
-                )
-        if ms != None and cycles != None:
-            raise TypeError(
-                "setExposure() got an unexpected keyword "
-                "'cycles' (requires 'ms' or 'cycles' but "
-                "received both)"
-                )
-        if ms == None: time = cycles
-        else: time = to_cycles(ms)
+        # The arguments are checked by @validated.
+        time = cycles if ms is None else to_cycles(ms)
 
-        # Raise an error if exposure time is outside the valid range.
-        if time < MIN_CYCLES:
-            raise TypeError(
-                "Exposure time cannot be less than "
-                f"{MIN_CYCLES} cycles."
-                )
-        if time > MAX_CYCLES:
-            raise TypeError(
-                "Exposure time cannot be more than "
-                f"{MAX_CYCLES} cycles."
-                )
+        if self._is_redundant('exposure', time, force):
+            return replies.setExposure_response(status = 'OK')
 
         # Send command and get low-level reply.
         _reply = super().setExposure(time)
@@ -651,6 +904,7 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
         if reply.status == 'OK':
             self.exposure_time_cycles = time
             self.exposure_time_ms = to_ms(time)
+            self._confirmed['exposure'] = time
 
         return reply
 
@@ -697,12 +951,60 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
         if reply.status == 'OK':
             self.exposure_time_cycles = reply.cycles
             self.exposure_time_ms = reply.ms
+            self._confirmed['exposure'] = reply.cycles
 
         return reply
 
-    def captureFrame(self):
+    def captureFrame(
+            self,
+            stats : bool = False,
+            compact : bool = False,
+            raw : bool = False,
+            out = None,
+            roi = None
+            ):
         """One-liner
 
+        Parameters
+        ----------
+        stats : bool
+            If ``True``, also summarize the frame (see
+            :func:`~microspec.quality.frame_stats`) and return a
+            :class:`~microspec.replies.captureFrameStats_response`.
+            The peak and target range come from the auto-expose
+            configuration (see :attr:`Devkit.autoexpose_config`).
+            Default: ``False``.
+        compact : bool
+            If ``True``, return a
+            :class:`~microspec.replies.captureFrameCompact_response`:
+            the pixels are a ``uint16`` array and the ``frame``
+            dict is not built. Use it when capturing many frames.
+            Cannot be combined with ``stats``. Default: ``False``.
+        raw : bool
+            If ``True``, return a
+            :class:`~microspec.replies.captureFrameRaw_response`:
+            the frame header and the big-endian pixel payload
+            exactly as received, without decoding. Decode later,
+            in bulk, with :mod:`microspec.decode`. Cannot be
+            combined with ``stats`` or ``compact``. Default:
+            ``False``.
+        out : numpy.ndarray
+            Optional 1-D array with room for the frame, e.g., a row
+            of a ``(num_frames, 784)`` block. The pixels are decoded
+            straight into ``out`` and a
+            :class:`~microspec.replies.captureFrameCompact_response`
+            is returned whose ``pixels`` is a view of ``out``: no
+            pixel list, dict, or array is created (pyserial still
+            creates a ``bytes`` object per read). Cannot be
+            combined with ``stats`` or ``raw``.
+        roi : :class:`~microspec.roi.RegionsOfInterest`
+            If given, read the frame without decoding it, decode
+            only the pixels in the regions, and return a
+            :class:`~microspec.roi.captureFrameROI_response` with
+            the pixels and the band integral of each region.
+            Cannot be combined with ``stats``, ``compact``,
+            ``raw``, or ``out``.
+
         Return
         ------
         status : str
@@ -777,6 +1079,14 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
          (391, ...),
          (392,...)]
 
+        Summarize the frame to decide whether to keep it without
+        scanning ``pixels``:
+
+        >>> reply = kit.captureFrame(stats=True)
+        >>> reply.stats
+        frame_stats(peak=..., peak_pixel=..., mean=..., num_saturated=...,
+                    in_target=..., underexposed=..., overexposed=...)
+
         Notes
         -----
         If there is a timeout, :func:`captureFrame` returns
@@ -814,6 +1124,15 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
         port, or the USB cable.
 
         """
+        if out is not None: compact = True
+        if stats + compact + raw + (roi is not None) > 1:
+            raise TypeError(
+                "captureFrame() got more than one of 'stats', "
+                "'compact', 'raw', and 'roi' ('out' implies 'compact')"
+                )
+        if roi is not None:
+            return roi.extract(self.captureFrame(raw=True))
+
         # -----------------------------------
         # | Prevent timeout < exposure_time |
         # -----------------------------------
@@ -829,7 +1148,10 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
             self.timeout = self.exposure_time_ms/1000 + 1
 
         # Now it is safe to capture a frame.
-        _reply = super().captureFrame()
+        _reply = (
+            self._receiveFrameBytes() if raw or out is not None
+            else super().captureFrame()
+            )
 
         # Restore the user's timeout.
         self.timeout = _timeout
@@ -840,6 +1162,23 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
         self.warn_if_cmd_timedout(_reply, command_name="captureFrame")
         TIMEOUT = self.is_out_of_time(_reply)
 
+        # Create the raw reply, or decode into the caller's array.
+        if raw or out is not None:
+            return self._frameReply(_reply, TIMEOUT, raw=raw, out=out)
+
+        # Create the compact reply: no list or dict of pixels.
+        if compact:
+            OK_FRAME = not TIMEOUT and _reply.status == OK
+            return replies.captureFrameCompact_response(
+                    status_code = (
+                        replies.STATUS_TIMEOUT if TIMEOUT else _reply.status
+                        ),
+                    num_pixels = _reply.num_pixels if OK_FRAME else 0,
+                    pixels = np.array(
+                        _reply.pixels if OK_FRAME else [], dtype=np.uint16
+                        )
+                    )
+
         # Create the reply. Use bad data if there was a timeout.
         reply = replies.captureFrame_response(
                     status = 'TIMEOUT',
@@ -859,14 +1198,465 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
                         )
                     )
 
+        # Attach the frame summary.
+        if stats: reply = self._attachStats(reply)
+
         return reply
 
-    def autoExposure(self):
+    def _attachStats(self, reply):
+        """Return ``reply`` as a captureFrameStats_response."""
+        config = self.autoexpose_config
+        return replies.captureFrameStats_response(
+                *reply,
+                stats = None if reply.status != 'OK' else frame_stats(
+                    reply.pixels,
+                    start_pixel      = config.start_pixel,
+                    stop_pixel       = config.stop_pixel,
+                    target           = config.target,
+                    target_tolerance = config.target_tolerance
+                    )
+                )
+
+    def _frameReply(self,
+            _reply,
+            TIMEOUT : bool,
+            stats : bool = False,
+            compact : bool = False,
+            raw : bool = False,
+            out = None
+            ):
+        """Create the captureFrame reply from the ``(header,
+        payload)`` read by :func:`_readFrameBytes`.
+
+        The payload is decoded (or copied, if ``raw``) before
+        returning: the frame buffer is free for the next frame.
+        """
+        if TIMEOUT:
+            status_code = replies.STATUS_TIMEOUT
+        else:
+            status_code = OK if len(_reply[0]) == HEADER.size else ERROR
+        if status_code != OK:
+            self.invalidate_state()
+        header, payload = (b'', b'') if TIMEOUT else _reply
+
+        # Create the raw reply: the bytes as received.
+        if raw:
+            return replies.captureFrameRaw_response(
+                    status = replies.STATUS_NAMES[status_code],
+                    num_pixels = len(payload)//2,
+                    header = bytes(header), # copy out of the frame buffer
+                    payload = bytes(payload)
+                    )
+
+        # Decode into the caller's array: no new pixel objects.
+        num_pixels = len(payload)//2
+        if out is not None:
+            if status_code != OK:
+                return replies.captureFrameCompact_response(
+                        status_code = status_code,
+                        num_pixels = 0,
+                        pixels = out[:0]
+                        )
+            if len(out) < num_pixels:
+                raise ValueError(
+                    f"out has room for {len(out)} pixels, "
+                    f"the frame has {num_pixels}."
+                    )
+            pixels = out[:num_pixels]
+            decode_pixels(payload, out=pixels)
+            return replies.captureFrameCompact_response(
+                    status_code = OK,
+                    num_pixels = num_pixels,
+                    pixels = pixels
+                    )
+
+        pixels = decode_pixels(payload)
+        if compact:
+            return replies.captureFrameCompact_response(
+                    status_code = status_code,
+                    num_pixels = num_pixels,
+                    pixels = pixels
+                    )
+        pixels = pixels.tolist()
+        reply = replies.captureFrame_response(
+                status = replies.STATUS_NAMES[status_code],
+                num_pixels = num_pixels,
+                pixels = pixels,
+                frame = dict(zip(range(1, num_pixels+1), pixels))
+                )
+        return self._attachStats(reply) if stats else reply
+
+    def _check_direct(self) -> None:
+        """Raise ``RuntimeError`` if commands are being intercepted
+        or a frame is captured ahead: the caller is about to use the
+        serial port directly."""
+        if self._pipelining:
+            raise RuntimeError(
+                "Cannot capture a frame while frames are captured ahead "
+                "(captureFrames with pipeline=True): stop iterating first."
+                )
+        if self._interceptor is not None:
+            raise RuntimeError(
+                "This command reads the serial port directly and cannot "
+                "be intercepted (e.g., added to a batch)."
+                )
+
+    def _receiveFrameBytes(self):
+        """Send captureFrame and read the reply without decoding it.
+
+        Returns ``(header, payload)``, or ``None`` if the reply did
+        not arrive in time. If the dev-kit replied with an ERROR
+        status, ``header`` holds just the status bytes and
+        ``payload`` is empty.
+
+        ``header`` and ``payload`` are ``memoryview`` slices of a
+        buffer reused for every frame: decode or copy them before
+        the next frame.
+        """
+        self._check_direct()
+        self.stream.reset_input_buffer()
+        self.buffer = b''
+        self.current_command = []
+        self.write(CommandCaptureFrame())
+        return self._readFrameBytes()
+
+    def _readFrameBytes(self):
+        """Read one captureFrame reply into the frame buffer.
+
+        The reply is read like :mod:`microspeclib` parses it: the
+        bridge status byte, then the sensor status byte, and only if
+        both are OK, the pixel count and then exactly the pixels it
+        announces. pyserial waits (up to the timeout) until all the
+        bytes asked for have arrived, so a short ERROR reply is
+        returned as soon as it arrives and a frame takes two reads
+        after the status bytes, however many pixels it has. The
+        header is parsed with one ``unpack_from``.
+
+        Notes
+        -----
+        The bytes land in one reused buffer, but pyserial 3.5's
+        ``readinto`` is ``read`` followed by a copy, so each call
+        still creates a ``bytes`` object inside pyserial.
+        """
+        buffer = self._frame_buffer
+        readinto = self.stream.readinto
+        if readinto(buffer[:1]) < 1: return None
+        if buffer[0] != OK: return buffer[:1], buffer[:0] # bridge ERROR
+        if readinto(buffer[1:2]) < 1: return None
+        if buffer[1] != OK: return buffer[:2], buffer[:0] # sensor ERROR
+        if readinto(buffer[2:HEADER.size]) < HEADER.size - 2: return None
+        num_pixels = HEADER.unpack_from(buffer)[2]
+        size = HEADER.size + 2*num_pixels
+        if size > len(buffer): return None # not a frame: out of sync
+        if readinto(buffer[HEADER.size:size]) < size - HEADER.size:
+            return None
+        return buffer[:HEADER.size], buffer[HEADER.size:size]
+
+    @validated
+    def captureFrames(
+            self,
+            num_frames : int = None,
+            stats : bool = False,
+            compact : bool = False,
+            raw : bool = False,
+            out = None,
+            roi = None,
+            pipeline : bool = False
+            ):
+        """Capture frames continuously.
+
+        Parameters
+        ----------
+        num_frames : int
+            Number of frames to capture. ``None`` (default) means
+            capture until the caller stops iterating.
+        stats, compact, raw : bool
+            Passed to :func:`captureFrame`.
+        roi : :class:`~microspec.roi.RegionsOfInterest`
+            Passed to :func:`captureFrame`: keep only the regions
+            of each frame.
+        pipeline : bool
+            If ``True``, send the command for the next frame as
+            soon as the current frame is read, then decode the
+            current frame while the dev-kit exposes the next one.
+            Frames are still yielded in order. Other commands raise
+            ``RuntimeError`` until the loop stops. Default:
+            ``False``.
+        out : numpy.ndarray
+            Optional 2-D array with one row per frame: frame ``k``
+            is decoded into row ``k`` (see :func:`captureFrame`).
+            Cannot be combined with ``stats``, ``compact``,
+            ``raw``, or ``roi``.
+
+        Yields
+        ------
+        :class:`~microspec.replies.captureFrame_response`
+            The response to each :func:`captureFrame`. Check
+            ``status`` for ``'TIMEOUT'``.
+
+        Examples
+        --------
+
+        *Setup*:
+
+        >>> import microspec as usp
+        >>> kit = usp.Devkit() #doctest: +SKIP
+
+        Capture ten frames:
+
+        >>> for reply in kit.captureFrames(10): #doctest: +SKIP
+        ...     print(reply.status)
+        OK
+        ...
+
+        Capture frames until the application stops the loop:
+
+        >>> for reply in kit.captureFrames(): #doctest: +SKIP
+        ...     if done(): break
+
+        Keep the dev-kit busy while frames are decoded and
+        processed:
+
+        >>> for reply in kit.captureFrames(1000, compact=True, pipeline=True): #doctest: +SKIP
+        ...     process(reply.pixels)
+
+        Notes
+        -----
+        Other commands, such as :func:`setExposure`, are allowed
+        between frames, except with ``pipeline=True``: the next
+        frame is already requested, so a command sent in the loop
+        would read that frame's reply. Stop the loop first.
+
+        Without ``pipeline``, the dev-kit waits while the host
+        decodes a frame and the application processes it. With
+        ``pipeline``, that work overlaps the next exposure and
+        readout, which nearly doubles the frame rate at short
+        exposure times. Stopping the loop early reads and drops
+        the frame already requested.
+
+        See Also
+        --------
+        captureFrame
+        """
+
+        frames = itertools.count() if num_frames is None else range(num_frames)
+        if stats + compact + raw + (out is not None) + (roi is not None) > 1:
+            raise TypeError(
+                "captureFrames() got more than one of 'stats', "
+                "'compact', 'raw', 'out', and 'roi'"
+                )
+        if out is not None:
+            if num_frames is None or num_frames > len(out):
+                raise ValueError(
+                    f"out has room for {len(out)} frames, "
+                    f"requested {num_frames}."
+                    )
+        if pipeline:
+            _frames = self._sendAhead(num_frames, self._readFrameBytes)
+            try:
+                for k, _reply in enumerate(_frames):
+                    # Handle case where the command timed out.
+                    self.warn_if_cmd_timedout(_reply, command_name="captureFrame")
+                    TIMEOUT = self.is_out_of_time(_reply)
+                    if roi is not None:
+                        yield roi.extract(self._frameReply(_reply, TIMEOUT, raw=True))
+                    else:
+                        yield self._frameReply(
+                                _reply, TIMEOUT, stats, compact, raw,
+                                None if out is None else out[k]
+                                )
+            finally:
+                _frames.close()
+            return
+        if out is not None:
+            for k in frames:
+                yield self.captureFrame(out=out[k])
+            return
+        for _ in frames:
+            yield self.captureFrame(stats=stats, compact=compact, raw=raw, roi=roi)
+
+    def _sendAhead(self, num_frames : int, receive):
+        """Yield the replies to ``num_frames`` captureFrame commands
+        (``None`` means no limit), each read by ``receive()``.
+
+        The command for the next frame is sent *before* yielding
+        the current frame. The dev-kit exposes and reads out the
+        next frame while the caller processes the current frame.
+        Until the generator is closed, sending any other command
+        raises ``RuntimeError``.
+
+        ``receive`` returns one reply, or ``None`` if it timed out:
+        e.g., :meth:`receiveReply` for :mod:`microspeclib` replies,
+        or :func:`_readFrameBytes` for ``(header, payload)`` views
+        of the frame buffer, which the caller must decode or copy
+        before asking for the next frame.
+        """
+        self._check_direct()
+        # Prevent case that timeout < exposure_time.
+        _timeout = self.timeout
+        if self.timeout*1000 < self.exposure_time_ms:
+            self.timeout = self.exposure_time_ms/1000 + 1
+        frames = itertools.count() if num_frames is None else range(num_frames)
+        self._pipelining = True
+        try:
+            self.stream.reset_input_buffer()
+            self.buffer = b''
+            self.current_command = []
+            if num_frames != 0:
+                self.sendCommand(CommandCaptureFrame())
+            for k in frames:
+                _reply = receive()
+                if _reply is None:
+                    # Forget the missing reply, like a timed out
+                    # MicroSpecSimpleInterface command does.
+                    self.stream.reset_input_buffer()
+                    self.buffer = b''
+                self.current_command = []
+                # Request frame k+1 before handing over frame k.
+                if num_frames is None or k+1 < num_frames:
+                    self.sendCommand(CommandCaptureFrame())
+                yield _reply
+        finally:
+            # Collect a reply still in flight if the caller stopped
+            # early, then leave the stream clean for the next command.
+            if self.current_command:
+                receive()
+            self.stream.reset_input_buffer()
+            self.buffer = b''
+            self.current_command = []
+            self.timeout = _timeout
+            self._pipelining = False
+
+    def _receiveCheckedReply(self):
+        """:meth:`receiveReply`, forgetting the confirmed dev-kit
+        state after a bad reply."""
+        _reply = self.receiveReply()
+        self._check_reply(_reply)
+        return _reply
+
+    @validated
+    def captureAverage(
+            self,
+            num_frames : int,
+            mode : str = 'mean',
+            sigma : float = 3.0
+            ):
+        """Capture several frames and combine them into one frame.
+
+        Parameters
+        ----------
+        num_frames : int
+            Number of frames to capture.
+        mode : str
+            How to combine the frames, one of
+            :data:`~microspec.averaging.AVERAGE_MODES`:
+            ``'mean'`` (default), ``'sum'``, ``'median'``, or
+            ``'sigma_clip'``.
+        sigma : float
+            Only used with ``mode='sigma_clip'``. Pixel values more
+            than ``sigma`` standard deviations from the mean are
+            rejected.
+
+        Returns
+        -------
+        :class:`~microspec.replies.captureAverage_response`
+          - status
+          - num_pixels
+          - num_frames
+          - pixels
+          - std
+
+        Examples
+        --------
+
+        *Setup*:
+
+        >>> import microspec as usp
+        >>> kit = usp.Devkit() #doctest: +SKIP
+
+        Average ten frames:
+
+        >>> reply = kit.captureAverage(10) #doctest: +SKIP
+        >>> reply.status, reply.num_pixels, reply.num_frames #doctest: +SKIP
+        ('OK', 392, 10)
+
+        Co-add ten frames:
+
+        >>> reply = kit.captureAverage(10, mode='sum') #doctest: +SKIP
+
+        Notes
+        -----
+        Frames accumulate in preallocated arrays (see
+        :class:`~microspec.averaging.FrameAccumulator`) as they
+        arrive. The command for the next frame is sent before the
+        current frame is accumulated, so accumulation overlaps the
+        next exposure.
+
+        A frame that times out issues a ``UserWarning`` and is
+        dropped, and so is a frame with an ``ERROR`` status.
+        ``num_frames`` in the reply counts only the frames that
+        were combined. If every frame was dropped, the status is
+        ``'TIMEOUT'`` if any of them timed out, else ``'ERROR'``.
+
+        See Also
+        --------
+        captureFrame
+        """
+
+        accumulator = FrameAccumulator(num_frames, mode, sigma)
+        num_timeouts = 0 # frames dropped because they timed out
+        for _reply in self._sendAhead(num_frames, self._receiveCheckedReply):
+            # Handle case where the command timed out: drop the frame.
+            self.warn_if_cmd_timedout(
+                    _reply,
+                    command_name="captureAverage",
+                    suggestion="Dropped one frame."
+                    )
+            if self.is_out_of_time(_reply):
+                num_timeouts += 1
+                continue
+            if _reply.status != OK: continue
+            accumulator.add(_reply.pixels)
+
+        # Create the reply. Use bad data if every frame was dropped:
+        # TIMEOUT if any frame timed out, else every frame was an ERROR.
+        if accumulator.count == 0:
+            return replies.captureAverage_response(
+                    status = 'TIMEOUT' if num_timeouts else 'ERROR',
+                    num_pixels = 0, # <--- bad data
+                    num_frames = 0, # <--- bad data
+                    pixels = np.empty(0), # <--- bad data
+                    std = np.empty(0) # <------ bad data
+                    )
+        pixels, std = accumulator.result()
+        return replies.captureAverage_response(
+                status = status_dict.get(OK),
+                num_pixels = accumulator.num_pixels,
+                num_frames = accumulator.count,
+                pixels = pixels,
+                std = std
+                )
+
+    def autoExposure(
+            self,
+            host : bool = False
+            ):
         """Auto-expose the spectrometer.
 
         Tell dev-kit firmware to adjust spectrometer exposure time until
         peak signal strength hits the auto-expose target.
 
+        Parameters
+        ----------
+        host : bool
+            If ``True``, run the auto-expose algorithm on the host
+            computer instead of in the dev-kit firmware (see
+            :func:`~microspec.exposure.host_auto_exposure`). The
+            host algorithm predicts the exposure time from one
+            short probe frame and usually needs fewer exposures. It
+            uses the same auto-expose configuration. Default:
+            ``False``.
+
         Returns
         -------
         :class:`~microspec.replies.autoExposure_response`
@@ -887,8 +1677,13 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
         >>> kit.autoExposure() # doctest: +SKIP
         autoExposure_response(status='OK', success='GAVE_UP', iterations=4)
 
+        >>> kit.autoExposure(host=True) # doctest: +SKIP
+        autoExposure_response(status='OK', success='HIT_TARGET', iterations=2)
+
         """
 
+        if host: return host_auto_exposure(self)
+
         # Send command and get low-level reply.
         _reply = super().autoExposure()
 
@@ -907,6 +1702,11 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
                 iterations = _reply.iterations
                 )
 
+        # Firmware changed the exposure time: sync Devkit exposure
+        # time attrs with dev-kit state.
+        if reply.status == 'OK':
+            self.getExposure()
+
         return reply
 
     def getAutoExposeConfig(self):
@@ -948,8 +1748,14 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
                 max_exposure     = _reply.max_exposure
                 )
 
+        # Update Devkit autoexpose_config attr
+        if reply.status == 'OK':
+            self.autoexpose_config = reply
+            self._confirmed['autoexpose_config'] = tuple(reply[1:])
+
         return reply
 
+    @validated
     def setAutoExposeConfig(
             self,
             max_tries : int = 12,
@@ -957,10 +1763,18 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
             stop_pixel : int = 392,
             target : int = 46420,
             target_tolerance : int = 3277,
-            max_exposure : int = 10000
+            max_exposure : int = 10000,
+            force : bool = False
             ):
         """One-liner
 
+        Parameters
+        ----------
+        force : bool
+            Send the command even if :attr:`Devkit.elide` is on
+            and the dev-kit is already in the requested state.
+            Default: ``False``.
+
         Examples
         --------
 
@@ -990,7 +1804,10 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
                                     max_exposure=10000)
 
         """
-        raise_TypeError_if_any_int_args_are_negative(locals())
+        config = (max_tries, start_pixel, stop_pixel,
+                  target, target_tolerance, max_exposure)
+        if self._is_redundant('autoexpose_config', config, force):
+            return replies.setAutoExposeConfig_response(status = 'OK')
 
         # Send command and get low-level reply.
         _reply = super().setAutoExposeConfig(
@@ -1061,4 +1878,67 @@ class Devkit(MicroSpecSimpleInterface, TimeoutHandler):
                 ) if TIMEOUT else replies.setAutoExposeConfig_response(
                     status_dict.get(_reply.status)
                 )
+
+        # Update Devkit autoexpose_config attr
+        if reply.status == 'OK':
+            self.autoexpose_config = replies.getAutoExposeConfig_response(
+                status           = 'OK',
+                max_tries        = max_tries,
+                start_pixel      = start_pixel,
+                stop_pixel       = stop_pixel,
+                target           = target,
+                target_tolerance = target_tolerance,
+                max_exposure     = max_exposure
+                )
+            self._confirmed['autoexpose_config'] = config
+
         return reply
+
+    def batch(self) -> CommandBatch:
+        """Collect commands and send them to the dev-kit all at once.
+
+        Returns
+        -------
+        :class:`~microspec.batch.CommandBatch`
+            Call commands on the batch instead of on the
+            ``Devkit``. The commands are sent back-to-back when the
+            ``with`` block exits, and the replies are stored in the
+            batch attribute ``replies``.
+
+        Examples
+        --------
+
+        *Setup*:
+
+        >>> import microspec as usp
+        >>> kit = usp.Devkit() #doctest: +SKIP
+
+        Configure the dev-kit and capture a frame with one write:
+
+        >>> with kit.batch() as b: #doctest: +SKIP
+        ...     b.setBridgeLED(usp.OFF)
+        ...     b.setExposure(cycles=100)
+        ...     b.captureFrame()
+        >>> [reply.status for reply in b.replies] #doctest: +SKIP
+        ['OK', 'OK', 'OK']
+
+        Parameters are checked as commands are added, so nothing
+        is sent if a parameter is invalid:
+
+        >>> with kit.batch() as b: #doctest: +SKIP
+        ...     b.setBridgeLED(usp.OFF)
+        ...     b.setExposure(cycles=-1)
+        Traceback (most recent call last):
+        ...
+        TypeError: Parameter 'cycles' must be non-negative.
+
+        Notes
+        -----
+        A batch saves the time the host waits between commands,
+        most useful when sending many short commands.
+
+        See Also
+        --------
+        ~microspec.batch.CommandBatch
+        """
+        return CommandBatch(self)
@@ -212,6 +212,8 @@ HIT_TARGET = 1
 """int: Auto-expose hit the target signal range."""
 GAVE_UP = 0
 """int: Auto-expose did not hit the target signal range."""
+MAX_COUNTS = 65535 # 16-bit ADC
+"""int: Largest pixel value. A pixel at this value is saturated."""
 
 
 # Define user-friendly dicts to look up names from values in context.
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Correct frames for dark signal.
+
+There are two corrections:
+
+- subtract the *black level*: the first pixels of every frame
+  are optically black (7 pixels with
+  :data:`~microspec.constants.BINNING_ON`, 14 pixels with
+  :data:`~microspec.constants.BINNING_OFF`). Their mean is the
+  offset of that frame.
+- subtract a *master dark frame*: the average of frames captured
+  with no light on the sensor, at the same exposure time and
+  pixel configuration as the frames being corrected.
+
+Example
+-------
+
+Subtract the black level from a frame:
+
+>>> import microspec as usp
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> reply = kit.captureFrame() #doctest: +SKIP
+>>> pixels = usp.subtract_dark(reply.pixels) #doctest: +SKIP
+
+Subtract a cached master dark frame *and* the black level:
+
+>>> darks = usp.DarkFrameCache(kit) #doctest: +SKIP
+>>> darks.acquire() # <--- block the light first #doctest: +SKIP
+>>> pixels = darks.correct(kit.captureFrame().pixels) #doctest: +SKIP
+
+The corrections work on a single frame or on a 2-D batch of
+frames (one frame per row):
+
+>>> frames = [[1000, 1000, 1000, 1000, 1000, 1000, 1000, 1500]]
+>>> usp.subtract_dark(frames, num_black=7)
+array([[  0.,   0.,   0.,   0.,   0.,   0.,   0., 500.]])
+"""
+
+__all__ = [
+    'subtract_dark',
+    'num_black_pixels',
+    'DarkFrameCache',
+    ]
+
+import time
+import warnings
+import numpy as np
+
+_black_pixels = {392: 7, 784: 14}
+
+def num_black_pixels(num_pixels : int) -> int:
+    """Return the number of optically black pixels in a frame.
+
+    Parameters
+    ----------
+    num_pixels : int
+        Number of pixels in the frame: 392 (binning on) or 784
+        (binning off).
+
+    Example
+    -------
+
+    >>> import microspec as usp
+    >>> usp.num_black_pixels(392)
+    7
+    >>> usp.num_black_pixels(784)
+    14
+    """
+    try:
+        return _black_pixels[num_pixels]
+    except KeyError:
+        raise ValueError(
+            f"Expected 392 or 784 pixels, got {num_pixels}."
+            ) from None
+
+def subtract_dark(
+        pixels,
+        dark = None,
+        black_level : bool = True,
+        num_black : int = None,
+        out = None
+        ):
+    """Subtract dark signal from one frame or a batch of frames.
+
+    Parameters
+    ----------
+    pixels
+        One frame (1-D) or a batch of frames (2-D, one frame per
+        row).
+    dark
+        Master dark frame (1-D) to subtract, or ``None`` to skip.
+    black_level : bool
+        If ``True`` (default), subtract the mean of the optically
+        black pixels of each frame (after subtracting ``dark``,
+        this removes the drift in offset since the dark frame was
+        captured).
+    num_black : int
+        Number of optically black pixels. Default: determined
+        from the number of pixels per frame.
+    out : numpy.ndarray
+        Optional ``float64`` array to store the result in.
+
+    Returns
+    -------
+    numpy.ndarray
+        The corrected ``float64`` frame(s).
+    """
+    pixels = np.asarray(pixels)
+    if out is None:
+        out = np.empty(pixels.shape, dtype=np.float64)
+    if dark is not None:
+        np.subtract(pixels, dark, out=out)
+    else:
+        out[...] = pixels
+    if black_level:
+        if num_black is None: num_black = num_black_pixels(pixels.shape[-1])
+        out -= out[..., :num_black].mean(axis=-1, keepdims=True)
+    return out
+
+class DarkFrameCache():
+    """Cache master dark frames by exposure and pixel configuration.
+
+    A master dark frame only applies to frames captured with the
+    same exposure time (cycles), gain, binning, and row bitmap.
+    The cache keys each master dark frame by these four settings
+    and looks them up from the :class:`~microspec.commands.Devkit`
+    attributes, so looking up a dark frame does not talk to the
+    dev-kit.
+
+    Parameters
+    ----------
+    kit : :class:`~microspec.commands.Devkit`
+        The dev-kit that captures the frames.
+    num_frames : int
+        Number of frames to average into each master dark frame.
+    max_age : float
+        Seconds before a master dark frame is stale and is
+        captured again. ``None`` (default) means never stale.
+    shutter
+        Optional callable that blocks the light. The cache calls
+        ``shutter(True)`` before and ``shutter(False)`` after
+        capturing a master dark frame. Without a ``shutter``, the
+        application is responsible for blocking the light when a
+        master dark frame is captured.
+
+    Example
+    -------
+
+    >>> import microspec as usp
+    >>> kit = usp.Devkit() #doctest: +SKIP
+    >>> darks = usp.DarkFrameCache(kit, num_frames=16, max_age=600) #doctest: +SKIP
+    >>> pixels = darks.correct(kit.captureFrame().pixels) #doctest: +SKIP
+    """
+
+    def __init__(self,
+            kit,
+            num_frames : int = 16,
+            max_age : float = None,
+            shutter = None
+            ):
+        self.kit = kit
+        self.num_frames = num_frames
+        self.max_age = max_age
+        self.shutter = shutter
+        self._darks = {} # key: (dark frame, time captured)
+
+    def key(self) -> tuple:
+        """Return the cache key for the dev-kit's present settings.
+
+        The key is ``(exposure_time_cycles, gain, binning,
+        row_bitmap)``.
+        """
+        kit = self.kit
+        return (kit.exposure_time_cycles, kit.gain, kit.binning, kit.row_bitmap)
+
+    def acquire(self):
+        """Capture a master dark frame for the present settings.
+
+        Returns
+        -------
+        numpy.ndarray
+            The master dark frame, or ``None`` if every frame timed
+            out (the cache keeps its old entry in that case).
+        """
+        if self.shutter is not None: self.shutter(True)
+        try:
+            reply = self.kit.captureAverage(self.num_frames)
+        finally:
+            if self.shutter is not None: self.shutter(False)
+        if reply.status != 'OK':
+            warnings.warn(
+                "Could not capture a master dark frame "
+                f"(status={reply.status}).",
+                stacklevel=2
+                )
+            return None
+        self._darks[self.key()] = (reply.pixels, time.monotonic())
+        return reply.pixels
+
+    def get(self):
+        """Return the master dark frame for the present settings.
+
+        Capture a new master dark frame if there is none for the
+        present settings, or if it is older than ``max_age``.
+        """
+        entry = self._darks.get(self.key())
+        if entry is not None:
+            dark, captured = entry
+            if (self.max_age is None
+                    or time.monotonic() - captured <= self.max_age):
+                return dark
+        dark = self.acquire()
+        # Fall back to the stale dark frame if the capture failed.
+        if dark is None and entry is not None: return entry[0]
+        return dark
+
+    def invalidate(self) -> None:
+        """Forget every cached master dark frame."""
+        self._darks.clear()
+
+    def correct(self, pixels, black_level : bool = True, out = None):
+        """Subtract the master dark frame and the black level.
+
+        See :func:`subtract_dark` for the parameters. If there is
+        no master dark frame (every capture timed out), only the
+        black level is subtracted.
+        """
+        return subtract_dark(pixels, self.get(), black_level, out=out)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Decode raw frame bytes.
+
+The dev-kit sends each frame as a 4-byte header followed by the
+pixel payload: one big-endian 16-bit value per pixel.
+
+=======  =====  ==========================================
+offset   size   field
+=======  =====  ==========================================
+0        1      bridge status
+1        1      sensor status
+2        2      number of pixels (big-endian)
+4        2*N    pixel values (big-endian)
+=======  =====  ==========================================
+
+:func:`Devkit.captureFrame(raw=True)
+<microspec.commands.Devkit.captureFrame>` returns the header and
+the payload untouched. Decoding is then deferred until, and done
+in bulk when, the application needs the pixel values.
+
+Example
+-------
+
+>>> import microspec as usp
+>>> payload = bytes([0x00, 0x01, 0x12, 0x34, 0xff, 0xff])
+>>> usp.decode_pixels(payload)
+array([    1,  4660, 65535], dtype=uint16)
+
+Decode many frames at once into a 2-D array (one frame per row):
+
+>>> usp.decode_frames([payload, payload])
+array([[    1,  4660, 65535],
+       [    1,  4660, 65535]], dtype=uint16)
+"""
+
+__all__ = [
+    'HEADER',
+    'PIXEL_DTYPE',
+    'parse_header',
+    'decode_pixels',
+    'decode_frames',
+    ]
+
+import struct
+import numpy as np
+
+HEADER = struct.Struct('>BBH')
+"""struct.Struct: Frame header: bridge status, sensor status,
+number of pixels."""
+
+PIXEL_DTYPE = np.dtype('>u2')
+"""numpy.dtype: Pixel values in the payload: big-endian ``uint16``."""
+
+def parse_header(header) -> tuple:
+    """Return ``(bridge_status, sensor_status, num_pixels)``.
+
+    >>> import microspec as usp
+    >>> usp.parse_header(bytes([0, 0, 0x01, 0x88]))
+    (0, 0, 392)
+    """
+    return HEADER.unpack_from(header)
+
+def decode_pixels(payload, out = None):
+    """Decode one frame's payload.
+
+    Parameters
+    ----------
+    payload
+        ``bytes``, ``bytearray``, or ``memoryview`` of big-endian
+        pixel values.
+    out : numpy.ndarray
+        Optional array of ``len(payload)//2`` values to decode
+        into (any numeric dtype, e.g., a row of a 2-D block).
+
+    Returns
+    -------
+    numpy.ndarray
+        Native-endian ``uint16`` pixel values (or ``out``).
+    """
+    pixels = np.frombuffer(payload, dtype=PIXEL_DTYPE)
+    if out is None: return pixels.astype(np.uint16)
+    out[...] = pixels
+    return out
+
+def decode_frames(payloads, num_pixels : int = None, out = None):
+    """Decode the payloads of many frames into a 2-D array.
+
+    Parameters
+    ----------
+    payloads
+        A sequence of payloads with the same number of pixels, or
+        one buffer with the payloads back-to-back (then give
+        ``num_pixels``).
+    num_pixels : int
+        Pixels per frame, if ``payloads`` is one buffer.
+    out : numpy.ndarray
+        Optional 2-D array to decode into.
+
+    Returns
+    -------
+    numpy.ndarray
+        ``uint16`` array with one frame per row (or ``out``).
+    """
+    if num_pixels is None:
+        buffer = b''.join(payloads)
+        num_pixels = len(payloads[0])//2 if len(payloads) else 0
+    else:
+        buffer = payloads
+    pixels = np.frombuffer(buffer, dtype=PIXEL_DTYPE)
+    pixels = pixels.reshape(-1, num_pixels) if num_pixels else pixels.reshape(0, 0)
+    if out is None: return pixels.astype(np.uint16)
+    out[...] = pixels
+    return out
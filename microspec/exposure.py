@@ -0,0 +1,546 @@
+# -*- coding: utf-8 -*-
+"""Adjust exposure time on the host computer.
+
+Example
+-------
+
+Auto-expose with the host-side algorithm instead of the firmware
+algorithm:
+
+>>> import microspec as usp
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> kit.autoExposure(host=True) #doctest: +SKIP
+autoExposure_response(status='OK', success='HIT_TARGET', iterations=2)
+
+Pixel counts are linear in exposure time (above the dark
+offset), so one frame is enough to predict the exposure time that
+puts the peak on target:
+
+>>> usp.predict_exposure(cycles=100, peak=11000, offset=1000, target=46000)
+450
+
+Keep the peak on target while streaming, e.g., while the light
+source warms up:
+
+>>> tracker = usp.ExposureTracker(kit) #doctest: +SKIP
+>>> for reply in tracker.frames(1000): #doctest: +SKIP
+...     process(reply.pixels)
+>>> tracker.log[-1] #doctest: +SKIP
+ExposureAdjustment(frame=212, peak=52301, old_cycles=450, new_cycles=398,
+                   status='OK')
+
+Skip the search when the scene was auto-exposed before:
+
+>>> cache = usp.AutoExposureCache(kit) #doctest: +SKIP
+>>> cache.autoExposure() #doctest: +SKIP
+autoExposure_response(status='OK', success='HIT_TARGET', iterations=1)
+"""
+
+__all__ = [
+    'predict_exposure',
+    'host_auto_exposure',
+    'ExposureTracker',
+    'ExposureAdjustment',
+    'AutoExposureCache',
+    ]
+
+from collections import deque, namedtuple, OrderedDict
+import time
+import numpy as np
+from microspec.constants import *
+from microspec.correction import num_black_pixels, subtract_dark
+from microspec.quality import frame_stats
+import microspec.replies as replies
+
+def predict_exposure(
+        cycles : int,
+        peak : float,
+        offset : float,
+        target : float,
+        min_cycles : int = MIN_CYCLES,
+        max_cycles : int = MAX_CYCLES
+        ) -> int:
+    """Predict the exposure time that puts the peak on target.
+
+    Parameters
+    ----------
+    cycles : int
+        Exposure time of the measured frame.
+    peak : float
+        Peak counts of the measured frame.
+    offset : float
+        Dark offset: the counts at zero exposure time, e.g., the
+        mean of the optically black pixels.
+    target : float
+        Target peak counts.
+    min_cycles, max_cycles : int
+        Clamp the prediction to this range.
+
+    Returns
+    -------
+    int
+        Predicted exposure time in cycles.
+
+    Notes
+    -----
+    Counts above the offset are proportional to exposure time:
+
+    ``target - offset = (peak - offset) * predicted/cycles``
+
+    If the peak is not above the offset, there is no signal to
+    scale, so the prediction is ten times the exposure time.
+    """
+    signal = peak - offset
+    if signal <= 0: predicted = 10*cycles
+    else: predicted = cycles*(target - offset)/signal
+    return int(min(max(round(predicted), min_cycles), max_cycles))
+
+def host_auto_exposure(kit, max_tries : int = 3, probe_cycles : int = None):
+    """Auto-expose by predicting the exposure time on the host.
+
+    Applications call this with
+    :func:`Devkit.autoExposure(host=True)
+    <microspec.commands.Devkit.autoExposure>`.
+
+    Parameters
+    ----------
+    kit : :class:`~microspec.commands.Devkit`
+        The dev-kit to auto-expose.
+    max_tries : int
+        Maximum number of frames to capture, including the probe
+        frame. Default: 3.
+    probe_cycles : int
+        Exposure time of the first (probe) frame. Default: a tenth
+        of the present exposure time (at least
+        :data:`~microspec.constants.MIN_CYCLES`), short enough that
+        the probe frame is rarely saturated.
+
+    Returns
+    -------
+    :class:`~microspec.replies.autoExposure_response`
+
+    Notes
+    -----
+    The algorithm uses the dev-kit's auto-expose configuration
+    (see :func:`~microspec.commands.Devkit.setAutoExposeConfig`):
+    the peak is found between ``start_pixel`` and ``stop_pixel``,
+    the target range is ``target ± target_tolerance``, and
+    exposure time is at most ``max_exposure`` cycles.
+
+    1. Capture a short probe frame (see ``probe_cycles``). Stop if
+       the peak is in the target range.
+    2. Predict the exposure time that puts the peak on target
+       (:func:`predict_exposure`) and set it. If the frame
+       was saturated, the peak under-estimates the signal, so
+       divide the exposure time by four instead.
+    3. Repeat, up to ``max_tries`` frames.
+
+    Auto-expose gives up if the exposure time is at its maximum
+    and the peak is below target, or if the exposure time is at
+    its minimum and the peak is above target.
+    """
+    if max_tries < 1:
+        raise ValueError("max_tries must be at least 1.")
+    config = kit.autoexpose_config
+    max_cycles = min(config.max_exposure, MAX_CYCLES)
+    if probe_cycles is None:
+        probe_cycles = max(kit.exposure_time_cycles//10, MIN_CYCLES)
+    probe_cycles = int(min(max(probe_cycles, MIN_CYCLES), max_cycles))
+    if probe_cycles != kit.exposure_time_cycles:
+        reply = kit.setExposure(cycles=probe_cycles)
+        if reply.status != 'OK':
+            return replies.autoExposure_response(
+                    status = reply.status,
+                    success = '', # <------- bad data
+                    iterations = 0, # <----- bad data
+                    )
+    for iterations in range(1, max_tries+1):
+        reply = kit.captureFrame()
+        if reply.status != 'OK':
+            return replies.autoExposure_response(
+                    status = reply.status,
+                    success = '', # <------- bad data
+                    iterations = 0, # <----- bad data
+                    )
+        pixels = np.asarray(reply.pixels)
+        stats = frame_stats(
+                pixels,
+                start_pixel      = config.start_pixel,
+                stop_pixel       = config.stop_pixel,
+                target           = config.target,
+                target_tolerance = config.target_tolerance
+                )
+        if stats.in_target: break
+        cycles = kit.exposure_time_cycles
+        if (stats.underexposed and cycles >= max_cycles) or (
+                stats.overexposed and cycles <= MIN_CYCLES):
+            break
+        if iterations == max_tries: break
+        if stats.num_saturated > 0:
+            predicted = max(cycles//4, MIN_CYCLES)
+        else:
+            offset = pixels[:num_black_pixels(reply.num_pixels)].mean()
+            predicted = predict_exposure(
+                    cycles, stats.peak, offset, config.target,
+                    max_cycles = max_cycles
+                    )
+        reply = kit.setExposure(cycles=predicted)
+        if reply.status != 'OK':
+            return replies.autoExposure_response(
+                    status = reply.status,
+                    success = '', # <------- bad data
+                    iterations = 0, # <----- bad data
+                    )
+    return replies.autoExposure_response(
+            status = 'OK',
+            success = success_dict.get(
+                HIT_TARGET if stats.in_target else GAVE_UP
+                ),
+            iterations = iterations
+            )
+
+ExposureAdjustment = namedtuple(
+        'ExposureAdjustment',
+        ['frame', 'peak', 'old_cycles', 'new_cycles', 'status']
+        )
+"""One entry in the :attr:`ExposureTracker.log`.
+
+frame : int
+    Index of the frame (counting from 0) that triggered the
+    adjustment.
+peak : int
+    Peak counts of that frame.
+old_cycles, new_cycles : int
+    Exposure time before and after the adjustment.
+status : str
+    Status of the :func:`~microspec.commands.Devkit.setExposure`
+    reply. The exposure time is unchanged if it is not ``'OK'``.
+"""
+
+class ExposureTracker():
+    """Adjust exposure time between frames to keep the peak on target.
+
+    The tracker is a closed-loop controller: it looks at the peak
+    of every frame and, if the peak drifted out of the target
+    range, sets a new exposure time with
+    :func:`~microspec.commands.Devkit.setExposure` before the next
+    frame is captured. Use it when the light changes slowly during
+    a long measurement.
+
+    Parameters
+    ----------
+    kit : :class:`~microspec.commands.Devkit`
+        The dev-kit capturing the frames.
+    hysteresis : int
+        Once the peak is in the target range, it must leave the
+        range by this many more counts before the tracker adjusts
+        exposure time again. Default: 0.
+    max_step : float
+        Rate limit: one adjustment changes exposure time by at most
+        this factor (up or down). Default: 2.
+    holdoff : int
+        Number of frames to skip after an adjustment before looking
+        at the peak again. Default: 0 (the next frame is already
+        captured with the new exposure time).
+    log_size : int
+        Number of adjustments to keep in :attr:`log`. Default: 100.
+
+    Attributes
+    ----------
+    log : collections.deque
+        The most recent adjustments, oldest first, as
+        :class:`ExposureAdjustment` entries.
+    num_frames : int
+        Number of frames the tracker has looked at.
+
+    Notes
+    -----
+    The target range, peak pixel range, and maximum exposure time
+    come from the dev-kit's auto-expose configuration (see
+    :func:`~microspec.commands.Devkit.setAutoExposeConfig`), just
+    like :func:`host_auto_exposure`. The tracker always aims for
+    the center of the target range, so small fluctuations around
+    the target do not cause adjustments.
+
+    A saturated frame divides exposure time by ``max_step``.
+    """
+
+    def __init__(self,
+            kit,
+            hysteresis : int = 0,
+            max_step : float = 2.0,
+            holdoff : int = 0,
+            log_size : int = 100
+            ):
+        if max_step <= 1:
+            raise ValueError("max_step must be greater than 1.")
+        self.kit = kit
+        self.hysteresis = hysteresis
+        self.max_step = max_step
+        self.holdoff = holdoff
+        self.log = deque(maxlen=log_size)
+        self.num_frames = 0
+        self._locked = False
+        self._skip = 0
+
+    def update(self, reply):
+        """Look at one frame and adjust exposure time if needed.
+
+        Parameters
+        ----------
+        reply : :class:`~microspec.replies.captureFrame_response`
+            The frame just captured. Frames that did not return
+            ``'OK'`` are ignored.
+
+        Returns
+        -------
+        :class:`ExposureAdjustment`
+            The adjustment, or ``None`` if exposure time did not
+            change.
+        """
+        frame = self.num_frames
+        self.num_frames += 1
+        if reply.status != 'OK': return None
+        if self._skip > 0:
+            self._skip -= 1
+            return None
+        config = self.kit.autoexpose_config
+        tolerance = config.target_tolerance
+        if self._locked: tolerance += self.hysteresis
+        pixels = np.asarray(reply.pixels)
+        stats = frame_stats(
+                pixels,
+                start_pixel      = config.start_pixel,
+                stop_pixel       = config.stop_pixel,
+                target           = config.target,
+                target_tolerance = tolerance
+                )
+        self._locked = stats.in_target
+        if stats.in_target: return None
+        cycles = self.kit.exposure_time_cycles
+        max_cycles = min(config.max_exposure, MAX_CYCLES)
+        if stats.num_saturated > 0:
+            predicted = cycles/self.max_step
+        else:
+            offset = pixels[:num_black_pixels(reply.num_pixels)].mean()
+            predicted = predict_exposure(
+                    cycles, stats.peak, offset, config.target,
+                    max_cycles = max_cycles
+                    )
+        predicted = min(max(predicted, cycles/self.max_step),
+                        cycles*self.max_step)
+        predicted = int(min(max(round(predicted), MIN_CYCLES), max_cycles))
+        if predicted == cycles: return None # at a limit
+        status = self.kit.setExposure(cycles=predicted).status
+        adjustment = ExposureAdjustment(
+                frame = frame,
+                peak = stats.peak,
+                old_cycles = cycles,
+                new_cycles = predicted,
+                status = status
+                )
+        self.log.append(adjustment)
+        if status == 'OK': self._skip = self.holdoff
+        return adjustment
+
+    def frames(self, num_frames : int = None):
+        """Capture frames, tracking exposure time between frames.
+
+        Same as :func:`Devkit.captureFrames
+        <microspec.commands.Devkit.captureFrames>`, but calls
+        :func:`update` on each frame before yielding it.
+        """
+        for reply in self.kit.captureFrames(num_frames):
+            self.update(reply)
+            yield reply
+
+class AutoExposureCache():
+    """Remember auto-expose results by scene.
+
+    Auto-expose captures several frames to find the exposure time.
+    If the application returns to a scene it auto-exposed before
+    (same light source, same sample), the cache recognizes the
+    scene from one short-exposure frame and jumps straight to the
+    exposure time found last time.
+
+    Parameters
+    ----------
+    kit : :class:`~microspec.commands.Devkit`
+        The dev-kit to auto-expose.
+    max_entries : int
+        Number of scenes to remember. The least recently used scene
+        is forgotten first. Default: 16.
+    max_age : float
+        Seconds before a cached result is stale. ``None`` (default)
+        means never stale.
+    probe_cycles : int
+        Exposure time of the frame that identifies the scene.
+        Default: 50 (1 millisecond).
+    num_bins : int
+        The scene signature is the probe frame (black level
+        subtracted) averaged down to this many bins. Default: 16.
+    tolerance : float
+        Two signatures are the same scene if no bin differs by
+        more than this fraction of the brightest bin. Default: 0.1.
+
+    Attributes
+    ----------
+    hits, misses : int
+        Number of :func:`autoExposure` calls that used a cached
+        result and that ran auto-expose.
+
+    Notes
+    -----
+    Scenes only match if the gain, binning, row bitmap, and
+    auto-expose target settings are also the same.
+    """
+
+    def __init__(self,
+            kit,
+            max_entries : int = 16,
+            max_age : float = None,
+            probe_cycles : int = 50,
+            num_bins : int = 16,
+            tolerance : float = 0.1
+            ):
+        self.kit = kit
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.probe_cycles = probe_cycles
+        self.num_bins = num_bins
+        self.tolerance = tolerance
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # id: (key, signature, cycles, time)
+        self._next_id = 0
+
+    def key(self) -> tuple:
+        """Return the settings a cached result depends on.
+
+        The key is ``(gain, binning, row_bitmap, start_pixel,
+        stop_pixel, target, target_tolerance, max_exposure)``.
+        """
+        kit = self.kit
+        config = kit.autoexpose_config
+        return (kit.gain, kit.binning, kit.row_bitmap,
+                config.start_pixel, config.stop_pixel, config.target,
+                config.target_tolerance, config.max_exposure)
+
+    def signature(self):
+        """Capture a probe frame and return the scene signature.
+
+        Leaves exposure time at ``probe_cycles``. Returns ``None``
+        if a command did not return ``'OK'``.
+        """
+        return self._probe()[1]
+
+    def _probe(self) -> tuple:
+        """Return ``(status, signature)`` for :func:`signature`:
+        the status of the first command that did not return
+        ``'OK'`` and ``None``, or ``'OK'`` and the signature."""
+        reply = self.kit.setExposure(cycles=self.probe_cycles)
+        if reply.status != 'OK': return reply.status, None
+        reply = self.kit.captureFrame()
+        if reply.status != 'OK': return reply.status, None
+        pixels = subtract_dark(reply.pixels)
+        edges = np.linspace(0, len(pixels), self.num_bins + 1).astype(int)
+        return 'OK', np.add.reduceat(pixels, edges[:-1])/np.diff(edges)
+
+    def lookup(self, signature):
+        """Return the cached exposure time for a scene, or ``None``."""
+        entry_id = self._find(signature)
+        if entry_id is None: return None
+        return self._entries[entry_id][2]
+
+    def _find(self, signature):
+        key = self.key()
+        now = time.monotonic()
+        for entry_id, (entry_key, cached, _, stored) in list(
+                self._entries.items()):
+            if self.max_age is not None and now - stored > self.max_age:
+                del self._entries[entry_id]
+                continue
+            if entry_key != key: continue
+            scale = max(np.abs(cached).max(), 1.0)
+            if np.abs(signature - cached).max() <= self.tolerance*scale:
+                self._entries.move_to_end(entry_id)
+                return entry_id
+        return None
+
+    def store(self, signature, cycles : int) -> None:
+        """Remember the exposure time for a scene."""
+        self._entries[self._next_id] = (
+                self.key(), signature, cycles, time.monotonic()
+                )
+        self._next_id += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """Forget every cached scene."""
+        self._entries.clear()
+
+    def autoExposure(self, host : bool = False):
+        """Auto-expose, using a cached result if the scene matches.
+
+        1. Capture a probe frame and compute the scene signature.
+        2. If the scene is cached, set its exposure time and check
+           with one frame that the peak is in the target range.
+        3. Otherwise (or if the check fails), run
+           :func:`Devkit.autoExposure
+           <microspec.commands.Devkit.autoExposure>` and cache the
+           result if it hit the target.
+
+        Parameters
+        ----------
+        host : bool
+            Passed to :func:`Devkit.autoExposure
+            <microspec.commands.Devkit.autoExposure>` on a miss.
+
+        Returns
+        -------
+        :class:`~microspec.replies.autoExposure_response`
+            On a hit, ``iterations`` is 1 (the checking frame). If
+            a command did not return ``'OK'``, its status.
+
+        Notes
+        -----
+        On a miss, the exposure time from before the probe frame
+        is set again before auto-expose runs, so auto-expose starts
+        from it (e.g., the host auto-expose probe frame is a tenth
+        of it).
+        """
+        kit = self.kit
+        cycles = kit.exposure_time_cycles
+        status, signature = self._probe()
+        if signature is None: return self._failed(status)
+        entry_id = self._find(signature)
+        if entry_id is not None:
+            cycles = self._entries[entry_id][2]
+            if kit.setExposure(cycles=cycles).status == 'OK':
+                reply = kit.captureFrame(stats=True)
+                if reply.status == 'OK' and reply.stats.in_target:
+                    self.hits += 1
+                    return replies.autoExposure_response(
+                            status = 'OK',
+                            success = success_dict.get(HIT_TARGET),
+                            iterations = 1
+                            )
+            # The scene changed (or the check timed out): search again.
+            del self._entries[entry_id]
+        self.misses += 1
+        reply = kit.setExposure(cycles=cycles)
+        if reply.status != 'OK': return self._failed(reply.status)
+        reply = kit.autoExposure(host=host)
+        if reply.status == 'OK' and reply.success == success_dict.get(HIT_TARGET):
+            self.store(signature, kit.exposure_time_cycles)
+        return reply
+
+    @staticmethod
+    def _failed(status : str):
+        return replies.autoExposure_response(
+                status = status,
+                success = '', # <------- bad data
+                iterations = 0, # <----- bad data
+                )
+
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""Smooth frames across pixels and across time.
+
+A :class:`SavitzkyGolay` filter smooths each frame across pixels.
+An :class:`ExponentialMovingAverage` smooths each pixel across
+frames. Both keep their kernels, state and output buffers between
+frames, so filtering a stream of frames does not allocate a new
+array per frame.
+
+Example
+-------
+
+Filter a live stream from
+:func:`~microspec.commands.Devkit.captureFrames`:
+
+>>> import microspec as usp
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> sg = usp.SavitzkyGolay(window=11, order=2)
+>>> ema = usp.ExponentialMovingAverage(alpha=0.2)
+>>> for reply, smoothed in usp.filter_frames( #doctest: +SKIP
+...         kit.captureFrames(100, compact=True), sg, ema):
+...     plot(smoothed)
+
+Or filter frames already captured (one frame per row):
+
+>>> frames = [[0, 0, 9, 0, 0], [1, 2, 3, 4, 5]]
+>>> usp.SavitzkyGolay(window=3, order=1).apply(frames)
+array([[-1.5,  3. ,  3. ,  3. , -1.5],
+       [ 1. ,  2. ,  3. ,  4. ,  5. ]])
+>>> usp.ExponentialMovingAverage(alpha=0.5).apply(frames)
+array([[0. , 0. , 9. , 0. , 0. ],
+       [0.5, 1. , 6. , 2. , 2.5]])
+"""
+
+__all__ = ['SavitzkyGolay', 'ExponentialMovingAverage', 'filter_frames']
+
+from math import factorial
+import numpy as np
+from microspec.decode import decode_pixels
+
+def _fit_matrix(window : int, order : int, deriv : int):
+    """Return the ``(window, window)`` matrix that maps the samples
+    in a window to the fitted polynomial (or its derivative) at each
+    position of the window."""
+    half = window//2
+    offsets = np.arange(-half, half + 1, dtype=np.float64)
+    powers = np.arange(order + 1)
+    fit = np.linalg.pinv(offsets[:, None]**powers) # samples -> coefficients
+    # Derivative of each power at each offset.
+    scale = np.array([
+        factorial(k)/factorial(k - deriv) if k >= deriv else 0.0 for k in powers
+        ])
+    evaluate = scale*offsets[:, None]**np.maximum(powers - deriv, 0)
+    return evaluate @ fit
+
+class SavitzkyGolay():
+    """Savitzky-Golay smoothing across the pixels of a frame.
+
+    Each pixel is replaced by the value at that pixel of the
+    least-squares polynomial fit to the ``window`` pixels around it.
+    At the ends of the frame, the fit to the first (last) window is
+    used.
+
+    Parameters
+    ----------
+    window : int
+        Number of pixels in the fit (odd).
+    order : int
+        Order of the polynomial (less than ``window``).
+    deriv : int
+        Order of the derivative to return (``0`` smooths the
+        frame). The derivative is in counts per pixel.
+
+    Notes
+    -----
+    The kernels are computed when the filter is created. The output
+    buffers are allocated once per number of pixels (392 or 784),
+    when the first frame of that size arrives.
+    """
+
+    def __init__(self, window : int = 11, order : int = 2, deriv : int = 0):
+        if window < 1 or window % 2 == 0:
+            raise ValueError(f"window must be a positive odd number, got {window}.")
+        if not 0 <= order < window:
+            raise ValueError(f"order must be in [0, {window}), got {order}.")
+        if not 0 <= deriv <= order:
+            raise ValueError(f"deriv must be in [0, {order}], got {deriv}.")
+        self.window = window
+        self.order = order
+        self.deriv = deriv
+        self._fit = _fit_matrix(window, order, deriv)
+        self._buffers = {} # num_pixels: (out, scratch)
+
+    def _buffers_for(self, shape):
+        num_pixels = shape[-1]
+        if num_pixels < self.window:
+            raise ValueError(
+                f"Frame has {num_pixels} pixels, fewer than the window ({self.window})."
+                )
+        out = np.empty(shape, dtype=np.float64)
+        scratch = np.empty(shape[:-1] + (num_pixels - self.window + 1,))
+        return out, scratch
+
+    def __call__(self, pixels):
+        """Smooth one frame.
+
+        Returns
+        -------
+        numpy.ndarray
+            The smoothed frame. The same array is reused for the
+            next frame with the same number of pixels: copy it to
+            keep it.
+        """
+        pixels = np.asarray(pixels)
+        buffers = self._buffers.get(pixels.shape[-1])
+        if buffers is None or buffers[0].shape != pixels.shape:
+            buffers = self._buffers[pixels.shape[-1]] = self._buffers_for(pixels.shape)
+        return self._smooth(pixels, *buffers)
+
+    def apply(self, frames):
+        """Smooth a batch of frames (one frame per row) into a new
+        array."""
+        frames = np.asarray(frames)
+        return self._smooth(frames, *self._buffers_for(frames.shape))
+
+    def _smooth(self, x, out, scratch):
+        window, half = self.window, self.window//2
+        num_pixels = x.shape[-1]
+        stop = num_pixels - window + 1
+        # Interior: correlate with the center kernel, one shift at a time.
+        kernel = self._fit[half]
+        inside = out[..., half:num_pixels - half]
+        np.multiply(x[..., :stop], kernel[0], out=inside)
+        for k in range(1, window):
+            np.multiply(x[..., k:k + stop], kernel[k], out=scratch)
+            inside += scratch
+        # Ends: evaluate the fit to the first and last window.
+        np.matmul(x[..., :window], self._fit[:half].T, out=out[..., :half])
+        np.matmul(
+            x[..., num_pixels - window:], self._fit[half + 1:].T,
+            out=out[..., num_pixels - half:]
+            )
+        return out
+
+class ExponentialMovingAverage():
+    """Exponential moving average of each pixel across frames.
+
+    ``average = average + alpha*(frame - average)``
+
+    Parameters
+    ----------
+    alpha : float
+        Weight of the newest frame, in ``(0, 1]``.
+    span : float
+        Alternative to ``alpha``: ``alpha = 2/(span + 1)``.
+
+    Attributes
+    ----------
+    average : numpy.ndarray
+        The average so far (``None`` before the first frame).
+    num_frames : int
+        Number of frames in the average.
+
+    Notes
+    -----
+    The first frame starts the average. A frame with a different
+    number of pixels (the binning changed) starts a new average.
+    """
+
+    def __init__(self, alpha : float = None, span : float = None):
+        if (alpha is None) == (span is None):
+            raise TypeError("Give one of 'alpha' or 'span'.")
+        if alpha is None: alpha = 2/(span + 1)
+        if not 0 < alpha <= 1:
+            raise ValueError(f"alpha must be in (0, 1], got {alpha}.")
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        """Forget the average."""
+        self.average = None
+        self.num_frames = 0
+        self._scratch = None
+
+    def __call__(self, pixels):
+        """Add a frame to the average.
+
+        Returns
+        -------
+        numpy.ndarray
+            The average, updated in place: copy it to keep it.
+        """
+        pixels = np.asarray(pixels)
+        if self.average is None or self.average.shape != pixels.shape:
+            self.average = pixels.astype(np.float64)
+            self._scratch = np.empty_like(self.average)
+            self.num_frames = 1
+            return self.average
+        np.subtract(pixels, self.average, out=self._scratch)
+        self._scratch *= self.alpha
+        self.average += self._scratch
+        self.num_frames += 1
+        return self.average
+
+    def apply(self, frames):
+        """Add a batch of frames (one frame per row), in order.
+
+        Returns a new array with the average after each frame. The
+        average carries over to the next call, so a long recording
+        can be filtered in chunks.
+        """
+        frames = np.asarray(frames)
+        out = np.empty(frames.shape, dtype=np.float64)
+        for row, frame in zip(out, frames):
+            row[:] = self(frame)
+        return out
+
+def filter_frames(frames, *filters):
+    """Filter a stream of frames.
+
+    Parameters
+    ----------
+    frames
+        An iterable of :func:`~microspec.commands.Devkit.captureFrame`
+        replies (normal, compact, or raw), e.g.,
+        :func:`Devkit.captureFrames
+        <microspec.commands.Devkit.captureFrames>`.
+    filters
+        Filters to apply in order, e.g., a :class:`SavitzkyGolay`
+        then an :class:`ExponentialMovingAverage`.
+
+    Yields
+    ------
+    tuple
+        ``(reply, filtered)``. ``filtered`` is ``None`` if the
+        status of the frame is not ``'OK'``: such frames are not
+        added to a moving average.
+    """
+    for reply in frames:
+        if reply.status != 'OK':
+            yield reply, None
+            continue
+        if hasattr(reply, 'payload'):
+            pixels = decode_pixels(reply.payload)
+        else:
+            pixels = reply.pixels
+        for f in filters: pixels = f(pixels)
+        yield reply, pixels
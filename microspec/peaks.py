@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Find spectral peaks and their sub-pixel positions.
+
+:func:`find_peaks` works on one frame or on a 2-D batch of frames
+(one frame per row) in a single call, without a Python loop over
+frames or pixels.
+
+Example
+-------
+
+>>> import microspec as usp
+>>> frame = [0, 1, 5, 1, 0, 0, 3, 4, 3, 0, 1, 0]
+>>> peaks = usp.find_peaks(frame, prominence=2)
+>>> peaks.pixel
+array([3, 8])
+>>> peaks.position
+array([3., 8.])
+>>> peaks.prominence
+array([5., 4.])
+
+In a batch, ``peaks.frame`` tells which row each peak is in:
+
+>>> peaks = usp.find_peaks([frame, frame[::-1]], prominence=2)
+>>> peaks.frame
+array([0, 0, 1, 1])
+>>> peaks.pixel
+array([ 3,  8,  5, 10])
+"""
+
+__all__ = ['find_peaks', 'Peaks', 'CENTROID_METHODS']
+
+from collections import namedtuple
+import numpy as np
+
+CENTROID_METHODS = ('parabolic', 'gaussian', None)
+"""tuple: Ways :func:`find_peaks` estimates the sub-pixel position.
+
+- ``'parabolic'``: vertex of the parabola through the peak pixel
+  and its two neighbors
+- ``'gaussian'``: the same on the logarithm of the counts (exact
+  for a Gaussian line shape)
+- ``None``: the peak pixel itself
+"""
+
+Peaks = namedtuple(
+        'Peaks',
+        ['frame', 'pixel', 'position', 'height', 'prominence']
+        )
+"""The peaks found by :func:`find_peaks`, one array element per
+peak, ordered by frame then pixel.
+
+frame : numpy.ndarray
+    Row of the batch the peak is in (all ``0`` for one frame).
+pixel : numpy.ndarray
+    Pixel number of the peak (pixel numbers start at 1).
+position : numpy.ndarray
+    Sub-pixel position of the peak, as a pixel number.
+height : numpy.ndarray
+    Counts at the peak pixel.
+prominence : numpy.ndarray
+    Height of the peak above the higher of its two bases. A base
+    is the lowest point between the peak and the nearest higher
+    pixel (or the end of the frame) on that side.
+"""
+
+def _bases(x, rows, cols, step):
+    """Return the base on one side of each peak.
+
+    Walk away from all peaks at once, one pixel per pass, keeping
+    the running minimum. A peak drops out of the walk when it
+    reaches a higher pixel or the end of the frame, so each pass
+    only touches the peaks still walking.
+    """
+    num_pixels = x.shape[1]
+    flat = x.ravel()
+    base = np.empty(len(cols))
+    index = np.arange(len(cols))
+    start = rows*num_pixels # flat index of each peak's row
+    height = flat[start + cols]
+    low = height.copy()
+    while index.size:
+        cols = cols + step
+        edge = (cols < 0) | (cols >= num_pixels)
+        value = flat[start + np.clip(cols, 0, num_pixels - 1)]
+        stop = edge | (value > height)
+        base[index[stop]] = low[stop]
+        walk = ~stop
+        index, start, cols, height = index[walk], start[walk], cols[walk], height[walk]
+        low = np.minimum(low[walk], value[walk])
+    return base
+
+def find_peaks(
+        pixels,
+        prominence : float = 0,
+        height : float = None,
+        method : str = 'parabolic',
+        start_pixel : int = 1,
+        stop_pixel : int = None
+        ) -> Peaks:
+    """Find the peaks in one frame or a batch of frames.
+
+    Parameters
+    ----------
+    pixels
+        One frame (1-D) or a batch of frames (2-D, one frame per
+        row), e.g., ``reply.pixels`` or a
+        :class:`~microspec.replies.FrameBlock`'s ``pixels``.
+    prominence : float
+        Keep peaks with at least this prominence.
+    height : float
+        Keep peaks with at least these counts. Default: no limit.
+    method : str
+        One of the :data:`CENTROID_METHODS`. Default:
+        ``'parabolic'``.
+    start_pixel, stop_pixel : int
+        Only look for peaks in this range of pixels (pixel
+        numbers start at 1). Default: the whole frame.
+
+    Returns
+    -------
+    :class:`Peaks`
+
+    Notes
+    -----
+    A peak is a pixel higher than the pixel before it and not lower
+    than the pixel after it, so a flat top is one peak (its
+    parabolic position is the middle of the top). The first and
+    last pixel of the range are never peaks.
+
+    For an absorption spectrum, find the peaks of the negated
+    frame.
+    """
+    if method not in CENTROID_METHODS:
+        raise ValueError(
+            f"method must be one of {CENTROID_METHODS}, got {method!r}."
+            )
+    x = np.asarray(pixels, dtype=np.float64)
+    batch = x.ndim == 2
+    x = np.atleast_2d(x)[:, start_pixel-1:stop_pixel]
+    # Local maxima of the interior pixels.
+    center = x[:, 1:-1]
+    is_peak = (center > x[:, :-2]) & (center >= x[:, 2:])
+    if height is not None: is_peak &= center >= height
+    if prominence > 0:
+        # A base is never below the lowest pixel on its side, so
+        # drop the peaks that cannot reach the prominence before
+        # walking to their bases.
+        low_left = np.minimum.accumulate(x, axis=1)[:, :-2]
+        low_right = np.minimum.accumulate(x[:, ::-1], axis=1)[:, ::-1][:, 2:]
+        is_peak &= center - np.maximum(low_left, low_right) >= prominence
+    rows, cols = np.nonzero(is_peak)
+    cols = cols + 1
+    # Prominence: height above the higher base.
+    peak_height = x[rows, cols]
+    base = np.maximum(_bases(x, rows, cols, -1), _bases(x, rows, cols, +1))
+    peak_prominence = peak_height - base
+    keep = peak_prominence >= prominence
+    rows, cols = rows[keep], cols[keep]
+    peak_height, peak_prominence = peak_height[keep], peak_prominence[keep]
+    # Sub-pixel position from the peak and its neighbors.
+    left, right = x[rows, cols - 1], x[rows, cols + 1]
+    center = peak_height
+    if method == 'gaussian':
+        tiny = np.finfo(np.float64).tiny
+        left, center, right = (np.log(np.maximum(y, tiny)) for y in (left, center, right))
+    offset = np.zeros(len(cols))
+    if method is not None:
+        curvature = left - 2*center + right
+        np.divide(0.5*(left - right), curvature, out=offset, where=curvature != 0)
+    pixel = cols + start_pixel
+    return Peaks(
+            frame = rows if batch else np.zeros_like(rows),
+            pixel = pixel,
+            position = pixel + offset,
+            height = peak_height,
+            prominence = peak_prominence
+            )
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""Process frames in a pool of worker processes.
+
+Heavy per-frame analysis (peak fitting, baseline removal,
+concentration models, ...) limits the frame rate to what one core
+can do. A :class:`ProcessingStage` runs the analysis in several
+worker processes instead. Frames are passed to the workers in
+shared memory, not pickled, and the results come back in frame
+order.
+
+Example
+-------
+
+The analysis is a function of the pixel values (a ``uint16`` array
+view) defined at module level, so the workers can import it:
+
+>>> def peak_pixel(pixels):
+...     return int(pixels.argmax()) + 1
+
+Capture frames straight into shared memory and analyze them:
+
+>>> import microspec as usp
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> with usp.ProcessingStage(peak_pixel, num_workers=4) as stage: #doctest: +SKIP
+...     for result in stage.run(kit, num_frames=1000):
+...         print(result)
+...     print(stage.stats())
+StageStats(num_frames=1000, utilization=(0.93, 0.92, 0.94, 0.93),
+           queue_depth=0, max_queue_depth=8, seconds=2.1)
+
+Or analyze frames from any source, e.g., a
+:func:`~microspec.commands.Devkit.captureFrames` stream:
+
+>>> results = stage.process(kit.captureFrames(100, raw=True)) #doctest: +SKIP
+"""
+
+__all__ = ['ProcessingStage', 'StageStats']
+
+from collections import namedtuple
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+import numpy as np
+from microspec.constants import OK, ERROR
+from microspec.decode import decode_pixels
+from microspec.sharedmem import _shared_memory
+
+StageStats = namedtuple(
+        'StageStats',
+        ['num_frames', 'utilization', 'queue_depth', 'max_queue_depth', 'seconds']
+        )
+"""The load of a :class:`ProcessingStage`.
+
+num_frames : int
+    Number of frames submitted.
+utilization : tuple
+    For each worker, the fraction of the time it spent in the
+    analysis function.
+queue_depth : int
+    Number of frames submitted and not analyzed yet.
+max_queue_depth : int
+    Largest ``queue_depth`` so far. If it equals the number of
+    slots, the workers could not keep up.
+seconds : float
+    Time since the stage started.
+"""
+
+def _work(worker, function, name, num_slots, max_pixels, tasks, results):
+    """Worker process: analyze the frames in the slots it is given."""
+    shm = _shared_memory(name)
+    pixels = np.ndarray((num_slots, max_pixels), np.uint16, shm.buf)
+    try:
+        for index, slot, num_pixels in iter(tasks.get, None):
+            start = time.perf_counter()
+            try:
+                result, error = function(pixels[slot, :num_pixels]), None
+            except Exception as e:
+                result, error = None, e
+            busy = time.perf_counter() - start
+            try:
+                results.put((index, slot, worker, busy, result, error))
+            except Exception as e: # e.g., the result cannot be pickled
+                error = RuntimeError(f"Cannot send the result of frame {index}: {e!r}")
+                results.put((index, slot, worker, busy, None, error))
+    finally:
+        del pixels
+        shm.close()
+
+class ProcessingStage():
+    """Analyze frames in parallel, keeping frame order.
+
+    Parameters
+    ----------
+    function
+        Called in a worker process with the pixel values of one
+        frame, a ``uint16`` array view of shared memory. The view is
+        reused for a later frame after ``function`` returns: return
+        a copy of anything that must outlive the call. The return
+        value is pickled back to the application. ``function`` must
+        be picklable (defined at module level).
+    num_workers : int
+        Number of worker processes. Default: the number of CPUs.
+    num_slots : int
+        Number of frames in flight. Default: twice ``num_workers``.
+        When all slots are in use, submitting waits for a result.
+    max_pixels : int
+        Pixels per slot. Default: 784, the unbinned frame.
+    context : str
+        Optional :mod:`multiprocessing` start method, e.g.,
+        ``'spawn'``.
+
+    Attributes
+    ----------
+    num_frames : int
+        Number of frames submitted.
+    queue_depth : int
+        Number of frames submitted and not analyzed yet.
+    max_queue_depth : int
+        Largest ``queue_depth`` so far.
+
+    Notes
+    -----
+    Frames with a status other than ``'OK'`` are not analyzed:
+    their result is ``None``.
+
+    An exception raised by ``function`` is raised again by
+    :func:`process` (or :func:`run`) when its frame's result is
+    due. A result that cannot be pickled raises a
+    ``RuntimeError`` the same way. If a worker process dies,
+    waiting for a result raises a ``RuntimeError``.
+    """
+
+    def __init__(
+            self,
+            function,
+            num_workers : int = None,
+            num_slots : int = None,
+            max_pixels : int = 784,
+            context : str = None
+            ):
+        num_workers = num_workers or os.cpu_count() or 1
+        num_slots = num_slots or 2*num_workers
+        self.num_workers = num_workers
+        self.num_slots = num_slots
+        self.max_pixels = max_pixels
+        self.num_frames = 0
+        self.max_queue_depth = 0
+        self.queue_depth = 0
+        self._shm = _shared_memory(None, create=True, size=2*num_slots*max_pixels)
+        self._pixels = np.ndarray((num_slots, max_pixels), np.uint16, self._shm.buf)
+        self._free = list(range(num_slots))
+        self._busy = [0.0]*num_workers
+        self._done = {} # index: (result, error), waiting for earlier frames
+        self._next = 0 # index of the next result to return
+        self._broken = False # a worker died
+        ctx = multiprocessing.get_context(context)
+        self._tasks = ctx.SimpleQueue()
+        self._results = ctx.SimpleQueue()
+        self._workers = [
+                ctx.Process(
+                    target=_work,
+                    args=(worker, function, self._shm.name, num_slots,
+                          max_pixels, self._tasks, self._results),
+                    daemon=True
+                    )
+                for worker in range(num_workers)
+                ]
+        for process in self._workers: process.start()
+        self._start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Stop the workers and release the shared memory."""
+        if self._shm is None: return
+        while self.queue_depth and not self._broken:
+            self._collect() # frames still in flight
+        if self._broken:
+            for process in self._workers: process.terminate()
+        else:
+            for _ in self._workers: self._tasks.put(None)
+        for process in self._workers: process.join()
+        self._pixels = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def stats(self) -> StageStats:
+        """Return the :class:`StageStats` of the stage so far."""
+        seconds = time.perf_counter() - self._start
+        return StageStats(
+                num_frames = self.num_frames,
+                utilization = tuple(busy/seconds for busy in self._busy),
+                queue_depth = self.queue_depth,
+                max_queue_depth = self.max_queue_depth,
+                seconds = seconds
+                )
+
+    def _slot(self) -> int:
+        """Return a free slot, waiting for a result if there is none."""
+        while not self._free: self._collect()
+        return self._free.pop()
+
+    def _submit(self, slot, status_code, num_pixels):
+        index = self.num_frames
+        self.num_frames += 1
+        if status_code == OK:
+            self._tasks.put((index, slot, num_pixels))
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        else:
+            self._free.append(slot)
+            self._done[index] = (None, None)
+
+    def _collect(self, timeout : float = 0.1):
+        """Wait for one result, checking every ``timeout`` seconds
+        that the workers are alive."""
+        # SimpleQueue.get has no timeout: wait for its pipe or a worker
+        # that died instead.
+        waitables = [self._results._reader] + [p.sentinel for p in self._workers]
+        while self._results.empty():
+            for worker, process in enumerate(self._workers):
+                if not process.is_alive():
+                    self._broken = True
+                    raise RuntimeError(
+                        f"Worker {worker} died (exit code {process.exitcode})."
+                        )
+            multiprocessing.connection.wait(waitables, timeout)
+        index, slot, worker, busy, result, error = self._results.get()
+        self._free.append(slot)
+        self.queue_depth -= 1
+        self._busy[worker] += busy
+        self._done[index] = (result, error)
+
+    def _ready(self, wait : bool = False):
+        """Yield the results that are due, in frame order."""
+        while not self._results.empty(): self._collect()
+        while self._next < self.num_frames:
+            if self._next not in self._done:
+                if not wait: return
+                self._collect()
+                continue
+            result, error = self._done.pop(self._next)
+            self._next += 1
+            if error is not None: raise error
+            yield result
+
+    def process(self, frames):
+        """Analyze frames and yield the results in frame order.
+
+        Parameters
+        ----------
+        frames
+            An iterable of :func:`~microspec.commands.Devkit.captureFrame`
+            replies: normal, compact, or raw. Raw payloads are
+            decoded straight into shared memory.
+        """
+        for reply in frames:
+            slot = self._slot()
+            num_pixels = reply.num_pixels
+            if num_pixels > self.max_pixels:
+                self._free.append(slot)
+                raise ValueError(
+                    f"Frame has {num_pixels} pixels, slots hold {self.max_pixels}."
+                    )
+            pixels = self._pixels[slot, :num_pixels]
+            if hasattr(reply, 'payload'):
+                decode_pixels(reply.payload, out=pixels)
+            else:
+                pixels[:] = reply.pixels[:num_pixels]
+            status_code = OK if reply.status == 'OK' else ERROR
+            self._submit(slot, status_code, num_pixels)
+            yield from self._ready()
+        yield from self._ready(wait=True)
+
+    def run(self, kit, num_frames : int = None):
+        """Capture frames into shared memory and yield their results
+        in frame order.
+
+        Each frame is decoded straight into a free slot by
+        :func:`Devkit.captureFrame(out=...)
+        <microspec.commands.Devkit.captureFrame>`. Captures ``num_frames``
+        frames (forever if ``None``).
+        """
+        count = 0
+        while num_frames is None or count < num_frames:
+            slot = self._slot()
+            try:
+                reply = kit.captureFrame(out=self._pixels[slot])
+            except BaseException:
+                self._free.append(slot)
+                raise
+            self._submit(slot, reply.status_code, reply.num_pixels)
+            count += 1
+            yield from self._ready()
+        yield from self._ready(wait=True)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Per-pixel statistics over long runs.
+
+A :class:`PixelStatistics` keeps the running mean, variance,
+minimum, maximum and a histogram of the counts at every pixel. Its
+memory does not grow with the number of frames, so hours of
+frames can be characterized without storing them.
+
+Example
+-------
+
+>>> import microspec as usp
+>>> stats = usp.PixelStatistics(num_bins=4)
+>>> stats.add([100, 40000])
+>>> stats.add([[102, 40010], [104, 65535]]) # a batch
+>>> snapshot = stats.snapshot()
+>>> snapshot.count
+3
+>>> snapshot.mean
+array([  102., 48515.])
+>>> snapshot.max
+array([  104, 65535], dtype=uint16)
+>>> snapshot.histogram
+array([[3, 0, 0, 0],
+       [0, 0, 2, 1]], dtype=uint64)
+
+Tap a live stream from
+:func:`~microspec.commands.Devkit.captureFrames`:
+
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> for reply in stats.track(kit.captureFrames(1000, compact=True)): #doctest: +SKIP
+...     pass
+
+Accumulators filled in different threads or processes are combined
+with :func:`PixelStatistics.merge`.
+"""
+
+__all__ = ['PixelStatistics', 'PixelStats']
+
+from collections import namedtuple
+import numpy as np
+from microspec.constants import MAX_COUNTS
+from microspec.decode import decode_pixels
+
+PixelStats = namedtuple(
+        'PixelStats',
+        ['count', 'mean', 'variance', 'std', 'min', 'max', 'histogram', 'bin_edges']
+        )
+"""A snapshot of a :class:`PixelStatistics`, one array element
+(or row) per pixel. The arrays are copies: the snapshot does not
+change when more frames are added.
+
+count : int
+    Number of frames.
+mean, variance, std : numpy.ndarray
+    ``float64`` mean, variance and standard deviation of the counts
+    (population variance: divided by ``count``).
+min, max : numpy.ndarray
+    ``uint16`` smallest and largest counts.
+histogram : numpy.ndarray
+    ``uint64`` array ``(num_pixels, num_bins)``: number of frames
+    with counts in each bin. ``None`` if ``num_bins`` is ``0``.
+bin_edges : numpy.ndarray
+    The ``num_bins + 1`` bin edges, from ``0`` to ``MAX_COUNTS+1``.
+"""
+
+class PixelStatistics():
+    """Accumulate per-pixel statistics, one frame (or batch) at a
+    time.
+
+    Parameters
+    ----------
+    num_bins : int
+        Number of histogram bins, spanning all counts from ``0`` to
+        :data:`~microspec.constants.MAX_COUNTS`. A power of two up
+        to 65536, or ``0`` for no histogram. Default: 256 bins of
+        256 counts.
+
+    Attributes
+    ----------
+    count : int
+        Number of frames added.
+    num_pixels : int
+        Pixels per frame. ``0`` until the first frame is added.
+
+    Notes
+    -----
+    The mean and variance are updated with Welford's method (one
+    frame) or Chan's pairwise update (a batch, or
+    :func:`merge`), so they stay accurate over millions of
+    frames. The arrays are allocated when the first frame arrives;
+    adding a frame does not allocate.
+
+    A ``PixelStatistics`` is not thread-safe. Give each thread (or
+    process) its own and :func:`merge` them.
+    """
+
+    def __init__(self, num_bins : int = 256):
+        levels = MAX_COUNTS + 1
+        if num_bins < 0 or num_bins > levels or (num_bins & (num_bins - 1)):
+            raise ValueError(
+                f"num_bins must be 0 or a power of two up to {levels}, "
+                f"got {num_bins}."
+                )
+        self.num_bins = num_bins
+        self._shift = (levels//num_bins).bit_length() - 1 if num_bins else 0
+        self.reset()
+
+    def reset(self):
+        """Forget all frames."""
+        self.count = 0
+        self.num_pixels = 0
+
+    def _allocate(self, num_pixels : int):
+        self.num_pixels = num_pixels
+        self._mean = np.zeros(num_pixels, dtype=np.float64)
+        self._m2 = np.zeros(num_pixels, dtype=np.float64)
+        self._min = np.full(num_pixels, MAX_COUNTS, dtype=np.uint16)
+        self._max = np.zeros(num_pixels, dtype=np.uint16)
+        self._delta = np.empty(num_pixels, dtype=np.float64) # scratch
+        self._step = np.empty(num_pixels, dtype=np.float64) # scratch
+        self._bin = np.empty(num_pixels, dtype=np.intp) # scratch
+        self._row = np.arange(num_pixels)*max(self.num_bins, 1)
+        self._histogram = (
+            np.zeros((num_pixels, self.num_bins), dtype=np.uint64)
+            if self.num_bins else None
+            )
+
+    def _check(self, num_pixels : int):
+        if self.num_pixels == 0: self._allocate(num_pixels)
+        if num_pixels != self.num_pixels:
+            raise ValueError(
+                f"Expected {self.num_pixels} pixels, got {num_pixels}. "
+                "Do not change binning while accumulating statistics."
+                )
+
+    def add(self, pixels) -> None:
+        """Add one frame (1-D) or a batch of frames (2-D, one frame
+        per row) of ``uint16`` counts."""
+        pixels = np.asarray(pixels)
+        self._check(pixels.shape[-1])
+        if pixels.ndim == 2:
+            self._add_batch(pixels)
+            return
+        self.count += 1
+        # Welford update, in place (see FrameAccumulator.add)
+        np.subtract(pixels, self._mean, out=self._delta)
+        np.divide(self._delta, self.count, out=self._step)
+        self._mean += self._step
+        np.subtract(pixels, self._mean, out=self._step)
+        self._step *= self._delta
+        self._m2 += self._step
+        np.minimum(self._min, pixels, out=self._min, casting='unsafe')
+        np.maximum(self._max, pixels, out=self._max, casting='unsafe')
+        if self._histogram is not None:
+            np.right_shift(pixels, self._shift, out=self._bin, casting='unsafe')
+            self._bin += self._row
+            self._histogram.ravel()[self._bin] += 1
+
+    def _add_batch(self, frames):
+        if len(frames) == 0: return
+        mean = frames.mean(axis=0)
+        m2 = ((frames - mean)**2).sum(axis=0)
+        self._combine(len(frames), mean, m2)
+        np.minimum(self._min, frames.min(axis=0), out=self._min, casting='unsafe')
+        np.maximum(self._max, frames.max(axis=0), out=self._max, casting='unsafe')
+        if self._histogram is not None:
+            bins = (frames.astype(np.intp) >> self._shift) + self._row
+            self._histogram += np.bincount(
+                    bins.ravel(), minlength=self._histogram.size
+                    ).reshape(self._histogram.shape).astype(np.uint64)
+
+    def _combine(self, count, mean, m2):
+        """Chan's update: add ``count`` frames with this mean and M2."""
+        total = self.count + count
+        delta = mean - self._mean
+        self._mean += delta*(count/total)
+        self._m2 += m2 + delta**2*(self.count*count/total)
+        self.count = total
+
+    def merge(self, other) -> None:
+        """Add the frames of another :class:`PixelStatistics` (or of
+        its :class:`PixelStats` snapshot, e.g., sent back from a
+        worker process)."""
+        if other.count == 0: return
+        if isinstance(other, PixelStatistics): other = other.snapshot()
+        self._check(len(other.mean))
+        if (other.histogram is None) != (self._histogram is None) or (
+                other.histogram is not None
+                and other.histogram.shape != self._histogram.shape):
+            raise ValueError("Cannot merge statistics with different histograms.")
+        self._combine(other.count, other.mean, other.variance*other.count)
+        np.minimum(self._min, other.min, out=self._min)
+        np.maximum(self._max, other.max, out=self._max)
+        if self._histogram is not None: self._histogram += other.histogram
+
+    def snapshot(self) -> PixelStats:
+        """Return a copy of the statistics so far."""
+        if self.count == 0:
+            raise ValueError("No frames were added.")
+        variance = self._m2/self.count
+        levels = MAX_COUNTS + 1
+        return PixelStats(
+                count = self.count,
+                mean = self._mean.copy(),
+                variance = variance,
+                std = np.sqrt(variance),
+                min = self._min.copy(),
+                max = self._max.copy(),
+                histogram = None if self._histogram is None else self._histogram.copy(),
+                bin_edges = np.linspace(0, levels, self.num_bins + 1) if self.num_bins else None
+                )
+
+    def track(self, frames):
+        """Add each frame of a stream and pass the frame on.
+
+        ``frames`` is an iterable of
+        :func:`~microspec.commands.Devkit.captureFrame` replies
+        (normal, compact, or raw). Frames with a status other than
+        ``'OK'`` are passed on but not added.
+        """
+        for reply in frames:
+            if reply.status == 'OK':
+                if hasattr(reply, 'payload'):
+                    self.add(decode_pixels(reply.payload))
+                else:
+                    self.add(reply.pixels)
+            yield reply
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Summarize the signal quality of a frame.
+
+Example
+-------
+
+Ask :func:`~microspec.commands.Devkit.captureFrame` for the
+summary:
+
+>>> import microspec as usp
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> reply = kit.captureFrame(stats=True) #doctest: +SKIP
+>>> reply.stats.in_target #doctest: +SKIP
+True
+
+Or summarize a frame that is already captured:
+
+>>> usp.frame_stats([0, 100, 65535, 200], start_pixel=1, stop_pixel=4,
+...                 target=60000, target_tolerance=10000)
+frame_stats(peak=65535, peak_pixel=3, mean=16458.75, num_saturated=1,
+            in_target=True, underexposed=False, overexposed=False)
+
+The summary of a 2-D batch of frames (one frame per row) is a
+summary of arrays, one value per frame. Use it to select frames
+without looking at their pixels:
+
+>>> frames = [[0, 100, 65535, 200], [0, 100, 20000, 200]]
+>>> stats = usp.frame_stats(frames, 1, 4, 60000, 10000)
+>>> stats.underexposed
+array([False,  True])
+"""
+
+__all__ = ['frame_stats']
+
+import numpy as np
+from microspec.constants import MAX_COUNTS
+import microspec.replies as replies
+
+def frame_stats(
+        pixels,
+        start_pixel : int = 7,
+        stop_pixel : int = 392,
+        target : int = 46420,
+        target_tolerance : int = 3277,
+        saturation : int = MAX_COUNTS
+        ):
+    """Summarize one frame or a batch of frames.
+
+    Parameters
+    ----------
+    pixels
+        One frame (1-D) or a batch of frames (2-D, one frame per
+        row).
+    start_pixel, stop_pixel : int
+        Look for the peak in this range of pixels (pixel numbers
+        start at 1), like auto-expose does. ``stop_pixel`` is
+        clipped to the number of pixels in the frame.
+    target, target_tolerance : int
+        The peak is *in target* if it is within ``target ±
+        target_tolerance``, like auto-expose.
+    saturation : int
+        Pixels at or above this value count as saturated. Default:
+        :data:`~microspec.constants.MAX_COUNTS`.
+
+    Returns
+    -------
+    :class:`~microspec.replies.frame_stats`
+        Python numbers for a 1-D frame, arrays for a batch.
+
+    Notes
+    -----
+    The defaults match the default auto-expose configuration
+    (see :func:`~microspec.commands.Devkit.setAutoExposeConfig`).
+    """
+    pixels = np.asarray(pixels)
+    num_pixels = pixels.shape[-1]
+    if not 1 <= start_pixel <= min(stop_pixel, num_pixels):
+        raise ValueError(
+            f"No pixels in the range start_pixel={start_pixel} to "
+            f"stop_pixel={stop_pixel} of a frame with {num_pixels} pixels."
+            )
+    window = pixels[..., start_pixel-1:stop_pixel]
+    peak_index = window.argmax(axis=-1)
+    peak = np.take_along_axis(
+            window, np.expand_dims(peak_index, -1), axis=-1
+            ).squeeze(-1)
+    underexposed = peak < target - target_tolerance
+    overexposed = peak > target + target_tolerance
+    stats = replies.frame_stats(
+            peak = peak,
+            peak_pixel = peak_index + start_pixel,
+            mean = pixels.mean(axis=-1),
+            num_saturated = np.count_nonzero(pixels >= saturation, axis=-1),
+            in_target = ~(underexposed | overexposed),
+            underexposed = underexposed,
+            overexposed = overexposed
+            )
+    if pixels.ndim == 1:
+        # Python numbers for a single frame
+        stats = replies.frame_stats(*(np.asarray(s).item() for s in stats))
+    return stats
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""Describe a measurement as data and run it.
+
+A *recipe* is a list of steps. Each step is a
+:class:`~microspec.commands.Devkit` command and its parameters,
+written as a ``dict`` with the command name under the key
+``"command"``. The optional key ``"repeat"`` runs the step
+several times.
+
+Example
+-------
+
+>>> import microspec as usp
+>>> recipe = usp.Recipe([
+...     {"command": "setSensorConfig", "binning": usp.BINNING_ON},
+...     {"command": "autoExposure"},
+...     {"command": "captureFrame", "repeat": 10},
+...     {"command": "setExposure", "ms": 5},
+...     {"command": "captureAverage", "num_frames": 16},
+...     ])
+>>> len(recipe)
+5
+
+Run it, sending each reply to a *sink* as soon as it arrives:
+
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> timings = recipe.run(kit, sink=print) #doctest: +SKIP
+StepResult(step=0, command='setSensorConfig', reply=None, seconds=0.0, skipped=True)
+StepResult(step=1, command='autoExposure', reply=autoExposure_response(...), ...)
+...
+>>> timings[2] #doctest: +SKIP
+StepTiming(step=2, command='captureFrame', calls=10, seconds=0.21, skipped=0)
+
+A recipe is plain data, so it can be stored in a JSON (or YAML)
+file:
+
+.. code-block:: json
+
+    {"name": "dark then light",
+     "steps": [{"command": "setBridgeLED", "led_setting": 0},
+               {"command": "captureFrame", "repeat": 3}]}
+
+>>> recipe = usp.Recipe.load("dark-then-light.json") #doctest: +SKIP
+"""
+
+__all__ = ['Recipe', 'RECIPE_COMMANDS', 'StepResult', 'StepTiming']
+
+from collections import namedtuple
+import inspect
+import json
+import time
+from microspec.commands import Devkit
+from microspec.batch import BATCH_COMMANDS
+
+RECIPE_COMMANDS = BATCH_COMMANDS + ('captureAverage',)
+"""tuple: Names of the :class:`~microspec.commands.Devkit` commands
+a :class:`Recipe` step can run."""
+
+StepResult = namedtuple(
+        'StepResult',
+        ['step', 'command', 'reply', 'seconds', 'skipped']
+        )
+"""The result of one call of a recipe step, sent to the sink.
+
+step : int
+    Index of the step in the recipe.
+command : str
+    Name of the command.
+reply
+    The reply of the command, or ``None`` if it was skipped.
+seconds : float
+    Time the command took.
+skipped : bool
+    ``True`` if the command was skipped because the dev-kit had
+    already confirmed the requested state (see
+    :attr:`Devkit.elide <microspec.commands.Devkit.elide>`).
+"""
+
+StepTiming = namedtuple(
+        'StepTiming',
+        ['step', 'command', 'calls', 'seconds', 'skipped']
+        )
+"""The timing of one recipe step, returned by :func:`Recipe.run`.
+
+step : int
+    Index of the step in the recipe.
+command : str
+    Name of the command.
+calls : int
+    Number of times the command ran (``repeat``).
+seconds : float
+    Total time of the step.
+skipped : int
+    Number of calls that were skipped.
+"""
+
+class Recipe():
+    """A measurement described as a list of commands.
+
+    Parameters
+    ----------
+    steps : list
+        Each step is a ``dict``: ``{"command": name, "repeat": n,
+        **params}``. ``"repeat"`` is optional (default 1). The
+        parameters are the keyword arguments of the command.
+    name : str
+        Optional name of the recipe.
+
+    Raises
+    ------
+    ValueError
+        If a step names an unknown command, has parameters the
+        command does not take, or has an invalid ``repeat``. Steps
+        are checked when the recipe is created, before anything is
+        sent to the dev-kit.
+
+    Notes
+    -----
+    :func:`run` turns on :attr:`Devkit.elide
+    <microspec.commands.Devkit.elide>`, so a ``set`` command is
+    skipped if the dev-kit already confirmed the requested state.
+    Add ``"force": True`` to a step to always send it.
+    """
+
+    def __init__(self, steps, name : str = None):
+        self.name = name
+        self.steps = [self._check(step) for step in steps]
+
+    @classmethod
+    def load(cls, path : str):
+        """Load a recipe from a JSON or YAML file.
+
+        The file holds either the list of steps or a ``dict`` with
+        keys ``"steps"`` and (optional) ``"name"``. YAML files
+        (``.yaml`` or ``.yml``) require PyYAML.
+        """
+        with open(path, 'r') as f:
+            if str(path).endswith(('.yaml', '.yml')):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError(
+                        "Loading a YAML recipe requires PyYAML: "
+                        "pip install pyyaml"
+                        ) from None
+                config = yaml.safe_load(f)
+            else:
+                config = json.load(f)
+        if isinstance(config, dict):
+            return cls(config['steps'], config.get('name'))
+        return cls(config)
+
+    def __len__(self):
+        return len(self.steps)
+
+    @staticmethod
+    def _check(step):
+        """Return ``(command, repeat, params)`` for one step."""
+        params = dict(step)
+        command = params.pop('command', None)
+        if command not in RECIPE_COMMANDS:
+            raise ValueError(f"Unknown recipe command: {command!r}.")
+        repeat = params.pop('repeat', 1)
+        if not isinstance(repeat, int) or repeat < 1:
+            raise ValueError(
+                f"Step {command!r}: repeat must be a positive int."
+                )
+        try:
+            bound = inspect.signature(getattr(Devkit, command)).bind(
+                    None, **params
+                    )
+        except TypeError as error:
+            raise ValueError(f"Step {command!r}: {error}") from None
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+        del params['self']
+        return command, repeat, params
+
+    def run(self, kit, sink = None) -> list:
+        """Run the recipe on a dev-kit.
+
+        Parameters
+        ----------
+        kit : :class:`~microspec.commands.Devkit`
+            The dev-kit to run the recipe on.
+        sink
+            Optional callable. Called with a :class:`StepResult`
+            after every command, so replies can be saved or
+            plotted while the recipe runs.
+
+        Returns
+        -------
+        list
+            One :class:`StepTiming` per step.
+        """
+        timings = []
+        elide, kit.elide = kit.elide, True
+        try:
+            for index, (command, repeat, params) in enumerate(self.steps):
+                method = getattr(kit, command)
+                seconds = 0.0
+                skipped = 0
+                for _ in range(repeat):
+                    num_elided = kit.num_elided
+                    start = time.perf_counter()
+                    reply = method(**params)
+                    elapsed = time.perf_counter() - start
+                    seconds += elapsed
+                    was_skipped = kit.num_elided != num_elided
+                    if was_skipped:
+                        reply = None
+                        skipped += 1
+                    if sink is not None:
+                        sink(StepResult(
+                            step = index,
+                            command = command,
+                            reply = reply,
+                            seconds = elapsed,
+                            skipped = was_skipped
+                            ))
+                timings.append(StepTiming(index, command, repeat, seconds, skipped))
+        finally:
+            kit.elide = elide
+        return timings
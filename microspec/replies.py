@@ -10,6 +10,7 @@ this module. Command responses are generated internally by module
 """
 
 from collections import namedtuple
+import numpy as np
 
 # ----------------------
 # | Docstring Snippets |
@@ -381,3 +382,321 @@ See Also
 --------
 ~microspec.commands.Devkit.setAutoExposeConfig
 """.format(**_common)
+
+captureAverage_response = namedtuple(
+        'captureAverage_response',
+        ['status', 'num_pixels', 'num_frames', 'pixels', 'std']
+        )
+captureAverage_response.__doc__ = """
+Response to command :func:`~microspec.commands.Devkit.captureAverage`.
+
+Attributes
+----------
+{status}
+        ``'TIMEOUT'`` means *every* frame timed out. Frames that
+        time out are dropped and are not counted in
+        ``num_frames``.
+num_pixels
+num_frames : int
+
+    Number of frames combined into ``pixels``.
+pixels : numpy.ndarray
+
+    The combined frame, one value per pixel, starting with
+    pixel 1.
+std : numpy.ndarray
+
+    Standard deviation of the combined frames at each pixel.
+
+Notes
+-----
+This response does not come from a single ``microspeclib``
+response. It combines the
+:data:`~microspeclib.datatypes.sensor.SensorCaptureFrame`
+responses to several ``captureFrame`` commands.
+
+See Also
+--------
+~microspec.commands.Devkit.captureAverage
+~microspec.averaging.FrameAccumulator
+""".format(**_common)
+
+frame_stats = namedtuple(
+        'frame_stats',
+        [
+            'peak',
+            'peak_pixel',
+            'mean',
+            'num_saturated',
+            'in_target',
+            'underexposed',
+            'overexposed'
+         ])
+frame_stats.__doc__ = """
+Summary of the signal in a frame.
+
+Attributes
+----------
+peak : int
+
+    Largest pixel value between ``start_pixel`` and
+    ``stop_pixel``.
+peak_pixel : int
+
+    Pixel number of the peak (the first pixel is pixel 1).
+mean : float
+
+    Mean of all pixel values.
+num_saturated : int
+
+    Number of saturated pixels.
+in_target : bool
+
+    ``True`` if the peak is within ``target ± target_tolerance``.
+underexposed : bool
+
+    ``True`` if the peak is below the target range.
+overexposed : bool
+
+    ``True`` if the peak is above the target range.
+
+See Also
+--------
+~microspec.quality.frame_stats
+~microspec.commands.Devkit.captureFrame
+"""
+
+captureFrameStats_response = namedtuple(
+        'captureFrameStats_response',
+        ['status', 'num_pixels', 'pixels', 'frame', 'stats']
+        )
+captureFrameStats_response.__doc__ = """
+Response to command :func:`~microspec.commands.Devkit.captureFrame`
+called with ``stats=True``.
+
+Attributes
+----------
+{status}
+num_pixels
+pixels
+frame
+stats : :class:`frame_stats`
+
+    Summary of the frame. ``None`` if ``status`` is not ``'OK'``.
+
+Notes
+-----
+Same as :class:`captureFrame_response` with the added attribute
+``stats``.
+
+See Also
+--------
+~microspec.commands.Devkit.captureFrame
+""".format(**_common)
+
+# ------------------
+# | Compact frames |
+# ------------------
+
+STATUS_NAMES = ('OK', 'ERROR', 'TIMEOUT')
+"""Status strings, indexed by status code: ``OK=0``, ``ERROR=1``
+(the codes the dev-kit sends), and ``TIMEOUT=2`` (no reply)."""
+STATUS_TIMEOUT = 2
+"""Status code of a command that timed out."""
+
+class captureFrameCompact_response(namedtuple(
+        'captureFrameCompact_response',
+        ['status_code', 'num_pixels', 'pixels']
+        )):
+    __slots__ = ()
+    __doc__ = """
+Response to command :func:`~microspec.commands.Devkit.captureFrame`
+called with ``compact=True``.
+
+A compact response holds the frame in the smallest form: the
+status as a small int and the pixels as one ``uint16`` array.
+The attributes of :class:`captureFrame_response` are available
+as views, computed when they are accessed.
+
+Attributes
+----------
+status_code : int
+
+    ``0`` (OK), ``1`` (ERROR), or ``2`` (TIMEOUT). See
+    :data:`STATUS_NAMES`.
+num_pixels : int
+pixels : numpy.ndarray
+
+    ``uint16`` array of pixel values, starting with pixel 1.
+    Empty if ``status_code`` is not ``0``.
+status : str
+
+    View: ``'OK'``, ``'ERROR'``, or ``'TIMEOUT'``.
+frame : dict
+
+    View: pixel number to pixel value.
+
+See Also
+--------
+FrameBlock
+~microspec.commands.Devkit.captureFrame
+"""
+
+    @property
+    def status(self) -> str:
+        return STATUS_NAMES[self.status_code]
+
+    @property
+    def frame(self) -> dict:
+        return dict(zip(range(1, self.num_pixels+1), self.pixels.tolist()))
+
+    def to_response(self) -> captureFrame_response:
+        """Return the same frame as a :class:`captureFrame_response`."""
+        return captureFrame_response(
+                status = self.status,
+                num_pixels = self.num_pixels,
+                pixels = self.pixels.tolist(),
+                frame = self.frame
+                )
+
+class FrameBlock():
+    """Store many frames column-wise.
+
+    Instead of one response object per frame, a ``FrameBlock``
+    keeps one array per attribute: a ``uint8`` status code and a
+    ``uint16`` pixel count per frame, and a 2-D ``uint16`` array of
+    pixels with one row per frame. Use it to keep long captures in
+    memory and to process them as a batch.
+
+    Parameters
+    ----------
+    capacity : int
+        Number of frames to allocate room for. The block grows if
+        more frames are appended.
+    max_pixels : int
+        Width of the pixel array: 784 (default) fits both pixel
+        configurations.
+
+    Attributes
+    ----------
+    status_codes : numpy.ndarray
+        Status code of each frame (see :data:`STATUS_NAMES`).
+    num_pixels : numpy.ndarray
+        Number of pixels of each frame.
+    pixels : numpy.ndarray
+        Pixels of each frame, one row per frame. Pixels past
+        ``num_pixels`` are zero.
+
+    Example
+    -------
+
+    >>> import microspec as usp
+    >>> kit = usp.Devkit() #doctest: +SKIP
+    >>> block = usp.replies.FrameBlock(capacity=1000) #doctest: +SKIP
+    >>> for reply in kit.captureFrames(1000, compact=True): #doctest: +SKIP
+    ...     block.append(reply)
+    >>> block.pixels[block.ok, :392].mean(axis=0) #doctest: +SKIP
+    array([...])
+    """
+
+    def __init__(self, capacity : int = 64, max_pixels : int = 784):
+        self._count = 0
+        self.max_pixels = max_pixels
+        self._allocate(max(capacity, 1))
+
+    def _allocate(self, capacity : int) -> None:
+        status_codes = np.zeros(capacity, dtype=np.uint8)
+        num_pixels = np.zeros(capacity, dtype=np.uint16)
+        pixels = np.zeros((capacity, self.max_pixels), dtype=np.uint16)
+        if self._count:
+            status_codes[:self._count] = self._status_codes[:self._count]
+            num_pixels[:self._count] = self._num_pixels[:self._count]
+            pixels[:self._count] = self._pixels[:self._count]
+        self._status_codes = status_codes
+        self._num_pixels = num_pixels
+        self._pixels = pixels
+
+    def __len__(self):
+        return self._count
+
+    def append(self, reply) -> None:
+        """Append one frame.
+
+        ``reply`` is a :class:`captureFrameCompact_response` or a
+        :class:`captureFrame_response`.
+        """
+        if self._count == len(self._status_codes):
+            self._allocate(2*self._count)
+        k = self._count
+        if isinstance(reply, captureFrameCompact_response):
+            self._status_codes[k] = reply.status_code
+        else:
+            self._status_codes[k] = STATUS_NAMES.index(reply.status)
+        self._num_pixels[k] = reply.num_pixels
+        self._pixels[k, :reply.num_pixels] = reply.pixels
+        self._pixels[k, reply.num_pixels:] = 0
+        self._count += 1
+
+    @property
+    def status_codes(self):
+        return self._status_codes[:self._count]
+
+    @property
+    def num_pixels(self):
+        return self._num_pixels[:self._count]
+
+    @property
+    def pixels(self):
+        return self._pixels[:self._count]
+
+    @property
+    def ok(self):
+        """Boolean mask of the frames with status ``'OK'``."""
+        return self.status_codes == 0
+
+    @property
+    def status(self) -> list:
+        """View: the status string of each frame."""
+        return [STATUS_NAMES[code] for code in self.status_codes.tolist()]
+
+    def __getitem__(self, k : int) -> captureFrameCompact_response:
+        """View frame ``k`` as a compact response (no copy)."""
+        if not -self._count <= k < self._count:
+            raise IndexError("FrameBlock index out of range")
+        k %= self._count
+        num_pixels = int(self._num_pixels[k])
+        return captureFrameCompact_response(
+                status_code = int(self._status_codes[k]),
+                num_pixels = num_pixels,
+                pixels = self._pixels[k, :num_pixels]
+                )
+
+captureFrameRaw_response = namedtuple(
+        'captureFrameRaw_response',
+        ['status', 'num_pixels', 'header', 'payload']
+        )
+captureFrameRaw_response.__doc__ = """
+Response to command :func:`~microspec.commands.Devkit.captureFrame`
+called with ``raw=True``.
+
+Attributes
+----------
+{status}
+num_pixels
+header : bytes
+
+    The 4-byte frame header as received: bridge status, sensor
+    status, and the big-endian number of pixels (see
+    :mod:`microspec.decode`).
+payload : bytes
+
+    The pixel values as received: ``2*num_pixels`` bytes,
+    big-endian. Empty if ``status`` is not ``'OK'``. Decode with
+    :func:`~microspec.decode.decode_pixels`.
+
+See Also
+--------
+~microspec.decode.decode_pixels
+~microspec.decode.decode_frames
+~microspec.commands.Devkit.captureFrame
+""".format(**_common)
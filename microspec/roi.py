@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Keep only the pixels in regions of interest.
+
+Many applications only look at a few narrow pixel windows. A
+:class:`RegionsOfInterest` names these windows. Passed to
+:func:`Devkit.captureFrame(roi=...)
+<microspec.commands.Devkit.captureFrame>`, the frame is read
+without decoding and only the pixels in the regions are decoded
+and kept. The sum of the counts in each region (the band
+integral) is computed at the same time.
+
+Example
+-------
+
+>>> import microspec as usp
+>>> roi = usp.RegionsOfInterest({'blue': (100, 119), 'red': (300, 309)})
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> reply = kit.captureFrame(roi=roi) #doctest: +SKIP
+>>> reply.regions['red'] #doctest: +SKIP
+array([...], dtype=uint16)
+>>> reply.integrals #doctest: +SKIP
+{'blue': ..., 'red': ...}
+
+Regions are also extracted from frames already captured:
+
+>>> roi = usp.RegionsOfInterest({'a': (2, 3), 'b': (5, 5)})
+>>> reply = roi.extract([10, 20, 30, 40, 50])
+>>> reply.regions
+{'a': array([20, 30], dtype=uint16), 'b': array([50], dtype=uint16)}
+>>> reply.integrals
+{'a': 50, 'b': 50}
+
+And band integrals of a batch of frames (one frame per row):
+
+>>> roi.integrate([[10, 20, 30, 40, 50], [1, 2, 3, 4, 5]])
+{'a': array([50,  5], dtype=uint64), 'b': array([50,  5], dtype=uint64)}
+"""
+
+__all__ = ['RegionsOfInterest', 'captureFrameROI_response']
+
+from collections import namedtuple
+import numpy as np
+from microspec.decode import PIXEL_DTYPE
+from microspec.replies import STATUS_NAMES
+
+class captureFrameROI_response(namedtuple(
+        'captureFrameROI_response',
+        ['status_code', 'num_pixels', 'regions', 'integrals']
+        )):
+    __slots__ = ()
+    __doc__ = """
+Response to command :func:`~microspec.commands.Devkit.captureFrame`
+called with ``roi``.
+
+Attributes
+----------
+status_code : int
+
+    ``0`` (OK), ``1`` (ERROR), or ``2`` (TIMEOUT). See
+    :data:`~microspec.replies.STATUS_NAMES`.
+num_pixels : int
+
+    The number of pixels in the whole frame.
+regions : dict
+
+    Region name to ``uint16`` array of the pixels in the region.
+    Empty if ``status_code`` is not ``0``.
+integrals : dict
+
+    Region name to the sum of the counts in the region.
+    Empty if ``status_code`` is not ``0``.
+status : str
+
+    View: ``'OK'``, ``'ERROR'``, or ``'TIMEOUT'``.
+
+See Also
+--------
+RegionsOfInterest
+~microspec.commands.Devkit.captureFrame
+"""
+
+    @property
+    def status(self) -> str:
+        return STATUS_NAMES[self.status_code]
+
+class RegionsOfInterest():
+    """Named pixel windows.
+
+    Parameters
+    ----------
+    regions : dict
+        Region name to ``(start_pixel, stop_pixel)``. Pixel
+        numbers start at 1 and ``stop_pixel`` is included, like
+        the auto-expose ``start_pixel`` and ``stop_pixel``.
+        Regions may overlap.
+
+    Attributes
+    ----------
+    regions : dict
+        Region name to ``(start_pixel, stop_pixel)``.
+    num_pixels : int
+        Total number of pixels kept per frame.
+
+    Notes
+    -----
+    The pixel index of every region is computed once. Extracting
+    the regions of a frame is one gather into one ``uint16``
+    array (the arrays in ``reply.regions`` are views of it) and
+    one ``reduceat`` for the integrals. Only the gathered pixels
+    of a raw frame are converted from big-endian.
+    """
+
+    def __init__(self, regions : dict):
+        if not regions:
+            raise ValueError("Give at least one region.")
+        self.regions = {}
+        for name, (start_pixel, stop_pixel) in regions.items():
+            if not 1 <= start_pixel <= stop_pixel:
+                raise ValueError(
+                    f"Region {name!r} must have 1 <= start_pixel <= stop_pixel, "
+                    f"got ({start_pixel}, {stop_pixel})."
+                    )
+            self.regions[name] = (int(start_pixel), int(stop_pixel))
+        self._names = list(self.regions)
+        sizes = [stop - start + 1 for start, stop in self.regions.values()]
+        self._index = np.concatenate([
+            np.arange(start - 1, stop) for start, stop in self.regions.values()
+            ])
+        self._offsets = np.concatenate(([0], np.cumsum(sizes)))
+        self.num_pixels = len(self._index)
+        self._min_pixels = max(stop for _, stop in self.regions.values())
+
+    def _check(self, num_pixels : int):
+        if num_pixels < self._min_pixels:
+            raise ValueError(
+                f"The regions need {self._min_pixels} pixels, "
+                f"the frame has {num_pixels}."
+                )
+
+    def _response(self, status_code : int, num_pixels : int, pixels = None):
+        if pixels is None:
+            return captureFrameROI_response(status_code, num_pixels, {}, {})
+        offsets = self._offsets
+        integrals = np.add.reduceat(pixels, offsets[:-1], dtype=np.uint64)
+        return captureFrameROI_response(
+                status_code = status_code,
+                num_pixels = num_pixels,
+                regions = {
+                    name: pixels[offsets[k]:offsets[k+1]]
+                    for k, name in enumerate(self._names)
+                    },
+                integrals = dict(zip(self._names, integrals.tolist()))
+                )
+
+    def extract(self, reply) -> captureFrameROI_response:
+        """Keep the regions of one frame.
+
+        Parameters
+        ----------
+        reply
+            A :func:`~microspec.commands.Devkit.captureFrame`
+            reply (normal, compact, or raw), or the pixels of one
+            frame.
+
+        Returns
+        -------
+        :class:`captureFrameROI_response`
+        """
+        if hasattr(reply, 'payload'): # raw: decode only the regions
+            status_code = STATUS_NAMES.index(reply.status)
+            if status_code != 0:
+                return self._response(status_code, 0)
+            self._check(reply.num_pixels)
+            pixels = np.frombuffer(reply.payload, dtype=PIXEL_DTYPE)
+            return self._response(
+                    0, reply.num_pixels, pixels[self._index].astype(np.uint16)
+                    )
+        if hasattr(reply, 'status'):
+            status_code = STATUS_NAMES.index(reply.status)
+            if status_code != 0:
+                return self._response(status_code, 0)
+            pixels = reply.pixels
+        else:
+            status_code, pixels = 0, reply
+        pixels = np.asarray(pixels)
+        self._check(len(pixels))
+        return self._response(
+                status_code, len(pixels), pixels[self._index].astype(np.uint16)
+                )
+
+    def frames(self, frames):
+        """Keep the regions of each frame of a stream.
+
+        ``frames`` is an iterable of
+        :func:`~microspec.commands.Devkit.captureFrame` replies,
+        e.g., :func:`Devkit.captureFrames
+        <microspec.commands.Devkit.captureFrames>` with
+        ``raw=True``. Yields a :class:`captureFrameROI_response`
+        per frame.
+        """
+        for reply in frames:
+            yield self.extract(reply)
+
+    def integrate(self, pixels) -> dict:
+        """Return the band integral of each region of one frame
+        (1-D) or a batch of frames (2-D, one frame per row).
+
+        The integrals are ``uint64``: one value per frame.
+        """
+        pixels = np.asarray(pixels)
+        self._check(pixels.shape[-1])
+        integrals = np.add.reduceat(
+                pixels[..., self._index], self._offsets[:-1], axis=-1,
+                dtype=np.uint64
+                )
+        return {
+                name: integrals[..., k]
+                for k, name in enumerate(self._names)
+                }
+
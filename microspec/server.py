@@ -0,0 +1,569 @@
+# -*- coding: utf-8 -*-
+"""Share one dev-kit with several applications.
+
+Only one process can open the dev-kit serial port. A
+:class:`FrameServer` owns the :class:`~microspec.commands.Devkit`,
+captures frames continuously, and sends every frame to every
+subscribed :class:`FrameClient`. Clients connect over a Unix
+domain socket or a localhost TCP socket.
+
+Example
+-------
+
+Run the server in the process that owns the dev-kit:
+
+>>> import microspec as usp
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> server = usp.FrameServer(kit, "/tmp/microspec.sock").start() #doctest: +SKIP
+
+Use the dev-kit from any other process, with the same commands and
+replies as a :class:`~microspec.commands.Devkit`:
+
+>>> client = usp.FrameClient("/tmp/microspec.sock") #doctest: +SKIP
+>>> client.setExposure(ms=5) #doctest: +SKIP
+setExposure_response(status='OK')
+>>> client.captureFrame() #doctest: +SKIP
+captureFrame_response(status='OK', num_pixels=392, pixels=[...], frame={...})
+
+Commands from all clients are sent to the dev-kit one at a time,
+between frames. A client that reads frames slower than the
+dev-kit captures them loses its oldest frames; it never slows
+down the capture or the other clients.
+
+Wire format
+-----------
+
+Every message is a :data:`MESSAGE` header (message kind, body
+length) followed by the body. A frame body is a :data:`FRAME`
+header (sequence number, status code, number of pixels) followed
+by the pixels as sent by the dev-kit: one big-endian 16-bit value
+per pixel (see :mod:`microspec.decode`). Commands and their
+replies are small JSON objects. Each command has an ``"id"`` and
+its reply has the same ``"id"``.
+"""
+
+__all__ = [
+    'FrameServer',
+    'FrameClient',
+    'SERVER_COMMANDS',
+    'encode_frame',
+    'decode_frame',
+    ]
+
+from collections import deque
+import inspect
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import warnings
+import numpy as np
+from microspec.commands import Devkit
+from microspec.batch import BATCH_COMMANDS
+from microspec.decode import decode_pixels
+import microspec.replies as replies
+
+SERVER_COMMANDS = tuple(name for name in BATCH_COMMANDS if name != 'captureFrame')
+"""tuple: Names of the :class:`~microspec.commands.Devkit` commands
+a :class:`FrameClient` sends through the server."""
+
+MESSAGE = struct.Struct('>BI')
+"""struct.Struct: Message header: message kind, body length."""
+
+FRAME = struct.Struct('>QBH')
+"""struct.Struct: Frame header: sequence number, status code (see
+:data:`~microspec.replies.STATUS_NAMES`), number of pixels."""
+
+# Message kinds
+_FRAME, _COMMAND, _REPLY, _SUBSCRIBE, _UNSUBSCRIBE = range(5)
+
+def encode_frame(sequence : int, reply) -> bytes:
+    """Return the body of a frame message.
+
+    ``reply`` is the reply of :func:`Devkit.captureFrame(raw=True)
+    <microspec.commands.Devkit.captureFrame>`: its payload is sent
+    without decoding it.
+
+    >>> import microspec as usp
+    >>> reply = usp.replies.captureFrameRaw_response(
+    ...     'OK', 2, b'\\x00\\x00\\x00\\x02', b'\\x00\\x01\\x12\\x34')
+    >>> usp.decode_frame(usp.encode_frame(7, reply))
+    (7, captureFrameCompact_response(status_code=0, num_pixels=2, pixels=array([   1, 4660], dtype=uint16)))
+    """
+    status_code = replies.STATUS_NAMES.index(reply.status)
+    return FRAME.pack(sequence, status_code, reply.num_pixels) + reply.payload
+
+def decode_frame(body) -> tuple:
+    """Return ``(sequence, reply)`` for the body of a frame
+    message. The reply is a
+    :class:`~microspec.replies.captureFrameCompact_response`."""
+    sequence, status_code, num_pixels = FRAME.unpack_from(body)
+    pixels = decode_pixels(memoryview(body)[FRAME.size:FRAME.size + 2*num_pixels])
+    return sequence, replies.captureFrameCompact_response(
+            status_code, num_pixels, pixels
+            )
+
+def _send(sock, kind : int, body = b''):
+    sock.sendall(MESSAGE.pack(kind, len(body)) + body)
+
+def _recv_exactly(sock, size : int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0: raise ConnectionError("Connection closed.")
+        received += n
+    return buffer
+
+def _recv(sock) -> tuple:
+    kind, size = MESSAGE.unpack(_recv_exactly(sock, MESSAGE.size))
+    return kind, _recv_exactly(sock, size)
+
+def _socket(address):
+    """Return a socket for a Unix socket path or a TCP address."""
+    if isinstance(address, (str, os.PathLike)):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+class _Connection():
+    """The server side of one client connection.
+
+    The capture loop only puts frames in the queue. A writer thread
+    sends them, so a slow client only loses its own frames.
+    """
+
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.frames = deque(maxlen=server.queue_size)
+        self.replies = deque() # replies are never dropped
+        self.num_dropped = 0
+        self.open = True
+        self._ready = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._read, daemon=True),
+            threading.Thread(target=self._write, daemon=True),
+            ]
+        for thread in self._threads: thread.start()
+
+    def offer(self, body):
+        """Queue a frame, dropping the oldest if the queue is full."""
+        with self._ready:
+            if len(self.frames) == self.frames.maxlen: self.num_dropped += 1
+            self.frames.append(body)
+            self._ready.notify()
+
+    def close(self):
+        with self._ready:
+            self.open = False
+            self._ready.notify()
+        self.server._unsubscribe(self) # also forgets the closed connection
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _read(self):
+        try:
+            while self.open:
+                kind, body = _recv(self.sock)
+                if kind == _SUBSCRIBE:
+                    self.server._subscribe(self)
+                elif kind == _UNSUBSCRIBE:
+                    self.server._unsubscribe(self)
+                    with self._ready: self.frames.clear()
+                elif kind == _COMMAND:
+                    request = json.loads(body)
+                    reply = self.server.command(request['command'], request['params'])
+                    reply['id'] = request['id']
+                    with self._ready:
+                        self.replies.append(json.dumps(reply).encode())
+                        self._ready.notify()
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.close()
+
+    def _write(self):
+        try:
+            while True:
+                with self._ready:
+                    while self.open and not (self.replies or self.frames):
+                        self._ready.wait()
+                    if not self.open: return
+                    if self.replies:
+                        kind, body = _REPLY, self.replies.popleft()
+                    else:
+                        kind, body = _FRAME, self.frames.popleft()
+                _send(self.sock, kind, body)
+        except OSError:
+            self.close()
+
+class FrameServer():
+    """Own a dev-kit and share its frames with many clients.
+
+    Parameters
+    ----------
+    kit : :class:`~microspec.commands.Devkit`
+        The dev-kit. Only the server uses it while it runs.
+    address
+        A file path for a Unix domain socket, or a ``(host,
+        port)`` tuple for a TCP socket. Default: a free port on
+        ``localhost``.
+    queue_size : int
+        Number of frames queued for each client. If a client falls
+        further behind, its oldest frames are dropped.
+
+    Attributes
+    ----------
+    address
+        The address clients connect to (the actual port if port
+        ``0`` was requested).
+    num_frames : int
+        Number of frames captured. This is also the sequence number
+        of the last frame.
+    error : Exception
+        The exception that stopped the capture loop, or ``None``.
+
+    Notes
+    -----
+    A single thread uses the dev-kit: it runs the commands the
+    clients send, then captures the next frame, and so on. Frames
+    are only captured while at least one client is subscribed.
+
+    Frames are captured with :func:`Devkit.captureFrame(raw=True)
+    <microspec.commands.Devkit.captureFrame>` and sent to the
+    clients without decoding them.
+    """
+
+    def __init__(self, kit, address = ('127.0.0.1', 0), queue_size : int = 4):
+        self.kit = kit
+        self.queue_size = queue_size
+        self.num_frames = 0
+        self.error = None
+        self._commands = queue.Queue()
+        self._connections = []
+        self._subscribers = []
+        self._lock = threading.Lock() # connections and subscribers
+        self._running = threading.Event()
+        self._threads = []
+        self._listener = _socket(address)
+        if self._listener.family == socket.AF_INET:
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(address)
+        self._listener.listen()
+        self._listener.settimeout(0.1)
+        self.address = self._listener.getsockname()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def num_dropped(self) -> int:
+        """Total number of frames dropped for slow clients."""
+        with self._lock:
+            return sum(c.num_dropped for c in self._connections)
+
+    def start(self):
+        """Start accepting clients and capturing frames. Returns the
+        server."""
+        self._running.set()
+        self._threads = [
+            threading.Thread(target=self._accept, daemon=True),
+            threading.Thread(target=self._capture, daemon=True),
+            ]
+        for thread in self._threads: thread.start()
+        return self
+
+    def stop(self):
+        """Disconnect the clients and stop capturing."""
+        self._running.clear()
+        for thread in self._threads: thread.join()
+        self._threads = []
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections: connection.close()
+        self._listener.close()
+        if self._listener.family == socket.AF_UNIX:
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+
+    def command(self, name : str, params : dict) -> dict:
+        """Run a dev-kit command between two frames.
+
+        Blocks until the command is done. Returns the reply as a
+        JSON-ready ``dict``: ``{"reply": type, "fields": {...}}``,
+        or ``{"error": type, "message": str}`` if the command raised
+        an exception.
+        """
+        done = threading.Event()
+        result = {}
+        self._commands.put((name, params, result, done))
+        while not done.wait(0.1):
+            if not self._running.is_set():
+                return {"error": "ConnectionError", "message": "Server stopped."}
+        return result
+
+    def _run(self, name, params, result, done):
+        try:
+            if name not in SERVER_COMMANDS:
+                raise ValueError(f"Unknown server command: {name!r}.")
+            reply = getattr(self.kit, name)(**params)
+            result.update(reply=type(reply).__name__, fields=reply._asdict())
+        except Exception as error:
+            result.update(error=type(error).__name__, message=str(error))
+        finally:
+            done.set()
+
+    def _accept(self):
+        while self._running.is_set():
+            try:
+                sock, _ = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            sock.settimeout(None)
+            with self._lock:
+                self._connections.append(_Connection(self, sock))
+
+    def _capture(self):
+        try:
+            while self._running.is_set():
+                # Commands first: they never wait more than one frame.
+                while True:
+                    try:
+                        self._run(*self._commands.get_nowait())
+                    except queue.Empty:
+                        break
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                if not subscribers:
+                    try:
+                        self._run(*self._commands.get(timeout=0.1))
+                    except queue.Empty:
+                        pass
+                    continue
+                reply = self.kit.captureFrame(raw=True)
+                self.num_frames += 1
+                body = encode_frame(self.num_frames, reply)
+                for connection in subscribers: connection.offer(body)
+        except Exception as error:
+            self.error = error
+            self._running.clear()
+
+    def _subscribe(self, connection):
+        with self._lock:
+            if connection not in self._subscribers:
+                self._subscribers.append(connection)
+
+    def _unsubscribe(self, connection):
+        with self._lock:
+            if connection in self._subscribers:
+                self._subscribers.remove(connection)
+            if not connection.open and connection in self._connections:
+                self._connections.remove(connection)
+
+class FrameClient():
+    """Use a dev-kit shared by a :class:`FrameServer`.
+
+    A ``FrameClient`` has the commands of a
+    :class:`~microspec.commands.Devkit` (see
+    :data:`SERVER_COMMANDS`) and returns the same replies. The
+    commands are sent through the server.
+
+    Parameters
+    ----------
+    address
+        The :attr:`FrameServer.address`.
+    queue_size : int
+        Number of received frames kept until
+        :func:`captureFrame` reads them. Older frames are dropped.
+        Use ``1`` to always read the most recent frame.
+    timeout : float
+        Seconds to wait for a frame or a reply.
+
+    Attributes
+    ----------
+    sequence : int
+        Sequence number of the last frame read. A jump in the
+        sequence means frames were dropped.
+    num_dropped : int
+        Number of received frames dropped because the application
+        did not read them in time.
+    """
+
+    def __init__(self, address, queue_size : int = 16, timeout : float = 5.0):
+        self.timeout = timeout
+        self.sequence = 0
+        self.num_dropped = 0
+        self.subscribed = False
+        self._frames = deque(maxlen=queue_size)
+        self._replies = queue.Queue()
+        self._ready = threading.Condition()
+        self._lock = threading.Lock() # one command at a time
+        self._command_id = 0
+        self._open = True
+        self._sock = _socket(address)
+        self._sock.connect(address)
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Disconnect from the server."""
+        self._open = False
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        self._thread.join()
+
+    def __getattr__(self, name):
+        if name not in SERVER_COMMANDS:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+                )
+        method = getattr(Devkit, name)
+        signature = inspect.signature(method)
+        def command(*args, **kwargs):
+            bound = signature.bind(None, *args, **kwargs)
+            del bound.arguments['self']
+            return self._command(name, bound.arguments)
+        command.__name__ = name
+        command.__doc__ = method.__doc__
+        return command
+
+    def _command(self, name, params):
+        with self._lock:
+            self._command_id += 1
+            body = json.dumps(
+                    {"id": self._command_id, "command": name, "params": params}
+                    ).encode()
+            _send(self._sock, _COMMAND, body)
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    reply = self._replies.get(
+                            timeout=max(deadline - time.monotonic(), 0)
+                            )
+                except queue.Empty:
+                    reply = None
+                    break
+                # Drop the late reply of a command that timed out.
+                if reply['id'] == self._command_id: break
+        if reply is None:
+            warnings.warn(f"Command {name} timed out.", stacklevel=3)
+            reply_type = getattr(replies, f"{name}_response")
+            return reply_type(*[None]*len(reply_type._fields))._replace(status='TIMEOUT')
+        if 'error' in reply:
+            error = {'TypeError': TypeError, 'ValueError': ValueError}
+            if reply['error'] in error:
+                raise error[reply['error']](reply['message'])
+            raise RuntimeError(f"{reply['error']}: {reply['message']}")
+        return getattr(replies, reply['reply'])(**reply['fields'])
+
+    def subscribe(self):
+        """Start receiving frames. :func:`captureFrame` subscribes
+        automatically."""
+        if not self.subscribed:
+            _send(self._sock, _SUBSCRIBE)
+            self.subscribed = True
+
+    def unsubscribe(self):
+        """Stop receiving frames and drop the frames not read yet."""
+        if self.subscribed:
+            _send(self._sock, _UNSUBSCRIBE)
+            self.subscribed = False
+        with self._ready:
+            self._frames.clear()
+
+    def captureFrame(self, compact : bool = False, latest : bool = False):
+        """Return the oldest frame received and not read yet.
+
+        Frames are received in the background once the client is
+        subscribed, and queued (up to ``queue_size``) until they
+        are read. So the frame returned may have been captured up
+        to ``queue_size`` frames ago: reading every frame in order
+        suits :func:`captureFrames`. Use ``latest`` for the most
+        recent frame instead. Compare :attr:`sequence` with the
+        server's frame count to see how old a frame is.
+
+        Parameters
+        ----------
+        compact : bool
+            Return a
+            :class:`~microspec.replies.captureFrameCompact_response`
+            instead of a
+            :class:`~microspec.replies.captureFrame_response`.
+        latest : bool
+            Drop the queued frames except the most recent one (they
+            count in :attr:`num_dropped`) and return it. Default:
+            ``False``.
+
+        Returns
+        -------
+        :class:`~microspec.replies.captureFrame_response`
+            ``status='TIMEOUT'`` if no frame arrives within
+            :attr:`timeout` seconds.
+        """
+        self.subscribe()
+        with self._ready:
+            self._ready.wait_for(lambda: self._frames or not self._open, self.timeout)
+            if latest and len(self._frames) > 1:
+                self.num_dropped += len(self._frames) - 1
+                body = self._frames.pop()
+                self._frames.clear()
+            else:
+                body = self._frames.popleft() if self._frames else None
+        if body is None:
+            warnings.warn("Command captureFrame timed out.", stacklevel=2)
+            reply = replies.captureFrameCompact_response(
+                    replies.STATUS_TIMEOUT, 0, np.zeros(0, dtype=np.uint16)
+                    )
+        else:
+            self.sequence, reply = decode_frame(body)
+        return reply if compact else reply.to_response()
+
+    def captureFrames(self, num_frames : int = None, compact : bool = False):
+        """Yield the next ``num_frames`` frames (forever if
+        ``None``)."""
+        count = 0
+        while num_frames is None or count < num_frames:
+            yield self.captureFrame(compact=compact)
+            count += 1
+
+    def _read(self):
+        try:
+            while self._open:
+                kind, body = _recv(self._sock)
+                if kind == _FRAME:
+                    with self._ready:
+                        if len(self._frames) == self._frames.maxlen:
+                            self.num_dropped += 1
+                        self._frames.append(body)
+                        self._ready.notify()
+                elif kind == _REPLY:
+                    self._replies.put(json.loads(body))
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._ready:
+                self._open = False
+                self._ready.notify_all()
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""Publish frames in shared memory for other processes on the host.
+
+A :class:`FramePublisher` keeps the last few frames in a ring of
+fixed-size slots in shared memory. Any number of
+:class:`FrameReader` processes map the same memory and read the
+frames without locks and without copying them through a socket.
+
+Example
+-------
+
+In the process that owns the dev-kit:
+
+>>> import microspec as usp
+>>> kit = usp.Devkit() #doctest: +SKIP
+>>> publisher = usp.FramePublisher("microspec-frames") #doctest: +SKIP
+>>> publisher.run(kit) #doctest: +SKIP
+
+In any other process:
+
+>>> reader = usp.FrameReader("microspec-frames") #doctest: +SKIP
+>>> for sequence, reply in reader.frames(): #doctest: +SKIP
+...     plot(reply.pixels)
+
+Torn reads
+----------
+
+Every slot has a sequence counter. The publisher makes the
+counter odd while it writes the slot and sets it to twice the
+frame's sequence number when the frame is complete. A reader
+checks the counter after it reads the frame: if the counter
+changed, the publisher overwrote the slot during the read and
+the frame is discarded. Readers never block the publisher.
+
+Layout
+------
+
+=====================  =========================================
+field                  type
+=====================  =========================================
+header                 ``uint64[4]``: magic, number of slots,
+                       pixels per slot, last sequence number
+slot counters          ``uint64[num_slots]``
+slot status, size      ``uint16[num_slots, 2]``: status code,
+                       number of pixels
+pixels                 ``uint16[num_slots, max_pixels]``
+=====================  =========================================
+
+Requires Python 3.8 or later (:mod:`multiprocessing.shared_memory`).
+"""
+
+__all__ = ['FramePublisher', 'FrameReader']
+
+import sys
+import time
+import numpy as np
+from microspec.decode import decode_pixels
+import microspec.replies as replies
+
+_MAGIC = 0x4d53504652414d45 # "MSPFRAME"
+_HEADER_SIZE = 4 # uint64: magic, num_slots, max_pixels, sequence
+
+def _shared_memory(name, create = False, size = 0):
+    """Create or attach to a ``SharedMemory`` block."""
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise ImportError(
+            "Shared-memory frames require Python 3.8 or later."
+            ) from None
+    if create:
+        return shared_memory.SharedMemory(name, create=True, size=size)
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    # A reader must not unlink the publisher's memory when it exits:
+    # attach without registering with the resource tracker.
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+class _Ring():
+    """Numpy views of the shared memory."""
+
+    @staticmethod
+    def _size(num_slots, max_pixels):
+        return 8*(_HEADER_SIZE + num_slots) + 2*num_slots*(2 + max_pixels)
+
+    def _map(self, num_slots, max_pixels):
+        buf = self._shm.buf
+        offset = 8*_HEADER_SIZE
+        self._header = np.ndarray((_HEADER_SIZE,), np.uint64, buf)
+        self._counters = np.ndarray((num_slots,), np.uint64, buf, offset)
+        offset += 8*num_slots
+        self._meta = np.ndarray((num_slots, 2), np.uint16, buf, offset)
+        offset += 4*num_slots
+        self._pixels = np.ndarray((num_slots, max_pixels), np.uint16, buf, offset)
+        self.num_slots = num_slots
+        self.max_pixels = max_pixels
+
+    @property
+    def name(self) -> str:
+        """Name of the shared memory block."""
+        return self._shm.name
+
+    @property
+    def sequence(self) -> int:
+        """Sequence number of the last frame published (``0`` before
+        the first frame)."""
+        return int(self._header[3])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class FramePublisher(_Ring):
+    """Write frames into a ring of shared-memory slots.
+
+    Parameters
+    ----------
+    name : str
+        Name of the shared memory block, for the readers. Default: a
+        random name (see :attr:`name`).
+    num_slots : int
+        Number of frames kept. A reader that falls further behind
+        loses frames.
+    max_pixels : int
+        Pixels per slot. Default: 784, the unbinned frame.
+
+    Notes
+    -----
+    The publisher owns the shared memory: :func:`close` unlinks it.
+    """
+
+    def __init__(self, name : str = None, num_slots : int = 16, max_pixels : int = 784):
+        if num_slots < 1:
+            raise ValueError("num_slots must be at least 1.")
+        self._shm = _shared_memory(
+                name, create=True, size=_Ring._size(num_slots, max_pixels)
+                )
+        self._map(num_slots, max_pixels)
+        self._counters[:] = 0
+        self._header[:] = (_MAGIC, num_slots, max_pixels, 0)
+
+    def close(self):
+        """Release and unlink the shared memory."""
+        self._header = self._counters = self._meta = self._pixels = None
+        self._shm.close()
+        self._shm.unlink()
+
+    def _begin(self):
+        sequence = self.sequence + 1
+        slot = (sequence - 1) % self.num_slots
+        self._counters[slot] = 2*sequence - 1 # odd: being written
+        return sequence, slot
+
+    def _end(self, sequence, slot, status_code, num_pixels):
+        self._meta[slot] = (status_code, num_pixels)
+        self._counters[slot] = 2*sequence
+        self._header[3] = sequence
+
+    def capture(self, kit) -> tuple:
+        """Capture a frame straight into the next slot.
+
+        The frame is decoded into shared memory by
+        :func:`Devkit.captureFrame(out=...)
+        <microspec.commands.Devkit.captureFrame>`: no copy.
+
+        Returns
+        -------
+        tuple
+            ``(sequence, reply)``. The reply is a
+            :class:`~microspec.replies.captureFrameCompact_response`
+            whose pixels are a view of the slot.
+        """
+        sequence, slot = self._begin()
+        try:
+            reply = kit.captureFrame(out=self._pixels[slot])
+        except BaseException:
+            # Mark the slot complete, as an empty frame.
+            self._end(sequence, slot, replies.STATUS_TIMEOUT, 0)
+            raise
+        self._end(sequence, slot, reply.status_code, reply.num_pixels)
+        return sequence, reply
+
+    def publish(self, reply) -> int:
+        """Copy a frame already captured into the next slot.
+
+        ``reply`` is any :func:`~microspec.commands.Devkit.captureFrame`
+        reply: normal, compact, or raw. Returns its sequence number.
+        """
+        num_pixels = reply.num_pixels
+        if num_pixels > self.max_pixels:
+            raise ValueError(
+                f"Frame has {num_pixels} pixels, slots hold {self.max_pixels}."
+                )
+        sequence, slot = self._begin()
+        pixels = self._pixels[slot, :num_pixels]
+        if hasattr(reply, 'payload'):
+            decode_pixels(reply.payload, out=pixels)
+        else:
+            pixels[:] = reply.pixels[:num_pixels]
+        status_code = getattr(reply, 'status_code', None)
+        if status_code is None:
+            status_code = replies.STATUS_NAMES.index(reply.status)
+        self._end(sequence, slot, status_code, num_pixels)
+        return sequence
+
+    def run(self, kit, num_frames : int = None):
+        """Capture and publish ``num_frames`` frames (forever if
+        ``None``)."""
+        count = 0
+        while num_frames is None or count < num_frames:
+            self.capture(kit)
+            count += 1
+
+class FrameReader(_Ring):
+    """Read frames from a :class:`FramePublisher` in another process.
+
+    Parameters
+    ----------
+    name : str
+        The :attr:`FramePublisher.name`.
+
+    Attributes
+    ----------
+    num_lost : int
+        Number of frames :func:`frames` skipped because they were
+        overwritten (or torn) before they were read.
+    """
+
+    def __init__(self, name : str):
+        self._shm = _shared_memory(name)
+        header = np.ndarray((_HEADER_SIZE,), np.uint64, self._shm.buf)
+        if int(header[0]) != _MAGIC:
+            self._shm.close()
+            raise ValueError(f"{name!r} is not a microspec frame ring.")
+        self._map(int(header[1]), int(header[2]))
+        self.num_lost = 0
+
+    def close(self):
+        """Release the shared memory. The frames stay available to
+        other readers."""
+        self._header = self._counters = self._meta = self._pixels = None
+        self._shm.close()
+
+    def valid(self, sequence : int) -> bool:
+        """Return ``True`` if frame ``sequence`` is complete and not
+        overwritten yet."""
+        slot = (sequence - 1) % self.num_slots
+        return int(self._counters[slot]) == 2*sequence
+
+    def view(self, sequence : int = None):
+        """Return frame ``sequence`` (default: the last frame)
+        without copying it.
+
+        The reply's pixels are a view of the shared memory. The
+        publisher may overwrite them at any time: call
+        :func:`valid` after using them.
+
+        Returns
+        -------
+        :class:`~microspec.replies.captureFrameCompact_response`
+            Or ``None`` if the frame is not available.
+        """
+        if sequence is None: sequence = self.sequence
+        if sequence < 1 or not self.valid(sequence): return None
+        slot = (sequence - 1) % self.num_slots
+        status_code, num_pixels = self._meta[slot].tolist()
+        return replies.captureFrameCompact_response(
+                status_code, num_pixels, self._pixels[slot, :num_pixels]
+                )
+
+    def read(self, sequence : int = None, out = None):
+        """Return a copy of frame ``sequence`` (default: the last
+        frame), or ``None`` if it is not available or was torn.
+
+        Parameters
+        ----------
+        out : numpy.ndarray
+            Optional array to copy the pixels into (no
+            allocation).
+        """
+        if sequence is None: sequence = self.sequence
+        reply = self.view(sequence)
+        if reply is None: return None
+        if out is None:
+            pixels = reply.pixels.copy()
+        else:
+            pixels = out[:reply.num_pixels]
+            pixels[:] = reply.pixels
+        if not self.valid(sequence): return None # torn
+        return reply._replace(pixels=pixels)
+
+    def frames(
+            self,
+            num_frames : int = None,
+            start : int = None,
+            poll : float = 0.0005,
+            timeout : float = None
+            ):
+        """Yield ``(sequence, reply)`` for each new frame, in order.
+
+        Frames overwritten before they are read are skipped and
+        counted in :attr:`num_lost`.
+
+        Parameters
+        ----------
+        num_frames : int
+            Stop after this many frames (never if ``None``).
+        start : int
+            Sequence number of the first frame. Default: the next
+            frame published.
+        poll : float
+            Seconds to sleep while waiting for a frame.
+        timeout : float
+            Stop if no frame arrives for this many seconds.
+        """
+        next_sequence = self.sequence + 1 if start is None else max(start, 1)
+        count = 0
+        waited = time.perf_counter()
+        while num_frames is None or count < num_frames:
+            last = self.sequence
+            if last < next_sequence:
+                if timeout is not None and time.perf_counter() - waited > timeout:
+                    return
+                time.sleep(poll)
+                continue
+            # Skip frames already overwritten.
+            oldest = max(next_sequence, last - self.num_slots + 1)
+            self.num_lost += oldest - next_sequence
+            next_sequence = oldest
+            reply = self.read(next_sequence)
+            if reply is None:
+                self.num_lost += 1
+            else:
+                yield next_sequence, reply
+                count += 1
+            next_sequence += 1
+            waited = time.perf_counter()
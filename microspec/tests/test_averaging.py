@@ -0,0 +1,56 @@
+import microspec as usp
+import numpy as np
+import pytest
+
+class TestFrameAccumulator():
+    def test_FrameAccumulator_Raises_ValueError_if_mode_is_invalid(self):
+        with pytest.raises(ValueError):
+            usp.FrameAccumulator(2, mode='mode')
+    def test_FrameAccumulator_Raises_ValueError_if_num_frames_is_less_than_1(self):
+        with pytest.raises(ValueError):
+            usp.FrameAccumulator(0)
+    def test_add_Raises_ValueError_if_num_pixels_changes(self):
+        acc = usp.FrameAccumulator(2)
+        acc.add([1, 2, 3])
+        with pytest.raises(ValueError):
+            acc.add([1, 2])
+    def test_add_Raises_ValueError_if_accumulator_is_full(self):
+        acc = usp.FrameAccumulator(1)
+        acc.add([1, 2, 3])
+        with pytest.raises(ValueError):
+            acc.add([1, 2, 3])
+    def test_result_Raises_ValueError_if_no_frames_were_added(self):
+        with pytest.raises(ValueError):
+            usp.FrameAccumulator(2).result()
+    def test_mean_mode_Returns_mean_and_std_of_frames(self):
+        frames = np.random.default_rng(0).integers(0, 65535, (20, 392))
+        acc = usp.FrameAccumulator(20)
+        for frame in frames: acc.add(list(frame))
+        mean, std = acc.result()
+        assert np.allclose(mean, frames.mean(axis=0))
+        assert np.allclose(std, frames.std(axis=0))
+    def test_sum_mode_Returns_uint32_sum_of_frames(self):
+        frames = np.full((3, 784), 65535, dtype=np.uint16)
+        acc = usp.FrameAccumulator(3, mode='sum')
+        for frame in frames: acc.add(frame)
+        total, std = acc.result()
+        assert total.dtype == np.uint32
+        assert (total == 3*65535).all()
+        assert (std == 0).all()
+    def test_median_mode_Returns_median_of_frames(self):
+        acc = usp.FrameAccumulator(3, mode='median')
+        for frame in ([1, 10], [2, 20], [30, 3]): acc.add(frame)
+        median, _ = acc.result()
+        assert list(median) == [2, 10]
+    def test_sigma_clip_mode_Rejects_outliers(self):
+        acc = usp.FrameAccumulator(10, mode='sigma_clip', sigma=2)
+        for _ in range(9): acc.add([100, 100])
+        acc.add([100, 60000])
+        mean, std = acc.result()
+        assert list(mean) == [100, 100]
+        assert list(std) == [0, 0]
+    def test_result_Uses_only_the_frames_added(self):
+        acc = usp.FrameAccumulator(10, mode='median')
+        acc.add([5, 6])
+        median, _ = acc.result()
+        assert list(median) == [5, 6]
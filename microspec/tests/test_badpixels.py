@@ -0,0 +1,88 @@
+import pytest
+import numpy as np
+import microspec as usp
+
+@pytest.fixture()
+def frames():
+    rng = np.random.default_rng(0)
+    dark = rng.normal(1000, 10, (64, 392))
+    dark[:, 100] += 500 # hot
+    dark[:, 200] += rng.normal(0, 200, 64) # noisy
+    signal = np.full(392, 20000.0)
+    signal[:7] = 0 # optically black
+    signal[300] = 1000 # dead
+    light = dark + signal + rng.normal(0, 10, (64, 392))
+    return dark, light
+
+class TestFindBadPixels():
+    def test_Finds_hot_noisy_and_dead_pixels(self, frames):
+        dark, light = frames
+        assert usp.find_bad_pixels(dark, light).bad_pixels == [101, 201, 301]
+    def test_Dark_frames_only(self, frames):
+        dark, _ = frames
+        assert usp.find_bad_pixels(dark).bad_pixels == [101, 201]
+    def test_Black_pixels_are_not_dead(self, frames):
+        dark, light = frames
+        assert not usp.find_bad_pixels(dark, light).mask[:7].any()
+    def test_Keeps_serial_number(self, frames):
+        dark, _ = frames
+        assert usp.find_bad_pixels(dark, serial_number="X1").serial_number == "X1"
+    @pytest.mark.parametrize("window", [0, 6, -1])
+    def test_Raises_ValueError_if_window_is_not_odd_and_positive(self, frames, window):
+        dark, light = frames
+        with pytest.raises(ValueError):
+            usp.find_bad_pixels(dark, light, window=window)
+
+class TestBadPixelMap():
+    def test_correct_Interpolates_from_nearest_good_pixels(self):
+        bad = usp.BadPixelMap([False, True, True, False, False])
+        assert bad.correct([0, 99, 99, 30, 40]).tolist() == [0, 10, 20, 30, 40]
+    def test_correct_Uses_nearest_good_pixel_at_the_ends(self):
+        bad = usp.BadPixelMap([True, False, False, True])
+        assert bad.correct([99, 10, 20, 99]).tolist() == [10, 10, 20, 20]
+    def test_correct_Batch(self):
+        bad = usp.BadPixelMap([False, True, False])
+        out = bad.correct([[0, 99, 2], [4, 99, 8]])
+        assert out.tolist() == [[0, 1, 2], [4, 6, 8]]
+    def test_correct_In_place(self):
+        bad = usp.BadPixelMap([False, True, False])
+        pixels = np.array([0., 99., 2.])
+        assert bad.correct(pixels, out=pixels) is pixels
+        assert pixels.tolist() == [0, 1, 2]
+    def test_correct_Leaves_good_pixels_alone(self):
+        bad = usp.BadPixelMap(np.zeros(392, dtype=bool))
+        frame = np.arange(392)
+        assert (bad.correct(frame) == frame).all()
+    def test_correct_Raises_ValueError_if_pixel_count_differs(self):
+        with pytest.raises(ValueError):
+            usp.BadPixelMap([False, True, False]).correct([1, 2])
+    def test_Raises_ValueError_if_every_pixel_is_bad(self):
+        with pytest.raises(ValueError):
+            usp.BadPixelMap([True, True])
+    def test_save_and_load_by_serial_number(self, tmp_path):
+        mask = np.zeros(392, dtype=bool); mask[[3, 50]] = True
+        path = usp.BadPixelMap(mask, "X1").save(tmp_path)
+        assert path.endswith("X1-392.json")
+        loaded = usp.BadPixelMap.load("X1", 392, tmp_path)
+        assert loaded.bad_pixels == [4, 51]
+        assert loaded.serial_number == "X1"
+    def test_save_Raises_ValueError_without_serial_number(self, tmp_path):
+        with pytest.raises(ValueError):
+            usp.BadPixelMap([False, True, False]).save(tmp_path)
+    def test_for_kit_Loads_the_map_of_the_kit(self, kit, tmp_path):
+        num_pixels = kit.captureFrame().num_pixels
+        mask = np.zeros(num_pixels, dtype=bool); mask[10] = True
+        usp.BadPixelMap(mask, kit.serial_number).save(tmp_path)
+        assert usp.BadPixelMap.for_kit(kit, tmp_path).bad_pixels == [11]
+    def test_for_kit_Raises_ValueError_if_kit_has_no_serial_number(self, kit, tmp_path, monkeypatch):
+        monkeypatch.setattr(type(kit), 'serial_number', None)
+        with pytest.raises(ValueError):
+            usp.BadPixelMap.for_kit(kit, tmp_path)
+
+class TestCharacterizeBadPixels():
+    def test_Captures_dark_then_light(self, kit):
+        calls = []
+        bad = usp.characterize_bad_pixels(kit, calls.append, num_frames=4)
+        assert calls == [True, False]
+        assert bad.serial_number == kit.serial_number
+        assert bad.num_pixels == kit.captureFrame().num_pixels
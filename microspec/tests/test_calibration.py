@@ -0,0 +1,130 @@
+import microspec as usp
+import numpy as np
+import pytest
+
+class TestCalibration():
+    def test_wavelengths_Has_392_values_if_BINNING_ON(self):
+        assert len(usp.Calibration([300, 1]).wavelengths(usp.BINNING_ON)) == 392
+    def test_wavelengths_Has_784_values_if_BINNING_OFF(self):
+        assert len(usp.Calibration([300, 1]).wavelengths(usp.BINNING_OFF)) == 784
+    def test_wavelengths_Evaluates_polynomial_lowest_power_first(self):
+        cal = usp.Calibration([1, 2, 3])
+        assert cal.wavelengths()[1] == 1 + 2*2 + 3*2**2
+    def test_wavelengths_Is_cached(self):
+        cal = usp.Calibration([300, 1])
+        assert cal.wavelengths() is cal.wavelengths()
+    def test_wavelengths_Is_read_only(self):
+        with pytest.raises(ValueError):
+            usp.Calibration([300, 1]).wavelengths()[0] = 0
+    def test_Unbinned_pixel_pairs_average_to_the_binned_wavelength(self):
+        cal = usp.Calibration([300, 1])
+        binned = cal.wavelengths(usp.BINNING_ON)
+        unbinned = cal.wavelengths(usp.BINNING_OFF)
+        assert np.allclose(unbinned.reshape(-1, 2).mean(axis=1), binned)
+    def test_Binned_wavelengths_from_unbinned_coefficients(self):
+        cal = usp.Calibration([300, 0.5], binning=usp.BINNING_OFF)
+        assert cal.wavelengths(usp.BINNING_ON)[0] == 300 + 0.5*1.5
+    def test_Calibration_Raises_ValueError_if_binning_is_invalid(self):
+        with pytest.raises(ValueError):
+            usp.Calibration([300, 1], binning=2)
+    def test_load_Reads_coefficients_from_json(self, tmp_path):
+        path = tmp_path / "cal.json"
+        path.write_text('{"coefficients": [300, 1], "binning": 0}')
+        cal = usp.Calibration.load(str(path))
+        assert cal.coefficients == (300, 1)
+        assert cal.binning == usp.BINNING_OFF
+    def test_load_Reads_coefficients_from_text(self, tmp_path):
+        path = tmp_path / "cal.txt"
+        path.write_text("300\n1\n")
+        assert usp.Calibration.load(str(path)).coefficients == (300, 1)
+
+class TestResample():
+    def test_resample_Interpolates_linearly_between_pixels(self):
+        cal = usp.Calibration([300, 1])
+        frame = np.arange(392)*10.0
+        spectrum = cal.resample(frame, start=301.5, stop=302.5, step=0.5)
+        assert np.allclose(spectrum, [5, 10, 15])
+    def test_resample_Matches_numpy_interp(self):
+        cal = usp.Calibration([300, 1.1, 0.0005])
+        frame = np.random.default_rng(0).random(784)
+        grid = np.arange(302, 800, 0.7)
+        expected = np.interp(grid, cal.wavelengths(usp.BINNING_OFF), frame)
+        assert np.allclose(cal.resample(frame, 302, grid[-1], 0.7), expected)
+    def test_resample_Handles_decreasing_wavelengths(self):
+        cal = usp.Calibration([800, -1])
+        frame = np.arange(392)*1.0
+        assert np.allclose(cal.resample(frame, 790, 790, 1), [9])
+    def test_WavelengthResampler_Raises_ValueError_if_wavelengths_repeat(self):
+        with pytest.raises(ValueError):
+            usp.WavelengthResampler([300, 301, 301, 302], [300.5])
+    def test_resample_Raises_ValueError_if_calibration_is_not_monotonic(self):
+        cal = usp.Calibration([300, 2, -0.01]) # turns at pixel 100
+        with pytest.raises(ValueError):
+            cal.resample(np.ones(392), 300, 310, 1)
+    def test_resample_Fills_nan_outside_calibrated_range(self):
+        spectrum = usp.Calibration([300, 1]).resample(np.ones(392), 200, 301, 101)
+        assert np.isnan(spectrum[0])
+        assert spectrum[1] == 1
+    def test_resample_Resamples_a_batch_of_frames(self):
+        cal = usp.Calibration([300, 1])
+        frames = np.vstack([np.ones(392), 2*np.ones(392)])
+        spectra = cal.resample(frames, 310, 320, 0.5)
+        assert spectra.shape == (2, 21)
+        assert (spectra[1] == 2).all()
+    def test_resampler_Is_cached(self):
+        cal = usp.Calibration([300, 1])
+        assert cal.resampler(310, 320, 1) is cal.resampler(310, 320, 1)
+    def test_resample_Raises_ValueError_if_num_pixels_is_not_392_or_784(self):
+        with pytest.raises(ValueError):
+            usp.Calibration([300, 1]).resample(np.ones(10), 310, 320, 1)
+
+class TestRebin():
+    def test_rebin_Averages_unbinned_pixel_pairs(self):
+        frame = np.arange(784)
+        assert (usp.rebin(frame, usp.BINNING_ON) == frame.reshape(392, 2).mean(axis=1)).all()
+    def test_rebin_Sums_unbinned_pixel_pairs(self):
+        frame = np.arange(784)
+        binned = usp.rebin(frame, usp.BINNING_ON, combine='sum')
+        assert (binned == frame.reshape(392, 2).sum(axis=1)).all()
+    def test_rebin_Interpolates_at_unbinned_positions(self):
+        frame = 2*np.arange(1, 393) - 0.5 # linear in unbinned position
+        unbinned = usp.rebin(frame, usp.BINNING_OFF)
+        assert unbinned[1:-1] == pytest.approx(np.arange(2, 784))
+    def test_rebin_Uses_nearest_binned_pixel_at_the_ends(self):
+        frame = np.arange(392)
+        unbinned = usp.rebin(frame, usp.BINNING_OFF)
+        assert (unbinned[0], unbinned[-1]) == (0, 391)
+    def test_rebin_Round_trip_keeps_counts(self):
+        frame = 3.0*np.arange(392) + 100
+        for combine in usp.BINNING_COMBINE:
+            unbinned = usp.rebin(frame, usp.BINNING_OFF, combine)
+            assert usp.rebin(unbinned, usp.BINNING_ON, combine)[1:-1] == pytest.approx(frame[1:-1])
+    def test_rebin_Copies_frames_already_in_the_configuration(self):
+        frame = np.arange(392)
+        binned = usp.rebin(frame, usp.BINNING_ON)
+        assert binned.dtype == np.float64
+        assert (binned == frame).all()
+    def test_rebin_Batch(self):
+        frames = np.arange(2*784).reshape(2, 784)
+        binned = usp.rebin(frames, usp.BINNING_ON)
+        assert binned.shape == (2, 392)
+        assert (binned[1] == usp.rebin(frames[1], usp.BINNING_ON)).all()
+    def test_rebin_Mixed_frames_keep_their_order(self):
+        binned, unbinned = np.arange(392), np.arange(784)
+        out = usp.rebin([unbinned, binned, unbinned], usp.BINNING_ON)
+        assert out.shape == (3, 392)
+        assert (out[1] == binned).all()
+        assert (out[0] == usp.rebin(unbinned, usp.BINNING_ON)).all()
+        assert (out[2] == out[0]).all()
+    def test_rebin_Into_out(self):
+        out = np.empty(392)
+        assert usp.rebin(np.arange(784), usp.BINNING_ON, out=out) is out
+    def test_rebin_Raises_ValueError_if_binning_is_invalid(self):
+        with pytest.raises(ValueError):
+            usp.rebin(np.arange(392), 3)
+    def test_rebin_Raises_ValueError_if_combine_is_invalid(self):
+        with pytest.raises(ValueError):
+            usp.rebin(np.arange(392), usp.BINNING_OFF, combine='max')
+    def test_rebin_Raises_ValueError_if_num_pixels_is_not_392_or_784(self):
+        with pytest.raises(ValueError):
+            usp.rebin(np.arange(100), usp.BINNING_ON)
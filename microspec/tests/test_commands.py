@@ -3,7 +3,10 @@ import pytest
 import warnings # https://docs.python.org/3/library/warnings.html
 import re # https://docs.python.org/3/library/re.html
 # See: https://docs.python.org/3/howto/regex.html#regex-howto
+import io
 import microspeclib
+import numpy as np
+import types
 
 # -----------------
 # | TEST FIXTURES |
@@ -205,9 +208,10 @@ class TestCommandSetBridgeLED(Setup):
     def test_setBridgeLED_Raises_TypeError_if_param_led_setting_is_missing(self, kit):
         with pytest.raises(TypeError):
             kit.setBridgeLED()
-    def test_setBridgeLED_Returns_ERROR_if_param_led_setting_is_invalid(self, kit):
+    def test_setBridgeLED_Raises_TypeError_if_param_led_setting_is_invalid(self, kit):
         invalid_led_setting = 3
-        assert kit.setBridgeLED(invalid_led_setting).status == 'ERROR'
+        with pytest.raises(TypeError, match="OFF, GREEN, or RED"):
+            kit.setBridgeLED(invalid_led_setting)
     def test_setBridgeLED_Raises_TypeError_if_param_led_num_is_negative(self, kit):
         neg_led_num = -1
         with pytest.raises(TypeError):
@@ -286,9 +290,10 @@ class TestCommandSetSensorLED(Setup):
     def test_setSensorLED_Returns_ERROR_if_param_led_num_is_invalid(self, kit):
         invalid_led_num = 2
         assert kit.setSensorLED(usp.GREEN, invalid_led_num).status == 'ERROR'
-    def test_setSensorLED_Returns_ERROR_if_param_led_setting_is_invalid(self, kit):
+    def test_setSensorLED_Raises_TypeError_if_param_led_setting_is_invalid(self, kit):
         invalid_led_setting = 3
-        assert kit.setSensorLED(invalid_led_setting, 0).status == 'ERROR'
+        with pytest.raises(TypeError, match="OFF, GREEN, or RED"):
+            kit.setSensorLED(invalid_led_setting, 0)
     def test_setSensorLED_Raises_TypeError_if_param_led_num_is_missing(self, kit):
         with pytest.raises(TypeError):
             kit.setSensorLED(led_setting=usp.GREEN)
@@ -371,10 +376,12 @@ class TestCommandSetSensorConfig(Setup):
         assert kit.getSensorConfig().binning == 'BINNING_ON'
         assert kit.getSensorConfig().gain == 'GAIN1X'
         assert kit.getSensorConfig().row_bitmap == 'ALL_ROWS'
-    def test_setSensorConfig_Returns_ERROR_if_param_binning_is_invalid(self, kit):
-        assert kit.setSensorConfig(binning=2).status == 'ERROR'
-    def test_setSensorConfig_Returns_ERROR_if_param_gain_is_invalid(self, kit):
-        assert kit.setSensorConfig(gain=2).status == 'ERROR'
+    def test_setSensorConfig_Raises_TypeError_if_param_binning_is_invalid(self, kit):
+        with pytest.raises(TypeError, match="BINNING_OFF or BINNING_ON"):
+            kit.setSensorConfig(binning=2)
+    def test_setSensorConfig_Raises_TypeError_if_param_gain_is_invalid(self, kit):
+        with pytest.raises(TypeError, match="GAIN1X, GAIN2_5X, GAIN4X, or GAIN5X"):
+            kit.setSensorConfig(gain=0x99)
     def test_setSensorConfig_Returns_ERROR_if_param_row_bitmap_is_invalid(self, kit):
         # row_bitmap is invalid if three most-significant bits are set
         assert kit.setSensorConfig(row_bitmap=0xE0).status == 'ERROR'
@@ -576,6 +583,89 @@ class TestCommandCaptureFrame(Setup):
             m.setattr(kit, "is_out_of_time", lambda reply : "True")
             with pytest.warns(UserWarning):
                 assert kit.captureFrame().frame == {}
+    def test_captureFrame_Returns_stats_if_param_stats_is_True(self, kit):
+        reply = kit.captureFrame(stats=True)
+        assert type(reply) == usp.replies.captureFrameStats_response
+        assert reply.stats.peak == max(reply.pixels[6:392])
+    def test_captureFrame_Returns_stats_None_if_command_timeouts(
+            self, kit, monkeypatch
+            ):
+        with monkeypatch.context() as m:
+            m.setattr(kit, "is_out_of_time", lambda reply : "True")
+            with pytest.warns(UserWarning):
+                assert kit.captureFrame(stats=True).stats == None
+    def test_captureFrame_stats_Use_target_from_autoexpose_config(self, kit):
+        kit.setAutoExposeConfig(target=10, target_tolerance=0)
+        assert kit.captureFrame(stats=True).stats.overexposed
+        kit.setAutoExposeConfig()
+
+class TestCommandCaptureFrames(Setup):
+    def test_captureFrames_Yields_num_frames_replies(self, kit):
+        replies = list(kit.captureFrames(3))
+        assert len(replies) == 3
+        assert all(reply.status == 'OK' for reply in replies)
+    def test_captureFrames_Yields_frames_until_caller_stops_if_num_frames_is_None(self, kit):
+        for count, reply in enumerate(kit.captureFrames(), start=1):
+            if count == 5: break
+        assert count == 5
+    def test_captureFrames_Raises_TypeError_if_num_frames_is_negative(self, kit):
+        with pytest.raises(TypeError):
+            next(kit.captureFrames(-1))
+    def test_captureFrames_Allows_setExposure_between_frames(self, kit):
+        for reply in kit.captureFrames(2):
+            kit.setExposure(cycles=100)
+        assert kit.getExposure().cycles == 100
+        kit.setExposure(ms=1)
+
+class TestCommandCaptureAverage(Setup):
+    def test_captureAverage_Returns_status_OK(self, kit):
+        assert kit.captureAverage(3).status == 'OK'
+    def test_captureAverage_Returns_num_frames_combined(self, kit):
+        assert kit.captureAverage(3).num_frames == 3
+    def test_captureAverage_Returns_num_pixels_392_if_pixel_BINNING_ON(self, kit):
+        reply = kit.captureAverage(3)
+        assert reply.num_pixels == 392
+        assert len(reply.pixels) == 392
+        assert len(reply.std) == 392
+    def test_captureAverage_Returns_uint32_pixels_in_sum_mode(self, kit):
+        assert kit.captureAverage(3, mode='sum').pixels.dtype == np.uint32
+    def test_captureAverage_Raises_ValueError_if_mode_is_invalid(self, kit):
+        with pytest.raises(ValueError):
+            kit.captureAverage(3, mode='mode')
+    def test_captureAverage_Raises_TypeError_if_num_frames_is_negative(self, kit):
+        with pytest.raises(TypeError):
+            kit.captureAverage(-1)
+    def test_captureAverage_Issues_timeout_warning_if_a_frame_timeouts(
+            self, kit, monkeypatch
+            ):
+        with monkeypatch.context() as m:
+            m.setattr(kit, "is_out_of_time", lambda reply : "True")
+            with pytest.warns(UserWarning, match="Command captureAverage timed out."):
+                kit.captureAverage(3)
+    def test_captureAverage_Returns_status_TIMEOUT_if_every_frame_timeouts(
+            self, kit, monkeypatch
+            ):
+        with monkeypatch.context() as m:
+            m.setattr(kit, "is_out_of_time", lambda reply : "True")
+            with pytest.warns(UserWarning):
+                reply = kit.captureAverage(3)
+        assert reply.status == 'TIMEOUT'
+        assert reply.num_frames == 0
+    def test_captureAverage_Returns_status_ERROR_if_every_frame_is_an_ERROR(
+            self, kit, monkeypatch
+            ):
+        receiveReply = kit.receiveReply
+        def error():
+            receiveReply()
+            return types.SimpleNamespace(status=usp.ERROR)
+        with monkeypatch.context() as m:
+            m.setattr(kit, "receiveReply", error)
+            reply = kit.captureAverage(3)
+        assert reply.status == 'ERROR'
+        assert reply.num_frames == 0
+    def test_captureAverage_Leaves_the_dev_kit_ready_for_the_next_command(self, kit):
+        kit.captureAverage(3)
+        assert kit.captureFrame().status == 'OK'
 
 class TestCommandAutoExposure(Setup):
     def test_autoExposure_Returns_a_reply_with_a_readable_repr(self, kit):
@@ -627,6 +717,34 @@ class TestCommandAutoExposure(Setup):
             with pytest.warns(UserWarning):
                 assert kit.autoExposure().iterations == 0
 
+    def test_autoExposure_host_Returns_success_str_HIT_TARGET_or_str_GAVE_UP(self, kit):
+        success = kit.autoExposure(host=True).success
+        assert success == 'HIT_TARGET' or success == 'GAVE_UP'
+    def test_autoExposure_host_Returns_iterations_int_between_1_and_3(self, kit):
+        iterations = kit.autoExposure(host=True).iterations
+        assert iterations >= 1
+        assert iterations <= 3
+    def test_autoExposure_host_Starts_with_a_short_probe_frame(self, kit, monkeypatch):
+        kit.setExposure(cycles=1000)
+        exposures = []
+        capture = kit.captureFrame
+        def captureFrame(*args, **kwargs):
+            exposures.append(kit.exposure_time_cycles)
+            return capture(*args, **kwargs)
+        monkeypatch.setattr(kit, "captureFrame", captureFrame)
+        kit.autoExposure(host=True)
+        assert exposures[0] == 100
+    def test_autoExposure_host_Updates_Devkit_exposure_time_attrs(self, kit):
+        kit.autoExposure(host=True)
+        assert kit.exposure_time_cycles == kit.getExposure().cycles
+    def test_autoExposure_host_Returns_status_TIMEOUT_if_captureFrame_timeouts(
+            self, kit, monkeypatch
+            ):
+        with monkeypatch.context() as m:
+            m.setattr(kit, "is_out_of_time", lambda reply : "True")
+            with pytest.warns(UserWarning):
+                assert kit.autoExposure(host=True).status == 'TIMEOUT'
+
 class TestCommandGetAutoExposeConfig(Setup):
     def test_getAutoExposeConfig_Returns_a_reply_with_a_readable_repr(self, kit):
         pattern = re.compile(""
@@ -716,6 +834,11 @@ class TestCommandGetAutoExposeConfig(Setup):
                 assert kit.getAutoExposeConfig().max_exposure == 0
 
 class TestCommandSetAutoExposeConfig(Setup):
+    def test_setAutoExposeConfig_Updates_Devkit_autoexpose_config_attr(self, kit):
+        kit.setAutoExposeConfig(target=40000)
+        assert kit.autoexpose_config.target == 40000
+        kit.setAutoExposeConfig()
+        assert kit.autoexpose_config == kit.getAutoExposeConfig()
     def test_setAutoExposeConfig_Returns_a_reply_with_a_readable_repr(self, kit):
         assert repr(kit.setAutoExposeConfig()) == "setAutoExposeConfig_response(status='OK')"
     def test_Call_setAutoExposeConfig_using_default_params(self, kit):
@@ -773,3 +896,439 @@ class TestCommandSetAutoExposeConfig(Setup):
             m.setattr(kit, "is_out_of_time", lambda reply : "True")
             with pytest.warns(UserWarning):
                 assert kit.setAutoExposeConfig().status == 'TIMEOUT'
+
+class TestCommandBatch(Setup):
+    def test_batch_Returns_the_reply_of_each_command_in_order(self, kit):
+        with kit.batch() as b:
+            b.getBridgeLED()
+            b.getExposure()
+            b.captureFrame()
+        assert [type(reply) for reply in b.replies] == [
+                usp.replies.getBridgeLED_response,
+                usp.replies.getExposure_response,
+                usp.replies.captureFrame_response
+                ]
+        assert all(reply.status == 'OK' for reply in b.replies)
+    def test_batch_Sends_commands_in_order(self, kit):
+        with kit.batch() as b:
+            b.setExposure(cycles=100)
+            b.getExposure()
+            b.setExposure(ms=1)
+        assert b.replies[1].cycles == 100
+    def test_batch_Updates_Devkit_attrs(self, kit):
+        with kit.batch() as b:
+            b.setSensorConfig(binning=usp.BINNING_OFF)
+            b.setExposure(cycles=100)
+            b.captureFrame()
+        assert kit.binning == usp.BINNING_OFF
+        assert kit.exposure_time_cycles == 100
+        assert b.replies[2].num_pixels == 784
+        kit.setSensorConfig()
+        kit.setExposure(ms=1)
+    def test_batch_Raises_TypeError_before_sending_if_a_param_is_invalid(self, kit):
+        cycles = kit.getExposure().cycles
+        with pytest.raises(TypeError):
+            with kit.batch() as b:
+                b.setExposure(cycles=cycles+1)
+                b.setExposure(cycles=-1)
+        assert kit.getExposure().cycles == cycles
+    def test_batch_Raises_AttributeError_for_a_command_that_cannot_be_batched(self, kit):
+        with pytest.raises(AttributeError):
+            kit.batch().captureAverage
+    def test_batch_Raises_ValueError_for_a_command_that_sends_nothing(self, kit, monkeypatch):
+        monkeypatch.setattr(kit, "getBridgeLED", lambda: None)
+        with pytest.raises(ValueError):
+            kit.batch().getBridgeLED()
+    def test_batch_Raises_RuntimeError_for_a_raw_frame(self, kit):
+        with pytest.raises(RuntimeError):
+            kit.batch().captureFrame(raw=True)
+        assert kit.getBridgeLED().status == 'OK'
+    def test_intercept_Routes_commands_through_the_handler(self, kit):
+        commands = []
+        def handler(command, send):
+            commands.append(command)
+            return send(command)
+        with kit.intercept(handler):
+            assert kit.getBridgeLED().status == 'OK'
+        assert len(commands) == 1
+        kit.getBridgeLED()
+        assert len(commands) == 1
+    def test_batch_Does_not_change_Devkit_timeout(self, kit):
+        timeout = kit.timeout
+        with kit.batch() as b:
+            b.captureFrame()
+        assert kit.timeout == timeout
+    def test_batch_Returns_status_TIMEOUT_for_replies_lost_after_a_timeout(self, kit, monkeypatch):
+        receiveReply = kit.receiveReply
+        calls = []
+        def truncated():
+            calls.append(1)
+            return receiveReply() if len(calls) == 1 else None
+        monkeypatch.setattr(kit, "receiveReply", truncated)
+        with pytest.warns(UserWarning):
+            with kit.batch() as b:
+                b.getBridgeLED()
+                b.setBridgeLED(usp.GREEN)
+                b.getSensorLED(0)
+                b.setSensorLED(0, usp.GREEN)
+                b.getBridgeLED()
+                b.setSensorConfig()
+        assert [reply.status for reply in b.replies] == ['OK'] + ['TIMEOUT']*5
+        monkeypatch.undo()
+        assert kit.getBridgeLED().status == 'OK'
+    def test_batch_Does_not_need_the_autoexpose_config(self, kit, monkeypatch):
+        monkeypatch.delattr(kit, "autoexpose_config")
+        with kit.batch() as b:
+            b.getExposure()
+        assert b.replies[0].status == 'OK'
+        assert b._autoexpose_limits() == (12, 10000)
+    def test_batch_Leaves_the_dev_kit_ready_for_the_next_command(self, kit):
+        with kit.batch() as b:
+            b.captureFrame()
+            b.captureFrame()
+        assert kit.getBridgeLED().status == 'OK'
+
+@pytest.fixture
+def elide(kit):
+    """Turn on elide mode for one test."""
+    kit.elide = True
+    yield kit
+    kit.elide = False
+
+class TestElide(Setup):
+    def test_elide_Skips_setExposure_if_exposure_time_is_confirmed(
+            self, elide, monkeypatch
+            ):
+        kit = elide
+        kit.setExposure(cycles=100)
+        num_elided = kit.num_elided
+        with monkeypatch.context() as m:
+            m.setattr(kit, "sendAndReceive", lambda command: 1/0)
+            assert kit.setExposure(cycles=100).status == 'OK'
+        assert kit.num_elided == num_elided + 1
+        kit.setExposure(ms=1)
+    def test_elide_Sends_setExposure_if_exposure_time_changes(self, elide):
+        kit = elide
+        kit.setExposure(cycles=100)
+        num_elided = kit.num_elided
+        kit.setExposure(cycles=200)
+        assert kit.num_elided == num_elided
+        assert kit.getExposure().cycles == 200
+        kit.setExposure(ms=1)
+    def test_elide_Skips_setSensorConfig_if_config_is_confirmed(self, elide):
+        kit = elide
+        kit.getSensorConfig()
+        num_elided = kit.num_elided
+        kit.setSensorConfig(kit.binning, kit.gain, kit.row_bitmap)
+        assert kit.num_elided == num_elided + 1
+    def test_elide_Skips_setBridgeLED_if_led_setting_is_confirmed(self, elide):
+        kit = elide
+        kit.setBridgeLED(usp.GREEN)
+        num_elided = kit.num_elided
+        kit.setBridgeLED(usp.GREEN)
+        assert kit.num_elided == num_elided + 1
+    def test_elide_Skips_setAutoExposeConfig_if_config_is_confirmed(self, elide):
+        kit = elide
+        kit.setAutoExposeConfig()
+        num_elided = kit.num_elided
+        kit.setAutoExposeConfig()
+        assert kit.num_elided == num_elided + 1
+    def test_elide_Sends_a_command_with_force_True(self, elide):
+        kit = elide
+        kit.setExposure(ms=1)
+        num_elided = kit.num_elided
+        kit.setExposure(ms=1, force=True)
+        assert kit.num_elided == num_elided
+    def test_elide_Is_off_by_default(self, kit):
+        kit.setExposure(ms=1)
+        num_elided = kit.num_elided
+        kit.setExposure(ms=1)
+        assert kit.num_elided == num_elided
+    def test_elide_Forgets_state_after_a_timeout(self, elide, monkeypatch):
+        kit = elide
+        kit.setExposure(ms=1)
+        timeout = kit.timeout
+        with monkeypatch.context() as m:
+            m.setattr(kit, "is_out_of_time", lambda reply : "True")
+            m.setattr(kit.stream, "read", lambda *args, **kwargs : b'')
+            kit.timeout = 0.01
+            with pytest.warns(UserWarning):
+                kit.captureFrame()
+        kit.timeout = timeout
+        num_elided = kit.num_elided
+        kit.setExposure(ms=1)
+        assert kit.num_elided == num_elided
+    def test_elide_Forgets_state_after_an_error(self, elide):
+        kit = elide
+        kit.setBridgeLED(usp.GREEN)
+        kit.setBridgeLED(usp.GREEN, led_num=1) # ERROR
+        num_elided = kit.num_elided
+        kit.setBridgeLED(usp.GREEN)
+        assert kit.num_elided == num_elided
+    def test_invalidate_state_Forgets_confirmed_state(self, elide):
+        kit = elide
+        kit.setExposure(ms=1)
+        kit.invalidate_state()
+        num_elided = kit.num_elided
+        kit.setExposure(ms=1)
+        assert kit.num_elided == num_elided
+    def test_batch_Sends_every_command_even_if_elide_is_on(self, elide):
+        kit = elide
+        kit.setExposure(ms=1)
+        with kit.batch() as b:
+            b.setExposure(ms=1)
+        assert b.replies[0].status == 'OK'
+
+class TestValidate(Setup):
+    def test_validate_Is_on_by_default(self, kit):
+        assert kit.validate == True
+    def test_validate_Keeps_the_TypeError_message_for_a_negative_param(self, kit):
+        with pytest.raises(TypeError, match="Parameter 'led_num' must be non-negative."):
+            kit.getBridgeLED(led_num=-1)
+    def test_validate_Keeps_the_TypeError_message_for_a_missing_param(self, kit):
+        with pytest.raises(TypeError, match="missing 1 required positional argument: 'led_setting'"):
+            kit.setBridgeLED()
+    def test_validate_Keeps_the_signature_of_each_command(self, kit):
+        import inspect
+        assert list(inspect.signature(kit.setSensorLED).parameters) == [
+                'led_setting', 'led_num'
+                ]
+    def test_validate_Checks_positional_params(self, kit):
+        with pytest.raises(TypeError, match="led_setting"):
+            kit.setSensorLED(7, 0)
+        with pytest.raises(TypeError, match="gain"):
+            kit.setSensorConfig(usp.BINNING_ON, 0x99)
+    def test_validate_Accepts_every_constant(self, kit):
+        for led_setting in (usp.OFF, usp.RED, usp.GREEN):
+            assert kit.setBridgeLED(led_setting).status == 'OK'
+        for gain in (usp.GAIN1X, usp.GAIN2_5X, usp.GAIN4X, usp.GAIN5X):
+            assert kit.setSensorConfig(gain=gain).status == 'OK'
+        assert kit.setSensorConfig(binning=usp.BINNING_OFF).status == 'OK'
+        assert kit.setSensorConfig().status == 'OK'
+    def test_validate_Keeps_the_TypeError_message_for_an_unexpected_param(self, kit):
+        with pytest.raises(TypeError, match="unexpected keyword argument 'bad'"):
+            kit.setExposure(bad=1)
+    def test_validate_False_Skips_the_parameter_checks(self, kit):
+        kit.validate = False
+        try:
+            # The firmware rejects the invalid value instead.
+            assert kit.setBridgeLED(usp.GREEN, led_num=1).status == 'ERROR'
+            assert kit.setBridgeLED(3).status == 'ERROR'
+            assert kit.setSensorConfig(gain=2).status == 'ERROR'
+            kit.setExposure(cycles=usp.MIN_CYCLES-1) # no TypeError
+        finally:
+            kit.validate = True
+            kit.setExposure(ms=1)
+
+class TestCompactReplies(Setup):
+    def test_captureFrame_compact_Returns_a_uint16_pixel_array(self, kit):
+        reply = kit.captureFrame(compact=True)
+        assert type(reply) == usp.replies.captureFrameCompact_response
+        assert reply.pixels.dtype == np.uint16
+        assert len(reply.pixels) == reply.num_pixels
+    def test_captureFrame_compact_Has_the_status_str_as_a_view(self, kit):
+        reply = kit.captureFrame(compact=True)
+        assert (reply.status_code, reply.status) == (0, 'OK')
+    def test_captureFrame_compact_Returns_status_TIMEOUT_if_command_timeouts(
+            self, kit, monkeypatch
+            ):
+        with monkeypatch.context() as m:
+            m.setattr(kit, "is_out_of_time", lambda reply : "True")
+            with pytest.warns(UserWarning):
+                reply = kit.captureFrame(compact=True)
+        assert reply.status == 'TIMEOUT'
+        assert len(reply.pixels) == 0
+    def test_captureFrame_Raises_TypeError_if_stats_and_compact(self, kit):
+        with pytest.raises(TypeError):
+            kit.captureFrame(stats=True, compact=True)
+    def test_FrameBlock_Stores_frames_column_wise(self, kit):
+        block = usp.replies.FrameBlock(capacity=1)
+        for reply in kit.captureFrames(3, compact=True):
+            block.append(reply)
+        assert len(block) == 3
+        assert block.pixels.shape == (3, 784)
+        assert block.status == ['OK', 'OK', 'OK']
+        assert (block[2].pixels == block.pixels[2, :392]).all()
+
+class TestRawFrames(Setup):
+    def test_captureFrame_raw_Returns_header_and_big_endian_payload(self, kit):
+        reply = kit.captureFrame(raw=True)
+        assert type(reply) == usp.replies.captureFrameRaw_response
+        assert reply.status == 'OK'
+        assert usp.parse_header(reply.header) == (0, 0, reply.num_pixels)
+        assert len(reply.payload) == 2*reply.num_pixels
+    def test_captureFrame_raw_Payload_decodes_to_the_pixels(self, kit):
+        kit.setBridgeLED(usp.GREEN) # settle stream
+        pixels = usp.decode_pixels(kit.captureFrame(raw=True).payload)
+        assert len(pixels) == kit.captureFrame().num_pixels
+    def test_captureFrame_raw_Returns_status_TIMEOUT_if_command_timeouts(
+            self, kit, monkeypatch
+            ):
+        with monkeypatch.context() as m:
+            m.setattr(kit, "is_out_of_time", lambda reply : "True")
+            with pytest.warns(UserWarning):
+                reply = kit.captureFrame(raw=True)
+        assert (reply.status, reply.payload) == ('TIMEOUT', b'')
+    def test_captureFrame_raw_Leaves_the_dev_kit_ready_for_the_next_command(self, kit):
+        kit.captureFrame(raw=True)
+        assert kit.getBridgeLED().status == 'OK'
+    def test_captureFrame_Raises_TypeError_if_raw_and_compact(self, kit):
+        with pytest.raises(TypeError):
+            kit.captureFrame(compact=True, raw=True)
+
+class TestCaptureFrameInto(Setup):
+    def test_captureFrame_out_Decodes_into_the_given_row(self, kit):
+        block = np.zeros((2, 784), dtype=np.uint16)
+        reply = kit.captureFrame(out=block[1])
+        assert type(reply) == usp.replies.captureFrameCompact_response
+        assert reply.status == 'OK'
+        assert np.shares_memory(reply.pixels, block)
+        assert block[1, :reply.num_pixels].any()
+        assert not block[0].any()
+    def test_captureFrame_out_Matches_captureFrame(self, kit):
+        kit.setBridgeLED(usp.GREEN) # settle stream
+        out = np.zeros(784, dtype=np.uint16)
+        reply = kit.captureFrame(out=out)
+        assert reply.num_pixels == kit.captureFrame().num_pixels
+    def test_captureFrame_out_Raises_ValueError_if_out_is_too_short(self, kit):
+        with pytest.raises(ValueError):
+            kit.captureFrame(out=np.zeros(10, dtype=np.uint16))
+    def test_captureFrame_out_Raises_TypeError_if_stats_or_raw(self, kit):
+        out = np.zeros(784, dtype=np.uint16)
+        with pytest.raises(TypeError):
+            kit.captureFrame(stats=True, out=out)
+        with pytest.raises(TypeError):
+            kit.captureFrame(raw=True, out=out)
+    def test_captureFrame_out_Returns_status_TIMEOUT_if_command_timeouts(
+            self, kit, monkeypatch
+            ):
+        out = np.zeros(784, dtype=np.uint16)
+        with monkeypatch.context() as m:
+            m.setattr(kit, "is_out_of_time", lambda reply : "True")
+            with pytest.warns(UserWarning):
+                reply = kit.captureFrame(out=out)
+        assert (reply.status, reply.num_pixels) == ('TIMEOUT', 0)
+    def test_captureFrames_out_Fills_one_row_per_frame(self, kit):
+        block = np.zeros((3, 784), dtype=np.uint16)
+        frames = list(kit.captureFrames(3, out=block))
+        assert [f.status for f in frames] == ['OK']*3
+        for row, frame in zip(block, frames):
+            assert np.shares_memory(frame.pixels, row)
+    def test_captureFrames_out_Raises_TypeError_if_flags_are_combined(self, kit):
+        block = np.zeros((1, 784), dtype=np.uint16)
+        for flag in ('stats', 'compact', 'raw'):
+            with pytest.raises(TypeError):
+                next(kit.captureFrames(1, out=block, **{flag: True}))
+        with pytest.raises(TypeError):
+            next(kit.captureFrames(1, out=block, roi=usp.RegionsOfInterest({'a': (1, 2)})))
+    def test_captureFrames_out_Raises_ValueError_if_out_has_too_few_rows(self, kit):
+        with pytest.raises(ValueError):
+            next(kit.captureFrames(3, out=np.zeros((2, 784), dtype=np.uint16)))
+
+class TestBulkFrameRead(Setup):
+    def test_captureFrame_raw_Reads_the_header_then_the_pixels(self, kit, monkeypatch):
+        calls = []
+        readinto = kit.stream.readinto
+        def counting(b):
+            calls.append(len(b))
+            return readinto(b)
+        monkeypatch.setattr(kit.stream, "readinto", counting)
+        reply = kit.captureFrame(raw=True)
+        assert reply.status == 'OK'
+        assert calls == [1, 1, 2, 2*reply.num_pixels]
+    @pytest.mark.parametrize("reply", [bytes([usp.ERROR]), bytes([usp.OK, usp.ERROR])])
+    def test_readFrameBytes_Reads_only_the_status_bytes_of_an_ERROR_reply(
+            self, kit, monkeypatch, reply
+            ):
+        stream = io.BytesIO(reply)
+        calls = []
+        def readinto(b):
+            calls.append(len(b))
+            return stream.readinto(b)
+        monkeypatch.setattr(kit.stream, "readinto", readinto)
+        header, payload = kit._readFrameBytes()
+        assert bytes(header) == reply
+        assert len(payload) == 0
+        assert calls == [1]*len(reply)
+    def test_captureFrame_raw_Payload_is_not_overwritten_by_the_next_frame(self, kit):
+        reply = kit.captureFrame(raw=True)
+        payload = bytes(reply.payload)
+        kit.captureFrame(raw=True)
+        assert type(reply.payload) == bytes
+        assert reply.payload == payload
+    def test_captureFrame_raw_Reads_a_frame_with_unexpected_binning(self, kit, monkeypatch):
+        num_pixels = kit.captureFrame(raw=True).num_pixels
+        monkeypatch.setattr(kit, "binning", usp.BINNING_OFF if num_pixels == 392 else usp.BINNING_ON)
+        reply = kit.captureFrame(raw=True)
+        assert reply.num_pixels == num_pixels
+        assert len(reply.payload) == 2*num_pixels
+
+class TestCaptureFramesPipelined(Setup):
+    def test_captureFrames_pipeline_Yields_num_frames_in_order(self, kit):
+        replies = list(kit.captureFrames(5, pipeline=True))
+        assert [r.status for r in replies] == ['OK']*5
+        assert type(replies[0]) == usp.replies.captureFrame_response
+        assert replies[0].frame[1] == replies[0].pixels[0]
+    def test_captureFrames_pipeline_Requests_next_frame_before_yielding(self, kit, monkeypatch):
+        writes = []
+        write = kit.write
+        monkeypatch.setattr(kit, "write", lambda b: (writes.append(b), write(b))[1])
+        frames = kit.captureFrames(3, pipeline=True, compact=True)
+        next(frames)
+        assert len(writes) == 2
+        assert len(list(frames)) == 2
+        assert len(writes) == 3
+    def test_captureFrames_pipeline_Matches_captureFrame_replies(self, kit):
+        num_pixels = kit.captureFrame().num_pixels
+        compact, raw, stats = (
+                next(kit.captureFrames(1, pipeline=True, **{flag: True}))
+                for flag in ('compact', 'raw', 'stats')
+                )
+        assert type(compact) == usp.replies.captureFrameCompact_response
+        assert compact.num_pixels == num_pixels
+        assert type(raw) == usp.replies.captureFrameRaw_response
+        assert type(raw.payload) == bytes
+        assert len(raw.payload) == 2*num_pixels
+        assert type(stats) == usp.replies.captureFrameStats_response
+        assert stats.stats is not None
+    def test_captureFrames_pipeline_Decodes_into_out(self, kit):
+        block = np.zeros((3, 784), dtype=np.uint16)
+        replies = list(kit.captureFrames(3, pipeline=True, out=block))
+        for k, reply in enumerate(replies):
+            assert np.shares_memory(reply.pixels, block[k])
+            assert block[k, :reply.num_pixels].all()
+    def test_captureFrames_pipeline_Keeps_regions_of_interest(self, kit):
+        roi = usp.RegionsOfInterest({'red': (300, 309)})
+        replies = list(kit.captureFrames(2, pipeline=True, roi=roi))
+        assert [len(r.regions['red']) for r in replies] == [10, 10]
+    def test_captureFrames_pipeline_Stopping_early_leaves_the_stream_clean(self, kit):
+        for k, reply in enumerate(kit.captureFrames(pipeline=True, compact=True)):
+            if k == 2: break
+        assert kit.getBridgeLED().status == 'OK'
+        assert kit.captureFrame().status == 'OK'
+    def test_captureFrames_pipeline_Returns_status_TIMEOUT_if_command_timeouts(
+            self, kit, monkeypatch
+            ):
+        with monkeypatch.context() as m:
+            m.setattr(kit, "is_out_of_time", lambda reply : True)
+            with pytest.warns(UserWarning):
+                replies = list(kit.captureFrames(2, pipeline=True, compact=True))
+        assert [r.status for r in replies] == ['TIMEOUT']*2
+        assert [r.num_pixels for r in replies] == [0, 0]
+    def test_captureFrames_pipeline_Raises_RuntimeError_for_a_command_sent_mid_pipeline(self, kit):
+        frames = kit.captureFrames(3, pipeline=True, compact=True)
+        next(frames)
+        with pytest.raises(RuntimeError):
+            kit.getExposure()
+        with pytest.raises(RuntimeError):
+            kit.captureFrame(raw=True)
+        frames.close()
+        assert kit.getExposure().status == 'OK'
+    def test_captureFrames_pipeline_Raises_TypeError_if_flags_are_combined(self, kit):
+        with pytest.raises(TypeError):
+            next(kit.captureFrames(1, pipeline=True, compact=True, raw=True))
+
+class TestSerialNumber(Setup):
+    def test_serial_number_Is_the_USB_serial_number(self, kit):
+        assert isinstance(kit.serial_number, str)
+        assert kit.serial_number != ''
@@ -89,3 +89,5 @@ def test_MIN_CYCLES_is_1():
     assert usp.MIN_CYCLES == 1
 def test_MAX_CYCLES_is_65500():
     assert usp.MAX_CYCLES == 65500
+def test_MAX_COUNTS_is_65535():
+    assert usp.MAX_COUNTS == 65535
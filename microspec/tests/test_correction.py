@@ -0,0 +1,58 @@
+import microspec as usp
+import numpy as np
+import pytest
+
+class TestSubtractDark():
+    def test_subtract_dark_Subtracts_mean_of_7_black_pixels_if_392_pixels(self):
+        frame = np.full(392, 1500)
+        frame[:7] = 1000
+        assert (usp.subtract_dark(frame)[7:] == 500).all()
+    def test_subtract_dark_Subtracts_mean_of_14_black_pixels_if_784_pixels(self):
+        frame = np.full(784, 1500)
+        frame[:14] = 1000
+        assert (usp.subtract_dark(frame)[14:] == 500).all()
+    def test_subtract_dark_Subtracts_black_level_of_each_frame_in_a_batch(self):
+        frames = np.full((2, 392), 1500)
+        frames[0,:7] = 1000
+        frames[1,:7] = 1100
+        corrected = usp.subtract_dark(frames)
+        assert (corrected[0,7:] == 500).all()
+        assert (corrected[1,7:] == 400).all()
+    def test_subtract_dark_Subtracts_dark_frame(self):
+        dark = np.arange(392)
+        frame = dark + 100
+        assert (usp.subtract_dark(frame, dark, black_level=False) == 100).all()
+    def test_subtract_dark_Writes_result_to_out(self):
+        out = np.empty(392)
+        result = usp.subtract_dark(np.ones(392), out=out)
+        assert result is out
+    def test_subtract_dark_Raises_ValueError_if_num_pixels_is_not_392_or_784(self):
+        with pytest.raises(ValueError):
+            usp.subtract_dark(np.ones(100))
+
+class TestDarkFrameCache():
+    def test_key_Is_exposure_gain_binning_and_row_bitmap(self, kit):
+        kit.setSensorConfig()
+        kit.setExposure(ms=1)
+        darks = usp.DarkFrameCache(kit)
+        assert darks.key() == (50, usp.GAIN1X, usp.BINNING_ON, usp.ALL_ROWS)
+    def test_get_Captures_a_dark_frame_if_none_is_cached(self, kit):
+        darks = usp.DarkFrameCache(kit, num_frames=2)
+        assert len(darks.get()) == 392
+    def test_get_Returns_the_cached_dark_frame(self, kit):
+        darks = usp.DarkFrameCache(kit, num_frames=2)
+        assert darks.get() is darks.get()
+    def test_get_Captures_a_new_dark_frame_if_it_is_stale(self, kit):
+        darks = usp.DarkFrameCache(kit, num_frames=2, max_age=0)
+        assert darks.get() is not darks.get()
+    def test_get_Captures_a_new_dark_frame_if_exposure_time_changes(self, kit):
+        darks = usp.DarkFrameCache(kit, num_frames=2)
+        dark = darks.get()
+        kit.setExposure(ms=2)
+        assert darks.get() is not dark
+        kit.setExposure(ms=1)
+    def test_acquire_Closes_and_opens_the_shutter(self, kit):
+        calls = []
+        darks = usp.DarkFrameCache(kit, num_frames=2, shutter=calls.append)
+        darks.acquire()
+        assert calls == [True, False]
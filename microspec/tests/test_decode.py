@@ -0,0 +1,27 @@
+import microspec as usp
+import numpy as np
+import struct
+
+def payload_of(pixels):
+    return struct.pack(f'>{len(pixels)}H', *pixels)
+
+class TestDecode():
+    def test_parse_header_Returns_statuses_and_num_pixels(self):
+        assert usp.parse_header(bytes([0, 1, 0x03, 0x10])) == (0, 1, 784)
+    def test_decode_pixels_Decodes_big_endian_uint16(self):
+        pixels = usp.decode_pixels(payload_of([1, 256, 65535]))
+        assert pixels.dtype == np.uint16
+        assert pixels.tolist() == [1, 256, 65535]
+    def test_decode_pixels_Decodes_a_memoryview(self):
+        payload = memoryview(payload_of([7, 8, 9]))
+        assert usp.decode_pixels(payload[2:]).tolist() == [8, 9]
+    def test_decode_pixels_Writes_into_out(self):
+        block = np.zeros((2, 3), dtype=np.uint16)
+        usp.decode_pixels(payload_of([1, 2, 3]), out=block[1])
+        assert block.tolist() == [[0, 0, 0], [1, 2, 3]]
+    def test_decode_frames_Returns_one_row_per_payload(self):
+        frames = usp.decode_frames([payload_of([1, 2]), payload_of([3, 4])])
+        assert frames.tolist() == [[1, 2], [3, 4]]
+    def test_decode_frames_Splits_one_buffer_by_num_pixels(self):
+        buffer = payload_of([1, 2, 3, 4, 5, 6])
+        assert usp.decode_frames(buffer, num_pixels=3).tolist() == [[1, 2, 3], [4, 5, 6]]
@@ -0,0 +1,164 @@
+import microspec as usp
+import numpy as np
+import pytest
+
+class TestPredictExposure():
+    def test_predict_exposure_Scales_signal_above_offset_to_target(self):
+        assert usp.predict_exposure(100, peak=11000, offset=1000, target=46000) == 450
+    def test_predict_exposure_Clamps_to_max_cycles(self):
+        assert usp.predict_exposure(60000, 2000, 1000, 46000) == usp.MAX_CYCLES
+    def test_predict_exposure_Clamps_to_min_cycles(self):
+        assert usp.predict_exposure(1, 65535, 1000, 2000) == usp.MIN_CYCLES
+    def test_predict_exposure_Uses_max_cycles_param(self):
+        assert usp.predict_exposure(100, 1010, 1000, 46000, max_cycles=10000) == 10000
+    def test_predict_exposure_Multiplies_by_10_if_there_is_no_signal(self):
+        assert usp.predict_exposure(100, 1000, 1000, 46000) == 1000
+
+class LinearKit():
+    """Dev-kit double: the peak is linear in exposure time."""
+    def __init__(self, light, cycles=100):
+        self.light = light
+        self.exposure_time_cycles = cycles
+        self.autoexpose_config = usp.replies.getAutoExposeConfig_response(
+                'OK', 12, 7, 392, 46420, 3277, 10000
+                )
+        self.gain, self.binning, self.row_bitmap = usp.GAIN1X, usp.BINNING_ON, usp.ALL_ROWS
+        self.num_setExposure = 0
+    def frame(self):
+        pixels = np.full(392, 1000)
+        pixels[200] = min(1000 + self.light*self.exposure_time_cycles, 65535)
+        return usp.replies.captureFrame_response('OK', 392, list(pixels), {})
+    def setExposure(self, cycles):
+        self.num_setExposure += 1
+        self.exposure_time_cycles = cycles
+        return usp.replies.setExposure_response('OK')
+    def captureFrames(self, num_frames=None):
+        for _ in range(num_frames):
+            yield self.frame()
+    def captureFrame(self, stats=False):
+        reply = self.frame()
+        if not stats: return reply
+        config = self.autoexpose_config
+        return usp.replies.captureFrameStats_response(*reply, stats=usp.frame_stats(
+                reply.pixels, config.start_pixel, config.stop_pixel,
+                config.target, config.target_tolerance))
+    def autoExposure(self, host=False):
+        return usp.host_auto_exposure(self)
+
+class TestExposureTracker():
+    def test_ExposureTracker_Moves_peak_into_target_range(self):
+        kit = LinearKit(light=200)
+        tracker = usp.ExposureTracker(kit, max_step=10)
+        for reply in tracker.frames(3): pass
+        assert abs(kit.frame().pixels[200] - 46420) <= 3277
+    def test_ExposureTracker_Does_not_adjust_if_peak_is_in_target_range(self):
+        kit = LinearKit(light=454)
+        tracker = usp.ExposureTracker(kit)
+        for reply in tracker.frames(5): pass
+        assert kit.num_setExposure == 0
+        assert len(tracker.log) == 0
+    def test_ExposureTracker_Limits_each_step_to_max_step(self):
+        kit = LinearKit(light=10)
+        tracker = usp.ExposureTracker(kit, max_step=2)
+        adjustment = tracker.update(kit.frame())
+        assert adjustment.new_cycles == 200
+    def test_ExposureTracker_Logs_adjustments(self):
+        kit = LinearKit(light=10)
+        tracker = usp.ExposureTracker(kit)
+        for reply in tracker.frames(2): pass
+        assert [entry.frame for entry in tracker.log] == [0, 1]
+        assert tracker.log[0].old_cycles == 100
+        assert tracker.log[1].old_cycles == tracker.log[0].new_cycles
+    def test_ExposureTracker_Skips_holdoff_frames_after_an_adjustment(self):
+        kit = LinearKit(light=10)
+        tracker = usp.ExposureTracker(kit, holdoff=2)
+        for reply in tracker.frames(4): pass
+        assert [entry.frame for entry in tracker.log] == [0, 3]
+    def test_ExposureTracker_Divides_by_max_step_if_frame_is_saturated(self):
+        kit = LinearKit(light=1000)
+        adjustment = usp.ExposureTracker(kit, max_step=4).update(kit.frame())
+        assert adjustment.new_cycles == 25
+    def test_ExposureTracker_Waits_for_hysteresis_once_peak_is_in_target(self):
+        kit = LinearKit(light=454)
+        tracker = usp.ExposureTracker(kit, hysteresis=1000)
+        tracker.update(kit.frame()) # in target
+        kit.light = 490 # peak 50000: out of range, within hysteresis
+        assert tracker.update(kit.frame()) is None
+        kit.light = 600 # peak 61000: beyond hysteresis
+        assert tracker.update(kit.frame()) is not None
+    def test_ExposureTracker_Ignores_frames_that_timed_out(self):
+        kit = LinearKit(light=10)
+        tracker = usp.ExposureTracker(kit)
+        reply = usp.replies.captureFrame_response('TIMEOUT', 0, [], {})
+        assert tracker.update(reply) is None
+        assert tracker.num_frames == 1
+    def test_ExposureTracker_Raises_ValueError_if_max_step_is_not_above_1(self):
+        with pytest.raises(ValueError):
+            usp.ExposureTracker(LinearKit(light=10), max_step=1)
+
+class TestHostAutoExposure():
+    def test_host_auto_exposure_Hits_target(self):
+        kit = LinearKit(light=200)
+        assert usp.host_auto_exposure(kit).success == 'HIT_TARGET'
+    def test_host_auto_exposure_Raises_ValueError_if_max_tries_is_less_than_1(self):
+        with pytest.raises(ValueError):
+            usp.host_auto_exposure(LinearKit(light=200), max_tries=0)
+
+class TestAutoExposureCache():
+    def test_lookup_Returns_None_for_an_unknown_scene(self):
+        kit = LinearKit(light=200)
+        cache = usp.AutoExposureCache(kit)
+        assert cache.lookup(np.full(16, 1000.0)) is None
+    def test_lookup_Returns_cycles_of_a_matching_scene(self):
+        kit = LinearKit(light=200)
+        cache = usp.AutoExposureCache(kit, tolerance=0.1)
+        cache.store(np.full(16, 1000.0), 300)
+        assert cache.lookup(np.full(16, 1050.0)) == 300
+        assert cache.lookup(np.full(16, 2000.0)) is None
+    def test_lookup_Returns_None_if_pixel_configuration_changes(self):
+        kit = LinearKit(light=200)
+        cache = usp.AutoExposureCache(kit)
+        cache.store(np.full(16, 1000.0), 300)
+        kit.gain = usp.GAIN4X
+        assert cache.lookup(np.full(16, 1000.0)) is None
+    def test_lookup_Returns_None_if_scene_is_stale(self):
+        kit = LinearKit(light=200)
+        cache = usp.AutoExposureCache(kit, max_age=-1)
+        cache.store(np.full(16, 1000.0), 300)
+        assert cache.lookup(np.full(16, 1000.0)) is None
+    def test_store_Forgets_least_recently_used_scene(self):
+        kit = LinearKit(light=200)
+        cache = usp.AutoExposureCache(kit, max_entries=2)
+        cache.store(np.full(16, 1000.0), 100)
+        cache.store(np.full(16, 2000.0), 200)
+        cache.lookup(np.full(16, 1000.0)) # 2000 is now least recently used
+        cache.store(np.full(16, 3000.0), 300)
+        assert cache.lookup(np.full(16, 1000.0)) == 100
+        assert cache.lookup(np.full(16, 2000.0)) is None
+    def test_signature_Has_num_bins_values(self):
+        kit = LinearKit(light=200)
+        assert len(usp.AutoExposureCache(kit, num_bins=8).signature()) == 8
+    def test_autoExposure_Uses_cached_exposure_time_for_the_same_scene(self):
+        kit = LinearKit(light=200)
+        cache = usp.AutoExposureCache(kit)
+        assert cache.autoExposure().success == 'HIT_TARGET'
+        assert cache.misses == 1
+        cycles = kit.exposure_time_cycles
+        reply = cache.autoExposure()
+        assert (cache.hits, reply.iterations) == (1, 1)
+        assert kit.exposure_time_cycles == cycles
+    def test_autoExposure_Starts_a_miss_from_the_previous_exposure_time(self):
+        kit = LinearKit(light=200, cycles=1000)
+        cache = usp.AutoExposureCache(kit, probe_cycles=50)
+        started = []
+        def autoExposure(host=False):
+            started.append(kit.exposure_time_cycles)
+            return usp.host_auto_exposure(kit)
+        kit.autoExposure = autoExposure
+        cache.autoExposure()
+        assert started == [1000]
+    def test_autoExposure_Returns_the_status_of_a_failed_probe(self):
+        kit = LinearKit(light=200)
+        kit.captureFrame = lambda stats=False: usp.replies.captureFrame_response(
+                'ERROR', 0, [], {})
+        assert usp.AutoExposureCache(kit).autoExposure().status == 'ERROR'
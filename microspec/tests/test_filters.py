@@ -0,0 +1,98 @@
+import pytest
+import numpy as np
+import microspec as usp
+
+def polyfit_smooth(frame, window, order, deriv=0):
+    """Savitzky-Golay by brute force: fit every window."""
+    half = window//2
+    n = len(frame)
+    out = np.empty(n)
+    for i in range(n):
+        start = min(max(i - half, 0), n - window)
+        x = np.arange(start, start + window)
+        coef = np.polynomial.polynomial.polyfit(x - i, frame[start:start + window], order)
+        out[i] = np.polynomial.polynomial.polyder(coef, deriv)[0] if deriv else coef[0]
+    return out
+
+class TestSavitzkyGolay():
+    @pytest.mark.parametrize("window,order,deriv", [(5, 2, 0), (11, 3, 0), (7, 2, 1), (1, 0, 0)])
+    def test_Matches_a_least_squares_fit_at_every_pixel(self, window, order, deriv):
+        frame = np.random.default_rng(0).normal(1000, 50, 40)
+        smoothed = usp.SavitzkyGolay(window, order, deriv)(frame)
+        assert smoothed == pytest.approx(polyfit_smooth(frame, window, order, deriv))
+    def test_Keeps_a_polynomial_of_its_order(self):
+        x = np.arange(392, dtype=float)
+        frame = 3 + 2*x - 0.01*x**2
+        assert usp.SavitzkyGolay(9, 2)(frame) == pytest.approx(frame)
+    def test_Reuses_one_buffer_per_pixel_count(self):
+        sg = usp.SavitzkyGolay()
+        a = sg(np.zeros(392))
+        b = sg(np.ones(392))
+        c = sg(np.ones(784))
+        assert a is b
+        assert c is not a
+        assert sg(np.zeros(392)) is a
+    def test_apply_Matches_frame_by_frame(self):
+        frames = np.random.default_rng(1).integers(0, 65535, (5, 392), dtype=np.uint16)
+        sg = usp.SavitzkyGolay(7, 2)
+        batch = sg.apply(frames)
+        for row, frame in zip(batch, frames):
+            assert row == pytest.approx(sg(frame))
+    @pytest.mark.parametrize("params", [dict(window=4), dict(window=5, order=5), dict(order=1, deriv=2)])
+    def test_Raises_ValueError_if_parameters_are_invalid(self, params):
+        with pytest.raises(ValueError):
+            usp.SavitzkyGolay(**params)
+    def test_Raises_ValueError_if_frame_is_shorter_than_window(self):
+        with pytest.raises(ValueError):
+            usp.SavitzkyGolay(11)(np.zeros(5))
+
+class TestExponentialMovingAverage():
+    def test_First_frame_starts_the_average(self):
+        ema = usp.ExponentialMovingAverage(alpha=0.1)
+        assert ema([1, 2]).tolist() == [1, 2]
+        assert ema.num_frames == 1
+    def test_Updates_the_average_in_place(self):
+        ema = usp.ExponentialMovingAverage(alpha=0.25)
+        average = ema([0, 0])
+        assert ema([4, 8]) is average
+        assert average.tolist() == [1, 2]
+    def test_span_Sets_alpha(self):
+        assert usp.ExponentialMovingAverage(span=9).alpha == pytest.approx(0.2)
+    def test_Raises_TypeError_unless_exactly_one_of_alpha_and_span(self):
+        with pytest.raises(TypeError):
+            usp.ExponentialMovingAverage()
+        with pytest.raises(TypeError):
+            usp.ExponentialMovingAverage(alpha=0.1, span=3)
+    def test_Raises_ValueError_if_alpha_is_out_of_range(self):
+        with pytest.raises(ValueError):
+            usp.ExponentialMovingAverage(alpha=1.5)
+    def test_New_pixel_count_starts_a_new_average(self):
+        ema = usp.ExponentialMovingAverage(alpha=0.5)
+        ema(np.zeros(392)); ema(np.ones(392))
+        assert ema(np.full(784, 7)).tolist() == [7]*784
+        assert ema.num_frames == 1
+    def test_apply_in_chunks_matches_one_call(self):
+        frames = np.random.default_rng(2).normal(size=(10, 392))
+        whole = usp.ExponentialMovingAverage(alpha=0.3).apply(frames)
+        ema = usp.ExponentialMovingAverage(alpha=0.3)
+        chunks = np.concatenate([ema.apply(frames[:4]), ema.apply(frames[4:])])
+        assert chunks == pytest.approx(whole)
+
+class TestFilterFrames():
+    def test_Filters_a_captureFrames_stream(self, kit):
+        sg = usp.SavitzkyGolay()
+        ema = usp.ExponentialMovingAverage(alpha=0.5)
+        results = list(usp.filter_frames(kit.captureFrames(3, compact=True), sg, ema))
+        assert [reply.status for reply, _ in results] == ['OK']*3
+        assert ema.num_frames == 3
+        assert len(results[-1][1]) == results[-1][0].num_pixels
+    def test_Accepts_raw_and_normal_replies(self, kit):
+        ema = usp.ExponentialMovingAverage(alpha=0.5)
+        frames = [kit.captureFrame(), kit.captureFrame(raw=True)]
+        for reply, smoothed in usp.filter_frames(frames, ema):
+            assert len(smoothed) == reply.num_pixels
+    def test_Frames_that_are_not_OK_are_not_filtered(self):
+        ema = usp.ExponentialMovingAverage(alpha=0.5)
+        bad = usp.replies.captureFrameCompact_response(2, 0, np.zeros(0, np.uint16))
+        assert list(usp.filter_frames([bad], ema)) == [(bad, None)]
+        assert ema.num_frames == 0
@@ -0,0 +1,67 @@
+import pytest
+import numpy as np
+import microspec as usp
+
+def brute_force_prominence(x, i):
+    left = i
+    while left > 0 and x[left-1] <= x[i]: left -= 1
+    right = i
+    while right < len(x) - 1 and x[right+1] <= x[i]: right += 1
+    return x[i] - max(min(x[left:i+1]), min(x[i:right+1]))
+
+def gaussian(center, sigma=3.0, amplitude=20000.0, num_pixels=392):
+    x = np.arange(1, num_pixels + 1)
+    return 100 + amplitude*np.exp(-0.5*((x - center)/sigma)**2)
+
+class TestFindPeaks():
+    def test_Prominence_matches_definition(self):
+        rng = np.random.default_rng(1)
+        frame = rng.integers(0, 50, 200)
+        peaks = usp.find_peaks(frame)
+        for pixel, prominence in zip(peaks.pixel, peaks.prominence):
+            assert prominence == brute_force_prominence(frame, pixel - 1)
+    def test_prominence_Drops_small_peaks(self):
+        rng = np.random.default_rng(2)
+        frame = gaussian(100.0) + rng.normal(0, 5, 392)
+        peaks = usp.find_peaks(frame, prominence=1000)
+        assert peaks.pixel.tolist() == [100]
+    def test_height_Drops_low_peaks(self):
+        frame = [0, 5, 0, 9, 0]
+        assert usp.find_peaks(frame, height=6).pixel.tolist() == [4]
+    def test_parabolic_Is_exact_for_a_parabola(self):
+        x = np.arange(1, 21)
+        frame = 1000 - (x - 10.3)**2
+        assert usp.find_peaks(frame).position == pytest.approx([10.3])
+    def test_gaussian_Is_exact_for_a_gaussian(self):
+        frame = gaussian(200.4) - 100
+        peaks = usp.find_peaks(frame, method='gaussian')
+        assert peaks.position == pytest.approx([200.4])
+    def test_None_method_Returns_the_peak_pixel(self):
+        peaks = usp.find_peaks(gaussian(200.4), method=None)
+        assert peaks.position.tolist() == [200.0]
+    def test_Flat_top_is_one_peak_at_its_middle(self):
+        peaks = usp.find_peaks([0, 1, 4, 4, 1, 0])
+        assert peaks.pixel.tolist() == [3]
+        assert peaks.position.tolist() == [3.5]
+    def test_Batch_matches_frame_by_frame(self):
+        rng = np.random.default_rng(3)
+        frames = np.array([gaussian(c) for c in (50.2, 150.7, 300.1)])
+        frames += rng.normal(0, 5, frames.shape)
+        batch = usp.find_peaks(frames, prominence=500)
+        assert batch.frame.tolist() == [0, 1, 2]
+        for row, frame in enumerate(frames):
+            single = usp.find_peaks(frame, prominence=500)
+            assert batch.position[batch.frame == row] == pytest.approx(single.position)
+    def test_start_and_stop_pixel_Limit_the_search(self):
+        frame = gaussian(50.0) + gaussian(300.0)
+        peaks = usp.find_peaks(frame, prominence=1000, start_pixel=100, stop_pixel=392)
+        assert peaks.pixel.tolist() == [300]
+    def test_Accepts_captureFrame_pixels(self, kit):
+        peaks = usp.find_peaks(kit.captureFrame().pixels, prominence=1000)
+        assert len(peaks.pixel) >= 1
+    def test_No_peaks_returns_empty_arrays(self):
+        peaks = usp.find_peaks(np.zeros((2, 10)))
+        assert all(len(field) == 0 for field in peaks)
+    def test_Raises_ValueError_if_method_is_unknown(self):
+        with pytest.raises(ValueError):
+            usp.find_peaks([0, 1, 0], method='spline')
@@ -0,0 +1,88 @@
+import os
+import pytest
+import numpy as np
+import microspec as usp
+
+def peak_pixel(pixels):
+    return int(pixels.argmax()) + 1
+
+def first_pixel(pixels):
+    return int(pixels[0])
+
+def is_view(pixels):
+    return pixels.base is not None
+
+def fail_on_3(pixels):
+    if pixels[0] == 3: raise ValueError("bad frame")
+    return int(pixels[0])
+
+def unpicklable(pixels):
+    return lambda: None
+
+def die_on_3(pixels):
+    if pixels[0] == 3: os._exit(1)
+    return int(pixels[0])
+
+def compact(values, status_code=0):
+    pixels = np.array(values, dtype=np.uint16)
+    return usp.replies.captureFrameCompact_response(status_code, len(pixels), pixels)
+
+class TestProcessingStage():
+    def test_process_Yields_results_in_frame_order(self):
+        frames = [compact([k, 0]) for k in range(50)]
+        with usp.ProcessingStage(first_pixel, num_workers=3) as stage:
+            assert list(stage.process(frames)) == list(range(50))
+    def test_Function_gets_an_array_view(self):
+        with usp.ProcessingStage(is_view, num_workers=1) as stage:
+            assert list(stage.process([compact([1, 2])])) == [True]
+    def test_process_Accepts_every_kind_of_captureFrame_reply(self, kit):
+        kit.setBridgeLED(usp.GREEN) # settle stream
+        frames = [kit.captureFrame(), kit.captureFrame(compact=True), kit.captureFrame(raw=True)]
+        with usp.ProcessingStage(peak_pixel, num_workers=2) as stage:
+            peaks = list(stage.process(frames))
+        pixels = [
+            np.array(frames[0].pixels),
+            frames[1].pixels,
+            usp.decode_pixels(frames[2].payload)
+            ]
+        assert peaks == [peak_pixel(p) for p in pixels]
+    def test_Frames_that_are_not_OK_give_None(self):
+        frames = [compact([1]), compact([], status_code=2), compact([3])]
+        with usp.ProcessingStage(first_pixel, num_workers=2) as stage:
+            assert list(stage.process(frames)) == [1, None, 3]
+    def test_run_Captures_into_shared_memory(self, kit):
+        with usp.ProcessingStage(peak_pixel, num_workers=2) as stage:
+            results = list(stage.run(kit, num_frames=10))
+            stats = stage.stats()
+        assert len(results) == 10
+        assert all(isinstance(r, int) for r in results)
+        assert stats.num_frames == 10
+        assert stats.queue_depth == 0
+    def test_stats_Reports_utilization_and_queue_depth(self):
+        frames = [compact([k]) for k in range(20)]
+        with usp.ProcessingStage(first_pixel, num_workers=2, num_slots=3) as stage:
+            list(stage.process(frames))
+            stats = stage.stats()
+        assert len(stats.utilization) == 2
+        assert all(0 <= u <= 1 for u in stats.utilization)
+        assert 1 <= stats.max_queue_depth <= 3
+    def test_Function_errors_are_raised_in_order(self):
+        frames = [compact([k]) for k in range(6)]
+        with usp.ProcessingStage(fail_on_3, num_workers=2) as stage:
+            results = stage.process(frames)
+            assert [next(results) for _ in range(3)] == [0, 1, 2]
+            with pytest.raises(ValueError):
+                next(results)
+    def test_Unpicklable_result_raises_RuntimeError(self):
+        with usp.ProcessingStage(unpicklable, num_workers=1) as stage:
+            with pytest.raises(RuntimeError, match="Cannot send the result"):
+                list(stage.process([compact([1])]))
+    def test_Dead_worker_raises_RuntimeError(self):
+        frames = [compact([k]) for k in range(6)]
+        with usp.ProcessingStage(die_on_3, num_workers=1) as stage:
+            with pytest.raises(RuntimeError, match="died"):
+                list(stage.process(frames))
+    def test_Raises_ValueError_if_frame_does_not_fit(self):
+        with usp.ProcessingStage(first_pixel, num_workers=1, max_pixels=2) as stage:
+            with pytest.raises(ValueError):
+                list(stage.process([compact([1, 2, 3])]))
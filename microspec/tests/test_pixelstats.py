@@ -0,0 +1,90 @@
+import pytest
+import numpy as np
+import microspec as usp
+
+@pytest.fixture()
+def frames():
+    return np.random.default_rng(0).integers(0, 65536, (50, 392), dtype=np.uint16)
+
+def check(snapshot, frames):
+    assert snapshot.count == len(frames)
+    assert snapshot.mean == pytest.approx(frames.mean(axis=0))
+    assert snapshot.variance == pytest.approx(frames.var(axis=0))
+    assert (snapshot.min == frames.min(axis=0)).all()
+    assert (snapshot.max == frames.max(axis=0)).all()
+
+class TestPixelStatistics():
+    def test_Frame_by_frame_matches_numpy(self, frames):
+        stats = usp.PixelStatistics()
+        for frame in frames: stats.add(frame)
+        check(stats.snapshot(), frames)
+    def test_Batch_matches_numpy(self, frames):
+        stats = usp.PixelStatistics()
+        stats.add(frames[:20]); stats.add(frames[20:])
+        check(stats.snapshot(), frames)
+    def test_Histogram_counts_every_frame_at_every_pixel(self, frames):
+        stats = usp.PixelStatistics(num_bins=16)
+        stats.add(frames[0]); stats.add(frames[1:])
+        snapshot = stats.snapshot()
+        assert (snapshot.histogram.sum(axis=1) == len(frames)).all()
+        expected = np.histogram(frames[:, 7], bins=snapshot.bin_edges)[0]
+        assert snapshot.histogram[7].tolist() == expected.tolist()
+    def test_No_histogram_if_num_bins_is_0(self, frames):
+        stats = usp.PixelStatistics(num_bins=0)
+        stats.add(frames)
+        assert stats.snapshot().histogram is None
+    def test_merge_Matches_one_accumulator(self, frames):
+        a, b = usp.PixelStatistics(), usp.PixelStatistics()
+        a.add(frames[:13])
+        for frame in frames[13:]: b.add(frame)
+        a.merge(b)
+        check(a.snapshot(), frames)
+        whole = usp.PixelStatistics(); whole.add(frames)
+        assert (a.snapshot().histogram == whole.snapshot().histogram).all()
+    def test_merge_Accepts_a_snapshot(self, frames):
+        a, b = usp.PixelStatistics(), usp.PixelStatistics()
+        b.add(frames)
+        a.merge(b.snapshot())
+        check(a.snapshot(), frames)
+    def test_merge_Ignores_an_empty_accumulator(self, frames):
+        a = usp.PixelStatistics()
+        a.add(frames)
+        a.merge(usp.PixelStatistics())
+        check(a.snapshot(), frames)
+    def test_merge_Raises_ValueError_if_histograms_differ(self, frames):
+        a, b = usp.PixelStatistics(num_bins=16), usp.PixelStatistics(num_bins=8)
+        a.add(frames); b.add(frames)
+        with pytest.raises(ValueError):
+            a.merge(b)
+    def test_Stable_for_large_offset(self):
+        stats = usp.PixelStatistics()
+        for k in range(10000): stats.add([60000 + k % 2])
+        assert stats.snapshot().variance[0] == pytest.approx(0.25)
+    def test_snapshot_Is_a_copy(self, frames):
+        stats = usp.PixelStatistics()
+        stats.add(frames[0])
+        snapshot = stats.snapshot()
+        stats.add(frames[1])
+        assert snapshot.count == 1
+        assert (snapshot.max == frames[0]).all()
+    def test_snapshot_Raises_ValueError_if_empty(self):
+        with pytest.raises(ValueError):
+            usp.PixelStatistics().snapshot()
+    def test_Raises_ValueError_if_pixel_count_changes(self):
+        stats = usp.PixelStatistics()
+        stats.add(np.zeros(392, dtype=np.uint16))
+        with pytest.raises(ValueError):
+            stats.add(np.zeros(784, dtype=np.uint16))
+    def test_Raises_ValueError_if_num_bins_is_not_a_power_of_two(self):
+        with pytest.raises(ValueError):
+            usp.PixelStatistics(num_bins=100)
+    def test_track_Adds_frames_from_captureFrames(self, kit):
+        stats = usp.PixelStatistics()
+        replies = list(stats.track(kit.captureFrames(3, compact=True)))
+        assert len(replies) == 3
+        assert stats.count == 3
+    def test_track_Accepts_normal_and_raw_replies(self, kit):
+        kit.setBridgeLED(usp.GREEN) # settle stream
+        stats = usp.PixelStatistics()
+        list(stats.track([kit.captureFrame(), kit.captureFrame(raw=True)]))
+        assert stats.count == 2
@@ -0,0 +1,47 @@
+import microspec as usp
+import numpy as np
+import pytest
+
+class TestFrameStats():
+    def test_frame_stats_Finds_peak_between_start_pixel_and_stop_pixel(self):
+        frame = [60000, 10, 20, 30, 60000]
+        stats = usp.frame_stats(frame, start_pixel=2, stop_pixel=4)
+        assert stats.peak == 30
+        assert stats.peak_pixel == 4
+    def test_frame_stats_Counts_saturated_pixels_in_whole_frame(self):
+        frame = [65535, 10, 65535, 30]
+        assert usp.frame_stats(frame, 2, 4).num_saturated == 2
+    def test_frame_stats_Uses_saturation_param(self):
+        frame = [50000, 10, 50000, 30]
+        assert usp.frame_stats(frame, 2, 4, saturation=50000).num_saturated == 2
+    def test_frame_stats_Returns_mean_of_whole_frame(self):
+        assert usp.frame_stats([1, 2, 3, 6], 1, 4).mean == 3
+    def test_frame_stats_Returns_in_target_if_peak_is_in_target_range(self):
+        stats = usp.frame_stats([0, 46420-3277], 1, 2)
+        assert stats.in_target
+        assert not stats.underexposed
+        assert not stats.overexposed
+    def test_frame_stats_Returns_underexposed_if_peak_is_below_target_range(self):
+        stats = usp.frame_stats([0, 46420-3278], 1, 2)
+        assert stats.underexposed
+        assert not stats.in_target
+    def test_frame_stats_Returns_overexposed_if_peak_is_above_target_range(self):
+        stats = usp.frame_stats([0, 46420+3278], 1, 2)
+        assert stats.overexposed
+        assert not stats.in_target
+    def test_frame_stats_Returns_python_numbers_for_one_frame(self):
+        stats = usp.frame_stats(np.arange(392))
+        assert type(stats.peak) == int
+        assert type(stats.in_target) == bool
+    def test_frame_stats_Returns_one_value_per_frame_for_a_batch(self):
+        frames = np.vstack([np.arange(392), np.zeros(392)])
+        stats = usp.frame_stats(frames)
+        assert list(stats.peak) == [391, 0]
+        assert list(stats.peak_pixel) == [392, 7]
+        assert list(stats.underexposed) == [True, True]
+    def test_frame_stats_Raises_ValueError_if_start_pixel_is_after_stop_pixel(self):
+        with pytest.raises(ValueError, match="start_pixel=5"):
+            usp.frame_stats([1, 2, 3, 4, 5, 6], start_pixel=5, stop_pixel=3)
+    def test_frame_stats_Raises_ValueError_if_range_is_outside_the_frame(self):
+        with pytest.raises(ValueError):
+            usp.frame_stats([1, 2, 3, 4], start_pixel=7, stop_pixel=392)
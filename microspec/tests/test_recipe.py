@@ -0,0 +1,85 @@
+import microspec as usp
+import pytest
+
+class TestRecipe():
+    def test_Recipe_Raises_ValueError_if_command_is_unknown(self):
+        with pytest.raises(ValueError):
+            usp.Recipe([{"command": "makeCoffee"}])
+    def test_Recipe_Raises_ValueError_if_a_param_is_unknown(self):
+        with pytest.raises(ValueError):
+            usp.Recipe([{"command": "setExposure", "seconds": 1}])
+    def test_Recipe_Raises_ValueError_if_repeat_is_not_positive(self):
+        with pytest.raises(ValueError):
+            usp.Recipe([{"command": "captureFrame", "repeat": 0}])
+    def test_Recipe_Fills_in_default_params(self):
+        command, repeat, params = usp.Recipe(
+                [{"command": "setSensorConfig", "gain": usp.GAIN4X}]
+                ).steps[0]
+        assert params == {
+                "binning": usp.BINNING_ON,
+                "gain": usp.GAIN4X,
+                "row_bitmap": usp.ALL_ROWS,
+                "force": False
+                }
+    def test_load_Reads_steps_and_name_from_json(self, tmp_path):
+        path = tmp_path / "recipe.json"
+        path.write_text(
+            '{"name": "frames", "steps": [{"command": "captureFrame", "repeat": 3}]}'
+            )
+        recipe = usp.Recipe.load(str(path))
+        assert recipe.name == "frames"
+        [(command, repeat, params)] = recipe.steps
+        assert (command, repeat) == ("captureFrame", 3)
+        assert params["stats"] is False
+    def test_load_Reads_a_list_of_steps_from_yaml(self, tmp_path):
+        pytest.importorskip("yaml")
+        path = tmp_path / "recipe.yaml"
+        path.write_text("- command: setExposure\n  ms: 5\n")
+        assert usp.Recipe.load(str(path)).steps[0][2]["ms"] == 5
+
+class TestRecipeRun():
+    def test_run_Sends_each_reply_to_the_sink(self, kit):
+        results = []
+        usp.Recipe([
+            {"command": "getExposure"},
+            {"command": "captureFrame", "repeat": 2},
+            ]).run(kit, sink=results.append)
+        assert [r.command for r in results] == [
+                "getExposure", "captureFrame", "captureFrame"
+                ]
+        assert all(r.reply.status == 'OK' for r in results)
+    def test_run_Returns_a_timing_for_each_step(self, kit):
+        timings = usp.Recipe([{"command": "captureFrame", "repeat": 2}]).run(kit)
+        assert len(timings) == 1
+        assert timings[0].calls == 2
+        assert timings[0].seconds > 0
+    def test_run_Skips_setExposure_if_exposure_time_is_unchanged(self, kit):
+        kit.setExposure(cycles=100)
+        timings = usp.Recipe([
+            {"command": "setExposure", "cycles": 100},
+            {"command": "setExposure", "cycles": 200},
+            {"command": "setExposure", "cycles": 200},
+            ]).run(kit)
+        assert [t.skipped for t in timings] == [1, 0, 1]
+        assert kit.getExposure().cycles == 200
+        kit.setExposure(ms=1)
+    def test_run_Skips_setSensorConfig_if_pixel_configuration_is_unchanged(self, kit):
+        kit.setSensorConfig()
+        timings = usp.Recipe([{"command": "setSensorConfig"}]).run(kit)
+        assert timings[0].skipped == 1
+    def test_run_Skips_repeated_setBridgeLED(self, kit):
+        kit.setBridgeLED(usp.GREEN, force=True) # not the first step's RED
+        timings = usp.Recipe([
+            {"command": "setBridgeLED", "led_setting": usp.RED},
+            {"command": "setBridgeLED", "led_setting": usp.RED},
+            {"command": "setBridgeLED", "led_setting": usp.GREEN},
+            ]).run(kit)
+        assert [t.skipped for t in timings] == [0, 1, 0]
+    def test_run_Sends_a_set_command_with_force_True(self, kit):
+        kit.setSensorConfig()
+        timings = usp.Recipe([{"command": "setSensorConfig", "force": True}]).run(kit)
+        assert timings[0].skipped == 0
+    def test_run_Restores_elide(self, kit):
+        kit.elide = False
+        usp.Recipe([{"command": "setSensorConfig"}]).run(kit)
+        assert kit.elide is False
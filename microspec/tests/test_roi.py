@@ -0,0 +1,75 @@
+import pytest
+import numpy as np
+import microspec as usp
+
+@pytest.fixture()
+def roi():
+    return usp.RegionsOfInterest({'a': (2, 3), 'b': (5, 5), 'c': (1, 4)})
+
+class TestRegionsOfInterest():
+    def test_extract_Keeps_only_the_regions(self, roi):
+        reply = roi.extract([10, 20, 30, 40, 50])
+        assert reply.status == 'OK'
+        assert reply.num_pixels == 5
+        assert {k: v.tolist() for k, v in reply.regions.items()} == {
+                'a': [20, 30], 'b': [50], 'c': [10, 20, 30, 40]}
+    def test_extract_Computes_band_integrals(self, roi):
+        reply = roi.extract([10, 20, 30, 40, 50])
+        assert reply.integrals == {'a': 50, 'b': 50, 'c': 100}
+    def test_extract_Integrals_do_not_overflow(self):
+        roi = usp.RegionsOfInterest({'all': (1, 4)})
+        assert roi.extract([65535]*4).integrals['all'] == 4*65535
+    def test_extract_Decodes_only_the_regions_of_a_raw_frame(self, roi):
+        payload = np.array([10, 20, 30, 40, 50], dtype='>u2').tobytes()
+        raw = usp.replies.captureFrameRaw_response(
+                status='OK', num_pixels=5, header=b'\x00\x00\x00\x05', payload=payload)
+        reply = roi.extract(raw)
+        assert reply.regions['a'].tolist() == [20, 30]
+        assert reply.regions['a'].dtype == np.uint16
+        assert reply.integrals == {'a': 50, 'b': 50, 'c': 100}
+    def test_extract_Compact_reply(self, roi):
+        compact = usp.replies.captureFrameCompact_response(
+                status_code=0, num_pixels=5, pixels=np.arange(5, dtype=np.uint16))
+        assert roi.extract(compact).integrals['c'] == 6
+    def test_extract_Passes_on_timeout(self, roi):
+        raw = usp.replies.captureFrameRaw_response(
+                status='TIMEOUT', num_pixels=0, header=b'', payload=b'')
+        reply = roi.extract(raw)
+        assert reply.status == 'TIMEOUT'
+        assert reply.regions == {} and reply.integrals == {}
+    def test_extract_Raises_ValueError_if_frame_is_too_short(self, roi):
+        with pytest.raises(ValueError):
+            roi.extract([1, 2, 3, 4])
+    def test_integrate_Batch(self, roi):
+        integrals = roi.integrate([[10, 20, 30, 40, 50], [1, 2, 3, 4, 5]])
+        assert integrals['a'].tolist() == [50, 5]
+        assert integrals['c'].tolist() == [100, 10]
+    def test_num_pixels_Counts_every_region(self, roi):
+        assert roi.num_pixels == 7
+    def test_Raises_ValueError_if_region_is_empty(self):
+        with pytest.raises(ValueError):
+            usp.RegionsOfInterest({'a': (5, 4)})
+    def test_Raises_ValueError_if_start_pixel_is_0(self):
+        with pytest.raises(ValueError):
+            usp.RegionsOfInterest({'a': (0, 4)})
+    def test_Raises_ValueError_without_regions(self):
+        with pytest.raises(ValueError):
+            usp.RegionsOfInterest({})
+
+class TestCaptureFrameROI():
+    def test_captureFrame_Returns_the_regions(self, kit):
+        roi = usp.RegionsOfInterest({'blue': (100, 119), 'red': (300, 309)})
+        reply = kit.captureFrame(roi=roi)
+        assert isinstance(reply, usp.captureFrameROI_response)
+        assert reply.status == 'OK'
+        assert len(reply.regions['blue']) == 20
+        assert len(reply.regions['red']) == 10
+        assert reply.integrals['red'] == int(reply.regions['red'].sum())
+    def test_captureFrames_Returns_the_regions(self, kit):
+        roi = usp.RegionsOfInterest({'red': (300, 309)})
+        replies = list(kit.captureFrames(3, roi=roi))
+        assert [r.status for r in replies] == ['OK']*3
+    def test_captureFrame_Raises_TypeError_if_roi_is_combined(self, kit):
+        roi = usp.RegionsOfInterest({'red': (300, 309)})
+        with pytest.raises(TypeError):
+            kit.captureFrame(roi=roi, raw=True)
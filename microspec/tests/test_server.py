@@ -0,0 +1,118 @@
+import time
+import pytest
+import numpy as np
+import microspec as usp
+
+@pytest.fixture()
+def server(kit):
+    with usp.FrameServer(kit) as server:
+        yield server
+
+@pytest.fixture()
+def client(server):
+    with usp.FrameClient(server.address) as client:
+        yield client
+
+class TestWireFormat():
+    def test_decode_frame_Inverts_encode_frame(self):
+        pixels = np.array([1, 2, 65535], dtype=np.uint16)
+        reply = usp.replies.captureFrameRaw_response(
+                'OK', 3, b'\x00\x00\x00\x03', pixels.astype('>u2').tobytes()
+                )
+        sequence, frame = usp.decode_frame(usp.encode_frame(5, reply))
+        assert sequence == 5
+        assert frame.status == 'OK'
+        assert frame.pixels.tolist() == [1, 2, 65535]
+    def test_decode_frame_Keeps_status_TIMEOUT(self):
+        reply = usp.replies.captureFrameRaw_response('TIMEOUT', 0, b'', b'')
+        assert usp.decode_frame(usp.encode_frame(1, reply))[1].status == 'TIMEOUT'
+
+class TestFrameClient():
+    def test_captureFrame_Returns_captureFrame_response(self, client):
+        reply = client.captureFrame()
+        assert type(reply) == usp.replies.captureFrame_response
+        assert reply.status == 'OK'
+        assert len(reply.pixels) == reply.num_pixels
+        assert reply.frame[1] == reply.pixels[0]
+    def test_captureFrame_compact_Returns_compact_reply(self, client):
+        reply = client.captureFrame(compact=True)
+        assert type(reply) == usp.replies.captureFrameCompact_response
+    def test_captureFrames_Sequence_increases(self, client):
+        sequences = []
+        for _ in client.captureFrames(3):
+            sequences.append(client.sequence)
+        assert sequences == sorted(sequences)
+        assert len(set(sequences)) == 3
+    def test_Commands_return_Devkit_replies(self, client):
+        assert client.setBridgeLED(usp.GREEN) == usp.replies.setBridgeLED_response('OK')
+        assert client.getBridgeLED().led_setting == 'GREEN'
+    def test_Commands_are_sent_while_capturing(self, client):
+        client.captureFrame()
+        assert client.setExposure(cycles=60).status == 'OK'
+        assert client.getExposure().cycles == 60
+        assert client.setExposure(cycles=50).status == 'OK'
+    def test_Commands_check_parameters_before_sending(self, client):
+        with pytest.raises(TypeError):
+            client.setBridgeLED(bad_param=1)
+    def test_Server_errors_are_raised_in_the_client(self, client):
+        with pytest.raises(TypeError):
+            client.setExposure(cycles=-1)
+    def test_Late_reply_is_not_returned_for_the_next_command(self, kit, server, client, monkeypatch):
+        getBridgeLED = kit.getBridgeLED
+        def slow(*args, **kwargs):
+            time.sleep(0.3)
+            return getBridgeLED(*args, **kwargs)
+        monkeypatch.setattr(kit, 'getBridgeLED', slow)
+        client.timeout = 0.1
+        with pytest.warns(UserWarning):
+            assert client.getBridgeLED().status == 'TIMEOUT'
+        client.timeout = 5.0
+        assert type(client.getExposure()) == usp.replies.getExposure_response
+    def test_Unexpected_server_errors_keep_their_type_name(self, kit, client, monkeypatch):
+        def fail(*args, **kwargs): raise KeyError('led')
+        monkeypatch.setattr(kit, 'getBridgeLED', fail)
+        with pytest.raises(RuntimeError, match="KeyError"):
+            client.getBridgeLED()
+    def test_captureFrame_latest_Drops_older_frames(self, server, client):
+        client.subscribe()
+        deadline = time.monotonic() + 2
+        while len(client._frames) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        client.captureFrame(latest=True)
+        assert client.num_dropped > 0
+    def test_Unknown_command_raises_AttributeError(self, client):
+        with pytest.raises(AttributeError):
+            client.captureAverage()
+
+class TestFrameServer():
+    def test_Every_subscriber_gets_every_frame(self, server):
+        with usp.FrameClient(server.address) as a, usp.FrameClient(server.address) as b:
+            a.captureFrame(); b.captureFrame()
+            assert a.captureFrame().status == 'OK'
+            assert b.captureFrame().status == 'OK'
+    def test_Slow_subscriber_does_not_slow_capture(self, server):
+        with usp.FrameClient(server.address) as slow:
+            slow.subscribe()
+            time.sleep(0.2) # never reads
+            assert server.num_frames > server.queue_size + slow._frames.maxlen
+            assert server.num_dropped + slow.num_dropped > 0
+    def test_No_capture_without_subscribers(self, server, client):
+        client.getExposure()
+        assert server.num_frames == 0
+    def test_Unix_socket(self, kit, tmp_path):
+        path = str(tmp_path / "microspec.sock")
+        with usp.FrameServer(kit, path) as server:
+            with usp.FrameClient(path) as client:
+                assert client.captureFrame().status == 'OK'
+        assert not (tmp_path / "microspec.sock").exists()
+    def test_Closed_connections_are_forgotten(self, server):
+        with usp.FrameClient(server.address) as client:
+            client.captureFrame()
+        deadline = time.monotonic() + 2
+        while server._connections and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(server._connections) == 0
+    def test_stop_Leaves_the_dev_kit_ready(self, kit, server, client):
+        client.captureFrame()
+        server.stop()
+        assert kit.getBridgeLED().status == 'OK'
@@ -0,0 +1,95 @@
+import multiprocessing
+import pytest
+import numpy as np
+import microspec as usp
+
+def _read_in_child(name, sequence, result):
+    with usp.FrameReader(name) as reader:
+        result.put(reader.read(sequence).pixels.tolist())
+
+@pytest.fixture()
+def publisher():
+    with usp.FramePublisher(num_slots=4) as publisher:
+        yield publisher
+
+@pytest.fixture()
+def reader(publisher):
+    with usp.FrameReader(publisher.name) as reader:
+        yield reader
+
+def compact(values, status_code=0):
+    pixels = np.array(values, dtype=np.uint16)
+    return usp.replies.captureFrameCompact_response(status_code, len(pixels), pixels)
+
+class TestFramePublisher():
+    def test_capture_Decodes_into_shared_memory(self, kit, publisher, reader):
+        sequence, reply = publisher.capture(kit)
+        assert sequence == 1
+        assert reply.status == 'OK'
+        assert reader.read(1).pixels.tolist() == reply.pixels.tolist()
+    def test_publish_Accepts_every_kind_of_captureFrame_reply(self, kit, publisher, reader):
+        for reply in (kit.captureFrame(), kit.captureFrame(compact=True), kit.captureFrame(raw=True)):
+            sequence = publisher.publish(reply)
+            assert reader.read(sequence).num_pixels == reply.num_pixels
+        assert reader.sequence == 3
+    def test_publish_Raises_ValueError_if_frame_does_not_fit(self):
+        with usp.FramePublisher(max_pixels=2) as publisher:
+            with pytest.raises(ValueError):
+                publisher.publish(compact([1, 2, 3]))
+    def test_run_Publishes_num_frames(self, kit, publisher):
+        publisher.run(kit, num_frames=3)
+        assert publisher.sequence == 3
+
+class TestFrameReader():
+    def test_Raises_ValueError_if_not_a_frame_ring(self):
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(create=True, size=64)
+        try:
+            with pytest.raises(ValueError):
+                usp.FrameReader(shm.name)
+        finally:
+            shm.close(); shm.unlink()
+    def test_view_Does_not_copy(self, publisher, reader):
+        publisher.publish(compact([1, 2, 3]))
+        view = reader.view()
+        assert view.pixels.tolist() == [1, 2, 3]
+        assert view.pixels.base is not None
+    def test_Overwritten_frame_is_not_available(self, publisher, reader):
+        for k in range(5): publisher.publish(compact([k]))
+        assert reader.read(1) is None
+        assert not reader.valid(1)
+        assert reader.read(5).pixels.tolist() == [4]
+    def test_Frame_being_written_is_not_available(self, publisher, reader):
+        publisher.publish(compact([1]))
+        publisher._begin() # the publisher starts writing frame 2 ...
+        assert reader.read(2) is None
+    def test_view_is_invalid_after_it_is_overwritten(self, publisher, reader):
+        publisher.publish(compact([1]))
+        view = reader.view(1)
+        for k in range(4): publisher.publish(compact([9]))
+        assert view.pixels.tolist() == [9] # torn ...
+        assert not reader.valid(1) # ... and detected
+    def test_read_out_Copies_into_the_given_array(self, publisher, reader):
+        publisher.publish(compact([1, 2]))
+        out = np.zeros(784, dtype=np.uint16)
+        reply = reader.read(out=out)
+        assert np.shares_memory(reply.pixels, out)
+        assert out[:2].tolist() == [1, 2]
+    def test_frames_Yields_new_frames_in_order_and_counts_lost_frames(self, publisher, reader):
+        for k in range(6): publisher.publish(compact([k]))
+        assert list(reader.frames(timeout=0)) == [] # no new frame
+        frames = list(reader.frames(start=1, timeout=0))
+        assert [s for s, _ in frames] == [3, 4, 5, 6]
+        assert [r.pixels[0] for _, r in frames] == [2, 3, 4, 5]
+        assert reader.num_lost == 2
+    def test_Reader_in_another_process(self, publisher):
+        publisher.publish(compact([1, 2, 3]))
+        context = multiprocessing.get_context('spawn')
+        result = context.Queue()
+        child = context.Process(
+                target=_read_in_child, args=(publisher.name, 1, result)
+                )
+        child.start()
+        assert result.get(timeout=30) == [1, 2, 3]
+        child.join()
+        assert publisher.sequence == 1 # memory is still there
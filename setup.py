@@ -49,8 +49,12 @@ setuptools.setup(
     ],
     python_requires='>=3.7',
     install_requires=[
-        "microspec"
+        "microspec",
+        "numpy"
         ],
+    extras_require={
+        "yaml": ["pyyaml"], # load recipes from YAML files
+        },
     license='MIT', # field in *.egg-info/PKG-INFO
     platforms=['Windows', 'Mac', 'Linux'], # legacy field in *.egg-info/PKG-INFO
 )